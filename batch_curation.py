@@ -0,0 +1,269 @@
+'''
+File: batch_curation.py
+Description: Curate recommendations for many users at once, fetching every shared track a single time
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from spotify_client import get_spotify_access_token, get_playlist_track_ids
+from data_cleaning import get_track_data, clean_track_data, clean_features
+from compact_store import TrackFeatureSet
+from sentiment import append_sentiment
+from model_generation import get_user_model
+from model_registry import ModelRegistry, REGISTRY_DIR
+from track_store import TrackStore
+from lyrics_cache import LyricsCache
+from dedup_index import normalize_key
+from instrumentation import timed
+from environment import load_environment
+
+
+# Load enviornment variables
+load_environment()
+
+# Get credentials from enviornment variables
+CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID')
+CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
+
+# Playlists paged through at the same time
+PLAYLIST_WORKERS = 4
+
+# Lowest probability written to a user's recommendations
+MIN_PROBABILITY = 0.5
+
+OUTPUT_DIR = 'recommendations'
+
+
+
+def load_manifest(path):
+    """
+    Read the jobs to run from a JSON list or JSON lines file
+
+    Each job has a user plus target_playlists and candidate_playlists lists of playlist IDs.
+
+    path (str): manifest file
+
+    Returns:
+    list[dict]: jobs in manifest order
+    """
+    with open(path) as f:
+        if path.endswith('.jsonl'):
+            jobs = [json.loads(line) for line in f if line.strip()]
+        else:
+            jobs = json.load(f)
+
+    if not jobs:
+        raise Exception(f"Manifest {path} lists no jobs")
+
+    for job in jobs:
+        missing = {'user', 'target_playlists', 'candidate_playlists'} - set(job)
+        if missing:
+            raise Exception(f"Manifest job {job} is missing {', '.join(sorted(missing))}")
+
+    users = [job['user'] for job in jobs]
+    if len(set(users)) != len(users):
+        raise Exception("Manifest lists a user more than once")
+    return jobs
+
+
+
+def fetch_playlists(playlist_ids, token, store):
+    """
+    Get the track IDs of every playlist, each playlist requested once
+
+    playlist_ids (list[str]): playlists used by any job
+    token (str): Access token for Spotify authorization
+    store (TrackStore): local store of previously fetched playlists
+
+    Returns:
+    dict: playlist ID -> list of track IDs
+    """
+    playlist_ids = list(dict.fromkeys(playlist_ids))
+    with ThreadPoolExecutor(max_workers=PLAYLIST_WORKERS) as executor:
+        track_ids = executor.map(lambda playlist_id: get_playlist_track_ids(playlist_id, token, store),
+                                 playlist_ids)
+        return dict(zip(playlist_ids, track_ids))
+
+
+
+def build_shared_frame(track_ids, token, store, cache):
+    """
+    Fetch, clean and score the union of every job's tracks once
+
+    track_ids (list[str]): every track ID across jobs, duplicates allowed
+    token (str): Access token for Spotify authorization
+    store (TrackStore): local store of previously fetched tracks
+    cache (LyricsCache): cache of lyrics and sentiment scores
+
+    Returns:
+    pd.DataFrame: cleaned tracks with sentiment, indexed by the track ID kept for each song
+    dict: track ID -> normalized song key, for every track with Spotify data
+    """
+    unique_ids = list(dict.fromkeys(track_ids))
+    print(f"{len(track_ids)} tracks across jobs, {len(unique_ids)} unique.")
+
+    raw = get_track_data(unique_ids, token, store)
+    raw.index = raw['id'].to_numpy()
+    keys = {track_id: normalize_key(title, artist)
+            for track_id, title, artist in zip(raw['id'], raw['title'], raw['main_artist'])}
+
+    # Cleaning keeps the index, so rows stay labelled by the track ID kept for each song
+    shared = clean_track_data(raw)
+    shared = append_sentiment(shared, cache)
+    return shared, keys
+
+
+
+def job_songs(canonical, keys, job, playlists):
+    """
+    Select one job's songs from the shared tracks
+
+    canonical (dict): normalized song key -> row label in shared
+    keys (dict): track ID -> normalized song key
+    job (dict): manifest entry
+    playlists (dict): playlist ID -> list of track IDs
+
+    Returns:
+    list: row labels of the target songs
+    list: row labels of the candidate songs not already in a target playlist
+    """
+    def songs(playlist_ids):
+        found = (canonical.get(keys.get(track_id)) for playlist_id in playlist_ids
+                 for track_id in playlists[playlist_id])
+        return list(dict.fromkeys(label for label in found if label is not None))
+
+    # A song in both a target and a candidate playlist is only a target
+    target = songs(job['target_playlists'])
+    target_set = set(target)
+    candidates = [label for label in songs(job['candidate_playlists']) if label not in target_set]
+    return target, candidates
+
+
+
+# Shared tracks memory mapped by each training process, every process reads the same pages
+_worker_shared = None
+_worker_registry = None
+
+
+def _init_user_worker(shared_path, registry_path):
+    global _worker_shared, _worker_registry
+    _worker_shared = TrackFeatureSet.load(shared_path)
+    _worker_registry = ModelRegistry(registry_path) if registry_path else None
+
+
+def train_user(task):
+    """
+    Train one user's model and score their candidates, run in a worker process
+
+    task (tuple): user, target rows, candidate rows of the shared feature set and get_user_model arguments
+
+    Returns:
+    tuple: user and recommendations frame with title, main_artist, id and probability, best first
+    """
+    user, target, candidates, model_params = task
+    start = time.perf_counter()
+
+    # Only this user's rows are copied out of the shared matrix, features stay float32
+    df = _worker_shared.take(np.concatenate([target, candidates]).astype(np.int64)).set_index('id')
+    df['is_target'] = np.repeat(np.array([1, 0], dtype=np.int8), [len(target), len(candidates)])
+    model, features = get_user_model(df.copy(), _worker_registry, lineage=f'user:{user}', **model_params)
+
+    scored = clean_features(df[df['is_target'] == 0].copy())
+    proba = model.predict_proba(scored.loc[:, features].drop(columns=['is_target']))[:, 1]
+
+    recommended = scored.loc[proba >= MIN_PROBABILITY, ['title', 'main_artist']]
+    recommended.insert(0, 'id', recommended.index)
+    recommended['probability'] = proba[proba >= MIN_PROBABILITY]
+    recommended = recommended.sort_values('probability', ascending=False, ignore_index=True)
+
+    print(f"Trained {user}: {len(target)} target, {len(candidates)} candidate songs, "
+          f"{len(recommended)} recommended in {time.perf_counter() - start:.1f}s")
+    return user, recommended
+
+
+
+@timed('batch_curation')
+def run_batch(jobs, token, store, cache, output_dir=OUTPUT_DIR, workers=None, registry_path=REGISTRY_DIR):
+    """
+    Run every job in a manifest, fetching each playlist and track once and training users in parallel
+
+    jobs (list[dict]): jobs from load_manifest
+    token (str): Access token for Spotify authorization
+    store (TrackStore): local store of previously fetched playlists and tracks
+    cache (LyricsCache): cache of lyrics and sentiment scores
+    output_dir (str): directory receiving one CSV of recommendations per user
+    workers (int): training processes, defaults to every core
+    registry_path (str): model registry directory, None to always train
+
+    Returns:
+    dict: user -> path of their recommendations file
+    """
+    if not jobs:
+        return {}
+
+    playlist_ids = [playlist_id for job in jobs
+                    for playlist_id in job['target_playlists'] + job['candidate_playlists']]
+    playlists = fetch_playlists(playlist_ids, token, store)
+
+    all_track_ids = [track_id for playlist_id in playlist_ids for track_id in playlists[playlist_id]]
+    shared, keys = build_shared_frame(all_track_ids, token, store, cache)
+    canonical = {keys[label]: label for label in shared.index}
+
+    # Split the cores between users so XGBoost threads do not oversubscribe them
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    model_params = {'params': {'n_jobs': max(1, (os.cpu_count() or 1) // workers)}}
+
+    # Jobs refer to songs by their row in the shared feature set
+    row_of = {label: row for row, label in enumerate(shared.index)}
+    tasks = []
+    for job in jobs:
+        target, candidates = job_songs(canonical, keys, job, playlists)
+        tasks.append((job['user'], [row_of[label] for label in target], [row_of[label] for label in candidates],
+                      model_params))
+
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = {}
+    print(f"Training {len(tasks)} user models on {workers} processes...")
+
+    # Workers memory map one float32 copy of the shared tracks instead of each unpickling the frame
+    with tempfile.TemporaryDirectory(prefix='shared_tracks_') as shared_path:
+        TrackFeatureSet.from_frame(shared.assign(id=shared.index)).save(shared_path)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_user_worker,
+                                 initargs=(shared_path, registry_path)) as executor:
+            for user, recommended in executor.map(train_user, tasks):
+                path = os.path.join(output_dir, f'{user}.csv')
+                recommended.to_csv(path, index=False)
+                outputs[user] = path
+
+    return outputs
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Curate recommendations for every user in a manifest")
+    parser.add_argument('manifest', help="JSON or JSON lines file of user, target_playlists and candidate_playlists")
+    parser.add_argument('--output', default=OUTPUT_DIR, help="directory for per-user recommendation CSVs")
+    parser.add_argument('--workers', type=int, help="training processes, defaults to every core")
+    args = parser.parse_args()
+
+    jobs = load_manifest(args.manifest)
+    token = get_spotify_access_token(CLIENT_ID, CLIENT_SECRET)
+
+    store = TrackStore()
+    cache = LyricsCache()
+    try:
+        outputs = run_batch(jobs, token, store, cache, args.output, args.workers)
+    finally:
+        store.close()
+        cache.close()
+
+    for user, path in outputs.items():
+        print(f"{user}: {path}")
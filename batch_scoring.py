@@ -0,0 +1,145 @@
+'''
+File: batch_scoring.py
+Description: Score large catalogs of candidate tracks in chunks and keep the top recommendations
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import argparse
+import heapq
+import itertools
+import os
+import numpy as np
+import pandas as pd
+
+from data_cleaning import clean_features
+from compact_store import TrackFeatureSet
+from model_registry import ModelRegistry
+from instrumentation import timed
+
+
+# Rows read and scored at a time, bounds memory regardless of catalog size
+CHUNK_SIZE = 100000
+
+# Recommendations kept
+TOP_K = 100
+
+# Columns carried through to the recommendations when present
+ID_COLUMNS = ['id', 'title', 'main_artist']
+
+
+def iter_catalog_chunks(path, chunk_size=CHUNK_SIZE):
+    """
+    Read a catalog of candidate track rows from disk a chunk at a time
+
+    path (str): CSV or Parquet file with the columns produced by clean_track_data and append_sentiment,
+        or a directory saved by TrackFeatureSet which is memory mapped
+    chunk_size (int): rows per chunk
+
+    Yields:
+    pd.DataFrame: next chunk of rows
+    """
+    if os.path.isdir(path):
+        yield from TrackFeatureSet.load(path).iter_frames(chunk_size)
+    elif path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+
+def score_chunks(chunks, model, features, k=TOP_K):
+    """
+    Score chunks of candidate rows and keep the k most likely recommendations
+
+    chunks (iterable[pd.DataFrame]): candidate rows, not yet passed through clean_features
+    model (XGBClassifier): trained model
+    features (list[str]): columns the model was trained on, including is_target
+    k (int): number of recommendations to keep
+
+    Returns:
+    pd.DataFrame: top k rows' identifying columns and probability, best first
+    """
+    feature_columns = [column for column in features if column != 'is_target']
+
+    # Use every core for prediction, restoring the caller's setting afterwards
+    previous_n_jobs = model.get_params().get('n_jobs')
+    model.set_params(n_jobs=-1)
+
+    # Min heap of (probability, tiebreak, row) so the weakest kept row is always on top
+    heap = []
+    counter = itertools.count()
+    scored = 0
+
+    try:
+        for chunk in chunks:
+            chunk = clean_features(chunk)
+            if chunk.empty:
+                continue
+
+            proba = model.predict_proba(chunk.loc[:, feature_columns])[:, 1]
+            scored += len(chunk)
+
+            # Only the chunk's own top k can make it into the overall top k
+            if len(proba) > k:
+                candidates = np.argpartition(proba, -k)[-k:]
+            else:
+                candidates = np.arange(len(proba))
+
+            id_columns = [column for column in ID_COLUMNS if column in chunk.columns]
+            rows = chunk.iloc[candidates][id_columns].to_dict('records')
+            for row, probability in zip(rows, proba[candidates]):
+                item = (float(probability), next(counter), row)
+                if len(heap) < k:
+                    heapq.heappush(heap, item)
+                elif item[0] > heap[0][0]:
+                    heapq.heapreplace(heap, item)
+    finally:
+        model.set_params(n_jobs=previous_n_jobs)
+
+    print(f"{scored} candidate tracks scored.")
+    best = sorted(heap, key=lambda item: item[0], reverse=True)
+    return pd.DataFrame([{**row, 'probability': probability} for probability, _, row in best])
+
+
+
+@timed('score_catalog')
+def score_catalog(path, model, features, k=TOP_K, chunk_size=CHUNK_SIZE):
+    """
+    Score every track in a catalog file and keep the top k recommendations
+
+    path (str): CSV or Parquet file, or TrackFeatureSet directory, of candidate tracks
+    model (XGBClassifier): trained model
+    features (list[str]): columns the model was trained on, including is_target
+    k (int): number of recommendations to keep
+    chunk_size (int): rows read and scored at a time
+
+    Returns:
+    pd.DataFrame: top k rows' identifying columns and probability, best first
+    """
+    print("Scoring catalog...")
+    return score_chunks(iter_catalog_chunks(path, chunk_size), model, features, k)
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a catalog of tracks with a saved model")
+    parser.add_argument('catalog', help="CSV or Parquet file, or TrackFeatureSet directory, of candidate tracks")
+    parser.add_argument('model_key', help="fingerprint of a model saved in the model registry")
+    parser.add_argument('--top-k', type=int, default=TOP_K)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--output', help="CSV file to write recommendations to")
+    args = parser.parse_args()
+
+    saved = ModelRegistry().load(args.model_key)
+    if saved is None:
+        raise Exception(f"No saved model found for {args.model_key}")
+
+    recommendations = score_catalog(args.catalog, *saved, k=args.top_k, chunk_size=args.chunk_size)
+    if args.output:
+        recommendations.to_csv(args.output, index=False)
+    else:
+        print(recommendations.to_string(index=False))
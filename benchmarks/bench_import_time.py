@@ -0,0 +1,104 @@
+'''
+File: bench_import_time.py
+Description: Measure CLI startup with -X importtime and check it stays within a time budget
+Author: Devin Lepur
+Date: 10/17/2026
+
+Run from the repository root:
+    python -m benchmarks.bench_import_time
+    python -m benchmarks.bench_import_time --modules main server --budget-ms 1500
+'''
+
+import argparse
+import os
+import subprocess
+import sys
+
+
+# Entry points timed by default
+MODULES = ['main', 'server', 'batch_curation', 'batch_scoring']
+
+# Startup budget for each entry point, in milliseconds
+BUDGET_MS = 1500
+
+# Dependencies which should only load inside the stages using them
+LAZY_MODULES = ['xgboost', 'sklearn', 'imblearn', 'vaderSentiment', 'bs4', 'tqdm']
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+
+def import_times(module):
+    """
+    Import a module in a fresh interpreter and read the -X importtime report
+
+    module (str): module to import
+
+    Returns:
+    dict: imported module name -> (self microseconds, cumulative microseconds)
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=REPO_ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+
+def report(module, times, budget_ms, top):
+    """
+    Print a module's startup time, slowest imports and lazy dependencies loaded eagerly
+
+    module (str): module imported
+    times (dict): output of import_times
+    budget_ms (float): startup budget
+    top (int): number of slowest top level imports to list
+
+    Returns:
+    bool: True if the module stayed within budget without loading a lazy dependency
+    """
+    total_ms = times[module][1] / 1000
+    eager = [name for name in LAZY_MODULES if name in times]
+    ok = total_ms <= budget_ms and not eager
+
+    print(f"{module}: {total_ms:.0f} ms of {budget_ms:.0f} ms budget {'ok' if ok else 'OVER'}")
+
+    # Top level packages only, nested modules are already counted in their parent's cumulative time
+    packages = sorted(((cumulative, name) for name, (_, cumulative) in times.items()
+                       if '.' not in name and name != module), reverse=True)
+    for cumulative, name in packages[:top]:
+        print(f"    {cumulative / 1000:8.1f} ms  {name}")
+    if eager:
+        print(f"    loaded eagerly: {', '.join(eager)}")
+    return ok
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check entry point import time against a budget")
+    parser.add_argument('--modules', nargs='+', default=MODULES)
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS)
+    parser.add_argument('--top', type=int, default=8, help="slowest imports listed per module")
+    parser.add_argument('--repeats', type=int, default=3, help="fresh interpreters per module, fastest is kept")
+    args = parser.parse_args()
+
+    passed = True
+    for module in args.modules:
+        # Keep the fastest run so a cold disk cache does not count against the budget
+        runs = [import_times(module) for _ in range(args.repeats)]
+        times = min(runs, key=lambda run: run[module][1])
+        passed = report(module, times, args.budget_ms, args.top) and passed
+
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+'''
+File: bench_lyrics_parse.py
+Description: Time lyrics extraction from saved Genius pages for each parsing path
+Author: Devin Lepur
+Date: 10/17/2026
+
+Run from the repository root:
+    python -m benchmarks.bench_lyrics_parse
+'''
+
+import glob
+import os
+import time
+from importlib.util import find_spec
+from bs4 import BeautifulSoup, SoupStrainer
+
+from lyrics import LyricsContainerParser, remove_song_labels
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+REPEATS = 50
+
+# Limits BeautifulSoup to the lyrics containers of a Genius page
+LYRICS_STRAINER = SoupStrainer('div', attrs={'data-lyrics-container': 'true'})
+
+
+def full_page_parse(html):
+    """
+    Previous path: parse the whole page with html.parser then search it
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    texts = [container.get_text(separator='\n').strip()
+             for container in soup.find_all('div', {'data-lyrics-container': 'true'})]
+    return remove_song_labels("\n".join(texts).strip())
+
+
+def strained_parse(parser_name):
+    """
+    Parse only the lyrics containers with the given BeautifulSoup parser
+    """
+    def parse(html):
+        soup = BeautifulSoup(html, parser_name, parse_only=LYRICS_STRAINER)
+        texts = [container.get_text(separator='\n').strip()
+                 for container in soup.find_all('div', {'data-lyrics-container': 'true'})]
+        return remove_song_labels("\n".join(texts).strip())
+    return parse
+
+
+def streaming_parse(html):
+    """
+    Current path: standard library streaming parser used by extract_lyrics
+    """
+    parser = LyricsContainerParser()
+    parser.feed(html)
+    parser.close()
+    return remove_song_labels("\n".join(parser.containers).strip())
+
+
+def main():
+    pages = [open(path, encoding='utf-8').read() for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.html')))]
+    if not pages:
+        raise Exception(f"No HTML fixtures found in {FIXTURE_DIR}")
+
+    paths = {
+        'full page html.parser': full_page_parse,
+        'strained html.parser': strained_parse('html.parser'),
+        'streaming html.parser': streaming_parse,
+    }
+    if find_spec('lxml') is not None:
+        paths['strained lxml'] = strained_parse('lxml')
+
+    expected = [full_page_parse(page) for page in pages]
+    for name, parse in paths.items():
+        assert [parse(page) for page in pages] == expected, f"{name} extracted different lyrics"
+
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            for page in pages:
+                parse(page)
+        per_page = (time.perf_counter() - start) / (REPEATS * len(pages))
+        print(f"{name:>22}: {per_page * 1000:.2f} ms per page")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+'''
+File: bench_pipeline.py
+Description: Time every pipeline stage offline against recorded fixtures and compare with a saved baseline
+Author: Devin Lepur
+Date: 10/17/2026
+
+Run from the repository root:
+    python -m benchmarks.bench_pipeline --tracks 1000 --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_pipeline --tracks 1000 --baseline benchmarks/baseline.json
+
+Network stages request the local fixture server, the rest run on a synthetic catalog of the same size.
+'''
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+import lyrics
+import spotify_client
+from spotify_client import get_playlist_track_ids
+from data_cleaning import get_track_data, clean_track_data, clean_features
+from sentiment import append_sentiment
+from lyrics_cache import LyricsCache
+from model_generation import get_user_model
+from benchmarks.synthetic import SyntheticCatalog, FixtureServer
+
+
+STAGES = ['get_playlist_track_ids', 'get_track_data', 'clean_track_data', 'append_sentiment',
+          'get_user_model', 'predict']
+
+# Stages which send requests and are slow on very large catalogs
+NETWORK_STAGES = ['get_playlist_track_ids', 'get_track_data', 'append_sentiment']
+
+# Relative slowdown against the baseline reported as a regression
+TOLERANCE = 0.2
+
+TARGET_PLAYLIST = 'synthetic-target'
+UNKNOWN_PLAYLIST = 'synthetic-unknown'
+ACCESS_TOKEN = 'synthetic-token'
+
+
+
+class StageTimer:
+    """
+    Record wall time and peak traced memory of each stage run inside it
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.results = {}
+
+
+    def run(self, name, n_tracks, func, *args, **kwargs):
+        """
+        Run one stage and record its time, throughput and peak memory
+
+        name (str): stage name
+        n_tracks (int): tracks handled by the stage, for throughput
+        func (callable): stage to run
+
+        Returns:
+        object: whatever func returns
+        """
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if self.trace_memory else 0
+        if self.trace_memory:
+            tracemalloc.stop()
+
+        self.results[name] = {
+            'tracks': n_tracks,
+            'seconds': seconds,
+            'tracks_per_second': n_tracks / seconds if seconds else float('inf'),
+            'peak_mb': peak / 2**20,
+        }
+        print(f"{name:>24}: {seconds:8.3f}s  {self.results[name]['tracks_per_second']:>11.0f} tracks/s  "
+              f"{self.results[name]['peak_mb']:8.1f} MB peak")
+        return result
+
+
+
+def point_clients_at(url, lyrics_rate):
+    """
+    Send Spotify and Genius requests to the fixture server
+
+    url (str): base URL of the fixture server
+    lyrics_rate (float): Genius requests per second, the real limit would only measure sleeping
+    """
+    spotify_client.API_URL = f'{url}/v1'
+    lyrics.GENIUS_API_URL = f'{url}/genius'
+    lyrics.GENIUS_WEB_URL = url
+    lyrics.GENIUS_API_TOKEN = 'synthetic-token'
+    lyrics._limiter = lyrics.TokenBucket(lyrics_rate)
+
+
+
+def run_stages(catalog, stages, timer):
+    """
+    Run the selected stages in pipeline order, building inputs without requests for skipped ones
+
+    catalog (SyntheticCatalog): tracks to run on
+    stages (list[str]): stages to time
+    timer (StageTimer): records the results
+    """
+    target = catalog.playlist(1)
+    unknown = catalog.playlist(0)
+    n_tracks = catalog.n_tracks
+
+    if 'get_playlist_track_ids' in stages:
+        timer.run('get_playlist_track_ids', n_tracks, lambda: (
+            get_playlist_track_ids(TARGET_PLAYLIST, ACCESS_TOKEN),
+            get_playlist_track_ids(UNKNOWN_PLAYLIST, ACCESS_TOKEN)))
+
+    if 'get_track_data' in stages:
+        target_df, unknown_df = timer.run('get_track_data', n_tracks, lambda: (
+            get_track_data([catalog.track_id(i) for i in target], ACCESS_TOKEN, verbose=False),
+            get_track_data([catalog.track_id(i) for i in unknown], ACCESS_TOKEN, verbose=False)))
+    else:
+        target_df, unknown_df = catalog.frame(target), catalog.frame(unknown)
+
+    target_df['is_target'] = 1
+    unknown_df['is_target'] = 0
+    merged_df = pd.concat([target_df, unknown_df])
+
+    if 'clean_track_data' in stages:
+        merged_df = timer.run('clean_track_data', n_tracks, clean_track_data, merged_df, verbose=False)
+    else:
+        merged_df = clean_track_data(merged_df, verbose=False)
+
+    if 'append_sentiment' in stages:
+        # A fresh in memory cache so every run fetches and scores all lyrics instead of reading the
+        # lyrics cache a previous run left in the working directory
+        cache = LyricsCache(':memory:')
+        try:
+            merged_df = timer.run('append_sentiment', len(merged_df), append_sentiment, merged_df, cache)
+        finally:
+            cache.close()
+    else:
+        for key, value in (('neg', 0.1), ('neu', 0.7), ('pos', 0.2), ('compound', 0.5)):
+            merged_df[key] = value
+
+    if 'get_user_model' in stages or 'predict' in stages:
+        model, features = timer.run('get_user_model', len(merged_df), get_user_model, merged_df.copy())
+
+        def predict():
+            candidates = clean_features(merged_df[merged_df['is_target'] == 0])
+            X = candidates.loc[:, features].drop(columns=['is_target'])
+            return model.predict_proba(X)[:, 1]
+
+        if 'predict' in stages:
+            timer.run('predict', int((merged_df['is_target'] == 0).sum()), predict)
+
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Print each stage's change against a baseline
+
+    results (dict): stage results from StageTimer
+    baseline (dict): results saved by an earlier run
+    tolerance (float): relative slowdown counted as a regression
+
+    Returns:
+    list[str]: stages slower than the baseline by more than tolerance
+    """
+    regressions = []
+    print(f"\n{'stage':>24}  {'baseline':>9}  {'current':>9}  {'change':>8}  {'peak MB':>15}")
+    for name, current in results.items():
+        if name not in baseline['stages']:
+            continue
+        previous = baseline['stages'][name]
+
+        # Compare throughput so runs of a different size stay comparable
+        change = previous['tracks_per_second'] / current['tracks_per_second'] - 1
+        flag = ''
+        if change > tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:>24}  {previous['seconds']:8.3f}s  {current['seconds']:8.3f}s  {change:+8.1%}  "
+              f"{previous['peak_mb']:6.1f} -> {current['peak_mb']:6.1f}{flag}")
+    return regressions
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage offline")
+    parser.add_argument('--tracks', type=int, default=1000, help="Synthetic catalog size, 1k to 1M")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--offline-only', action='store_true', help="Skip stages which send requests")
+    parser.add_argument('--lyrics-rate', type=float, default=1000.0, help="Genius requests per second")
+    parser.add_argument('--no-memory', action='store_true', help="Skip memory tracing, which slows Python code")
+    parser.add_argument('--baseline', help="JSON results to compare against")
+    parser.add_argument('--save-baseline', help="Write results as JSON to this path")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    stages = [stage for stage in args.stages if not (args.offline_only and stage in NETWORK_STAGES)]
+
+    print(f"Generating {args.tracks} synthetic tracks...")
+    catalog = SyntheticCatalog(args.tracks, args.seed)
+    playlists = {TARGET_PLAYLIST: catalog.playlist(1), UNKNOWN_PLAYLIST: catalog.playlist(0)}
+    timer = StageTimer(trace_memory=not args.no_memory)
+
+    with FixtureServer(catalog, playlists) as server:
+        point_clients_at(server.url, args.lyrics_rate)
+        run_stages(catalog, stages, timer)
+
+    report = {
+        'tracks': args.tracks,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'stages': timer.results,
+    }
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(timer.results, baseline, args.tolerance)
+        if regressions:
+            print(f"Slower than baseline: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
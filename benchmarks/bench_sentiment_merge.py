@@ -0,0 +1,90 @@
+'''
+File: bench_sentiment_merge.py
+Description: Compare row-wise and columnar merging of sentiment scores into a track dataframe
+Author: Devin Lepur
+Date: 10/17/2026
+
+Run from the repository root:
+    python -m benchmarks.bench_sentiment_merge
+'''
+
+import time
+import numpy as np
+import pandas as pd
+
+from sentiment import assign_sentiment, SENTIMENT_KEYS
+
+
+def make_tracks(n_rows, seed=0):
+    """
+    Build a synthetic track dataframe with the columns the merge touches
+
+    n_rows (int): number of tracks
+    seed (int): random seed
+
+    Returns:
+    pd.DataFrame: titles, artists, labels and predictions
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'title': [f'Song {i}' for i in range(n_rows)],
+        'main_artist': [f'Artist {i % 1000}' for i in range(n_rows)],
+        'is_target': rng.integers(0, 2, n_rows),
+        'pred_label': rng.integers(0, 2, n_rows),
+    })
+
+
+def rowwise_merge(df, results):
+    """
+    Previous path: object columns filled one cell at a time, then cast
+    """
+    for key in SENTIMENT_KEYS:
+        df[key] = None
+    for idx, scores in results:
+        for key in SENTIMENT_KEYS:
+            df.at[idx, key] = scores[key]
+    for key in SENTIMENT_KEYS:
+        df[key] = df[key].astype(float)
+
+    recommended = []
+    for index, song in df.iterrows():
+        if (song['is_target'] == 0) and (song['pred_label'] == 1):
+            recommended.append((song['title'], song['main_artist']))
+    return recommended
+
+
+def columnar_merge(df, results):
+    """
+    Current path: scores collected into a float64 array and assigned in bulk
+    """
+    scores = np.full((len(df), len(SENTIMENT_KEYS)), np.nan, dtype=np.float64)
+    for i, sentiment_scores in results:
+        scores[i] = [sentiment_scores[key] for key in SENTIMENT_KEYS]
+    assign_sentiment(df, scores)
+
+    recommended = df[(df['is_target'] == 0) & (df['pred_label'] == 1)]
+    return list(zip(recommended['title'], recommended['main_artist']))
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    for n_rows in (10_000, 100_000):
+        rng = np.random.default_rng(n_rows)
+        values = rng.random((n_rows, len(SENTIMENT_KEYS)))
+        results = [(i, dict(zip(SENTIMENT_KEYS, row))) for i, row in enumerate(values)]
+
+        rowwise_time, rowwise_out = time_call(rowwise_merge, make_tracks(n_rows), results)
+        columnar_time, columnar_out = time_call(columnar_merge, make_tracks(n_rows), results)
+        assert rowwise_out == columnar_out
+
+        print(f"{n_rows:>7} rows: row-wise {rowwise_time:.3f}s, columnar {columnar_time:.3f}s, "
+              f"{rowwise_time / columnar_time:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
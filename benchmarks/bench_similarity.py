@@ -0,0 +1,119 @@
+'''
+File: bench_similarity.py
+Description: Recall and latency of the similarity index against a ball tree and brute force search
+Author: Devin Lepur
+Date: 10/17/2026
+
+Run from the repository root:
+    python -m benchmarks.bench_similarity --tracks 100000
+'''
+
+import argparse
+import time
+import numpy as np
+
+from data_cleaning import clean_track_data
+from similarity_index import SimilarityIndex, TOP_K
+from benchmarks.synthetic import SyntheticCatalog
+
+
+def make_tracks(n_tracks, seed=0):
+    """
+    Build cleaned synthetic tracks with sentiment columns
+
+    n_tracks (int): number of tracks
+    seed (int): random seed
+
+    Returns:
+    pd.DataFrame: tracks ready to index
+    """
+    df = clean_track_data(SyntheticCatalog(n_tracks, seed).frame(), verbose=False)
+    df['id'] = [SyntheticCatalog.track_id(i) for i in df.index]
+
+    rng = np.random.default_rng(seed)
+    sentiment = rng.dirichlet([1, 4, 1], len(df))
+    df['neg'], df['neu'], df['pos'] = sentiment.T
+    df['compound'] = rng.uniform(-1, 1, len(df))
+    return df
+
+
+def brute_force(index, vectors, k, exclude_rows):
+    """
+    Exact nearest rows by comparing every indexed vector, without the index's matrix product
+    """
+    distances = np.sqrt(((index.vectors[None, :, :] - vectors[:, None, :]) ** 2).sum(axis=2))
+    distances[:, exclude_rows] = np.inf
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def percentiles(times):
+    times = np.asarray(times) * 1000
+    return f"p50 {np.percentile(times, 50):.2f} ms, p95 {np.percentile(times, 95):.2f} ms"
+
+
+def measure(index, n_queries, k, seed):
+    """
+    Time single seed queries on the index, a ball tree and by brute force, and check the index's results
+
+    Returns:
+    float: mean recall of the index against brute force
+    """
+    from sklearn.neighbors import BallTree
+    tree = BallTree(index.vectors)
+
+    rng = np.random.default_rng(seed)
+    seeds = rng.choice(len(index), n_queries, replace=False)
+
+    index_times, tree_times, brute_times, recalls = [], [], [], []
+    for row in seeds:
+        track_id = index.track_ids[row]
+
+        start = time.perf_counter()
+        results = index.similar_to_tracks([track_id], k)
+        index_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        tree.query(index.vectors[[row]], k=k + 1)
+        tree_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        exact = brute_force(index, index.vectors[[row]], k, [row])[0]
+        brute_times.append(time.perf_counter() - start)
+
+        exact_ids = {index.track_ids[i] for i in exact}
+        recalls.append(len(exact_ids & set(results['id'])) / k)
+
+    print(f"    index:       {percentiles(index_times)}")
+    print(f"    ball tree:   {percentiles(tree_times)}")
+    print(f"    brute force: {percentiles(brute_times)}")
+    print(f"    recall@{k}: {np.mean(recalls):.3f}")
+    return float(np.mean(recalls))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the similarity index against a ball tree and brute force")
+    parser.add_argument('--tracks', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=TOP_K)
+    parser.add_argument('--insert-share', type=float, default=0.05,
+                        help="share of tracks inserted after the build")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    df = make_tracks(args.tracks, args.seed)
+    n_built = int(len(df) * (1 - args.insert_share))
+
+    start = time.perf_counter()
+    index = SimilarityIndex.build(df.iloc[:n_built])
+    print(f"Built index of {len(index)} tracks in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    added = index.insert(df.iloc[n_built:])
+    print(f"Inserted {added} tracks in {time.perf_counter() - start:.2f}s")
+
+    print("Single seed queries:")
+    measure(index, args.queries, args.top_k, args.seed)
+
+
+if __name__ == "__main__":
+    main()
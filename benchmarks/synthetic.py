@@ -0,0 +1,284 @@
+'''
+File: synthetic.py
+Description: Synthetic track catalogs and a local server replaying recorded Spotify and Genius fixtures
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import copy
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import pandas as pd
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# Recorded responses every synthetic track is built from
+with open(os.path.join(FIXTURE_DIR, 'spotify_audio_features.json')) as f:
+    AUDIO_FEATURES_FIXTURE = json.load(f)
+with open(os.path.join(FIXTURE_DIR, 'spotify_track.json')) as f:
+    TRACK_FIXTURE = json.load(f)
+with open(os.path.join(FIXTURE_DIR, 'genius_search.json')) as f:
+    GENIUS_SEARCH_FIXTURE = json.load(f)
+with open(os.path.join(FIXTURE_DIR, 'genius_song.html'), 'rb') as f:
+    GENIUS_SONG_FIXTURE = f.read()
+
+# Audio features drawn uniformly from these ranges
+UNIT_FEATURES = ['danceability', 'energy', 'speechiness', 'acousticness', 'instrumentalness', 'liveness', 'valence']
+FEATURE_RANGES = {
+    **{feature: (0.0, 1.0) for feature in UNIT_FEATURES},
+    'loudness': (-30.0, 0.0),
+    'tempo': (60.0, 200.0),
+}
+
+# Distinct artists in a synthetic catalog
+N_ARTISTS = 5000
+
+SONG_PATTERN = re.compile(r'Synthetic Song (\d+)')
+
+# Spotify page sizes used by the fixture server
+PLAYLIST_PAGE_SIZE = 100
+
+
+
+class SyntheticCatalog:
+    """
+    Reproducible catalog of fake tracks, every value derived from the track's index
+
+    Target tracks lean towards high energy and danceability so a model has something to learn.
+    """
+
+    def __init__(self, n_tracks, seed=0, target_share=0.1):
+        """
+        n_tracks (int): number of tracks, 1k to 1M is practical
+        seed (int): random seed
+        target_share (float): share of tracks belonging to the target playlist
+        """
+        rng = np.random.default_rng(seed)
+        self.n_tracks = n_tracks
+        self.is_target = (rng.random(n_tracks) < target_share).astype(np.int8)
+
+        self.features = {}
+        for feature, (low, high) in FEATURE_RANGES.items():
+            self.features[feature] = rng.uniform(low, high, n_tracks).astype(np.float32)
+        for feature in ('danceability', 'energy'):
+            shifted = self.features[feature] + 0.3 * self.is_target
+            self.features[feature] = np.clip(shifted, 0, 1).astype(np.float32)
+
+        self.key = rng.integers(0, 12, n_tracks, dtype=np.int8)
+        self.mode = rng.integers(0, 2, n_tracks, dtype=np.int8)
+        self.time_signature = rng.choice(np.array([3, 4, 5], dtype=np.int8), n_tracks)
+        self.duration_ms = rng.integers(90_000, 420_000, n_tracks, dtype=np.int32)
+        self.popularity = rng.integers(0, 101, n_tracks, dtype=np.int8)
+        self.release_date = (np.datetime64('1960-01-01')
+                             + rng.integers(0, 23_000, n_tracks).astype('timedelta64[D]'))
+
+
+    @staticmethod
+    def track_id(i):
+        return f'{i:022d}'
+
+
+    @staticmethod
+    def track_index(track_id):
+        return int(track_id)
+
+
+    def playlist(self, is_target):
+        """
+        Indices of the tracks in the target or unknown playlist
+
+        is_target (int): 1 for the target playlist, 0 for the unknown one
+
+        Returns:
+        np.ndarray: track indices
+        """
+        return np.flatnonzero(self.is_target == is_target)
+
+
+    def audio_features(self, i):
+        """
+        Build an audio features response object for one track
+
+        i (int): track index
+
+        Returns:
+        dict: object shaped like AUDIO_FEATURES_FIXTURE
+        """
+        track_id = self.track_id(i)
+        obj = dict(AUDIO_FEATURES_FIXTURE)
+        obj.update({feature: round(float(values[i]), 4) for feature, values in self.features.items()})
+        obj.update({
+            'key': int(self.key[i]),
+            'mode': int(self.mode[i]),
+            'time_signature': int(self.time_signature[i]),
+            'duration_ms': int(self.duration_ms[i]),
+            'id': track_id,
+            'uri': f'spotify:track:{track_id}',
+            'track_href': f'https://api.spotify.com/v1/tracks/{track_id}',
+            'analysis_url': f'https://api.spotify.com/v1/audio-analysis/{track_id}',
+        })
+        return obj
+
+
+    def track(self, i):
+        """
+        Build a track response object for one track
+
+        i (int): track index
+
+        Returns:
+        dict: object shaped like TRACK_FIXTURE
+        """
+        obj = copy.deepcopy(TRACK_FIXTURE)
+        obj['id'] = self.track_id(i)
+        obj['name'] = f'Synthetic Song {i}'
+        obj['artists'][0]['name'] = f'Synthetic Artist {i % N_ARTISTS}'
+        obj['popularity'] = int(self.popularity[i])
+        obj['duration_ms'] = int(self.duration_ms[i])
+        obj['album']['release_date'] = str(self.release_date[i])
+        return obj
+
+
+    def frame(self, indices=None):
+        """
+        Build the frame get_track_data would return, without any requests
+
+        indices (np.ndarray): track indices to include, all tracks if None
+
+        Returns:
+        pd.DataFrame: audio features plus id, title, main_artist, popularity and release_date
+        """
+        if indices is None:
+            indices = np.arange(self.n_tracks)
+
+        columns = {feature: values[indices].astype(np.float64) for feature, values in self.features.items()}
+        columns.update({
+            'key': self.key[indices].astype(np.int64),
+            'mode': self.mode[indices].astype(np.int64),
+            'time_signature': self.time_signature[indices].astype(np.int64),
+            'duration_ms': self.duration_ms[indices].astype(np.int64),
+            'id': [self.track_id(i) for i in indices],
+            'title': [f'Synthetic Song {i}' for i in indices],
+            'main_artist': [f'Synthetic Artist {i % N_ARTISTS}' for i in indices],
+            'popularity': self.popularity[indices].astype(np.int64),
+            'release_date': self.release_date[indices].astype(str),
+        })
+        return pd.DataFrame(columns)
+
+
+
+def make_handler(catalog, playlists):
+    """
+    Build a request handler serving fixture responses for a catalog
+
+    catalog (SyntheticCatalog): tracks to serve
+    playlists (dict[str, np.ndarray]): track indices of each playlist ID
+
+    Returns:
+    type: BaseHTTPRequestHandler subclass
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+
+        # Keep connections alive so client pools behave as they do against the real APIs
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_body(self, status, data, content_type='application/json'):
+            if not isinstance(data, bytes):
+                data = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            parts = url.path.strip('/').split('/')
+
+            if parts[:2] == ['v1', 'playlists'] and len(parts) == 4 and parts[3] == 'tracks':
+                self.send_body(*self.playlist_page(parts[2], query))
+            elif parts[:2] == ['v1', 'playlists'] and len(parts) == 3:
+                self.send_body(200, {'snapshot_id': f'synthetic-{catalog.n_tracks}'})
+            elif parts == ['v1', 'audio-features']:
+                ids = query['ids'][0].split(',')
+                self.send_body(200, {'audio_features': [catalog.audio_features(catalog.track_index(i)) for i in ids]})
+            elif parts == ['v1', 'tracks']:
+                ids = query['ids'][0].split(',')
+                self.send_body(200, {'tracks': [catalog.track(catalog.track_index(i)) for i in ids]})
+            elif parts == ['genius', 'search']:
+                match = SONG_PATTERN.search(query.get('q', [''])[0])
+                body = copy.deepcopy(GENIUS_SEARCH_FIXTURE)
+                if match is None:
+                    body['response']['hits'] = []
+                else:
+                    body['response']['hits'][0]['result']['path'] = f'/songs/{match.group(1)}'
+                self.send_body(200, body)
+            elif parts[0] == 'songs':
+                self.send_body(200, GENIUS_SONG_FIXTURE, 'text/html; charset=utf-8')
+            else:
+                self.send_body(404, {'error': 'not found'})
+
+        def playlist_page(self, playlist_id, query):
+            if playlist_id not in playlists:
+                return 404, {'error': 'playlist not found'}
+
+            indices = playlists[playlist_id]
+            offset = int(query.get('offset', ['0'])[0])
+            limit = int(query.get('limit', [str(PLAYLIST_PAGE_SIZE)])[0])
+            page = indices[offset:offset + limit]
+
+            next_url = None
+            if offset + limit < len(indices):
+                host = self.headers.get('Host')
+                next_url = f'http://{host}/v1/playlists/{playlist_id}/tracks?offset={offset + limit}&limit={limit}'
+
+            return 200, {
+                'items': [{'track': {'id': catalog.track_id(i)}} for i in page],
+                'limit': limit,
+                'offset': offset,
+                'total': len(indices),
+                'next': next_url,
+            }
+
+    return Handler
+
+
+
+class FixtureServer:
+    """
+    Local stand in for the Spotify and Genius APIs, run in a background thread
+
+    Spotify endpoints live under {url}/v1, the Genius API under {url}/genius and song pages under {url}.
+    """
+
+    def __init__(self, catalog, playlists):
+        """
+        catalog (SyntheticCatalog): tracks to serve
+        playlists (dict[str, np.ndarray]): track indices of each playlist ID
+        """
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(catalog, playlists))
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
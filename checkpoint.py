@@ -0,0 +1,216 @@
+'''
+File: checkpoint.py
+Description: Stage checkpoints in a run directory so interrupted curation runs can resume
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import json
+import os
+import shutil
+import threading
+import pandas as pd
+
+from dedup_index import normalize_key
+from environment import load_environment
+
+
+# Load enviornment variables
+load_environment()
+
+# Parent directory of every run directory, can be overridden in the enviornment
+RUNS_DIR = os.getenv('CURATION_RUNS_DIR', 'runs')
+
+# Per-track lyrics and sentiment, one JSON object appended per line as tracks finish
+JOURNAL_NAME = 'sentiment.jsonl'
+
+
+
+def get_run_dir(*playlist_ids):
+    """
+    Get the run directory used for a set of playlists
+
+    playlist_ids (str): playlists curated by the run
+
+    Returns:
+    str: directory under RUNS_DIR
+    """
+    return os.path.join(RUNS_DIR, '-'.join(playlist_ids))
+
+
+
+class RunCheckpoint:
+    """
+    Output of each completed stage plus a journal of per-track sentiment for one run
+
+    A stage counts as complete once its file exists, files are written to a temporary name
+    and renamed so a killed run never leaves a partial stage behind.
+    """
+
+    def __init__(self, path, resume=False):
+        """
+        path (str): run directory
+        resume (bool): keep the outputs of a previous run, otherwise they are cleared
+        """
+        self.path = path
+        if not resume and os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._lyrics = {}
+        self._scores = {}
+        self._read_journal()
+        self._journal = open(os.path.join(path, JOURNAL_NAME), 'a')
+
+
+    def _read_journal(self):
+        journal_path = os.path.join(self.path, JOURNAL_NAME)
+        complete = 0
+        try:
+            with open(journal_path, 'rb') as f:
+                for line in f:
+                    # The run was killed mid write, every earlier line is still usable
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    if 'scores' in entry:
+                        self._scores[entry['key']] = entry['scores']
+                    else:
+                        self._lyrics[entry['key']] = entry['lyrics']
+                    complete += len(line)
+        except FileNotFoundError:
+            return
+
+        # Cut off the partial line so entries appended by this run start on a line of their own
+        if complete < os.path.getsize(journal_path):
+            os.truncate(journal_path, complete)
+
+        if self._scores or self._lyrics:
+            print(f"Resuming with {len(self._scores)} scored tracks and {len(self._lyrics)} fetched lyrics.")
+
+
+    def _stage_paths(self, stage):
+        return os.path.join(self.path, f'{stage}.json'), os.path.join(self.path, f'{stage}.pkl')
+
+
+    def done(self, stage):
+        """
+        stage (str): stage name
+
+        Returns:
+        bool: True if the stage's output was saved
+        """
+        return any(os.path.exists(path) for path in self._stage_paths(stage))
+
+
+    def save(self, stage, output):
+        """
+        Save a stage's output, dataframes as pickles and everything else as JSON
+
+        stage (str): stage name
+        output: track IDs list or dataframe produced by the stage
+        """
+        json_path, frame_path = self._stage_paths(stage)
+        path = frame_path if isinstance(output, pd.DataFrame) else json_path
+        temp_path = f'{path}.tmp'
+
+        if isinstance(output, pd.DataFrame):
+            output.to_pickle(temp_path)
+        else:
+            with open(temp_path, 'w') as f:
+                json.dump(output, f)
+        os.replace(temp_path, path)
+
+
+    def load(self, stage):
+        """
+        Load a stage's saved output
+
+        stage (str): stage name
+
+        Returns:
+        saved output, None if the stage is not complete
+        """
+        json_path, frame_path = self._stage_paths(stage)
+        if os.path.exists(frame_path):
+            return pd.read_pickle(frame_path)
+        if os.path.exists(json_path):
+            with open(json_path) as f:
+                return json.load(f)
+        return None
+
+
+    def run(self, stage, func, *args, **kwargs):
+        """
+        Run a stage unless a previous run already completed it
+
+        stage (str): stage name
+        func (callable): stage function returning a list or dataframe
+
+        Returns:
+        the stage's output, loaded from the run directory if already complete
+        """
+        if self.done(stage):
+            print(f"Stage {stage} already complete, loading saved output.")
+            return self.load(stage)
+
+        output = func(*args, **kwargs)
+        self.save(stage, output)
+        return output
+
+
+    def _append(self, entry):
+        with self._lock:
+            self._journal.write(json.dumps(entry) + '\n')
+            self._journal.flush()
+
+
+    def get_lyrics(self, song_title, artist_name):
+        """
+        Returns:
+        str: lyrics fetched for the song by an earlier run, None if not fetched
+        """
+        return self._lyrics.get(normalize_key(song_title, artist_name))
+
+
+    def put_lyrics(self, song_title, artist_name, lyrics):
+        """
+        Record lyrics as soon as they are fetched
+
+        song_title (str): title of song
+        artist_name (str): name of the song's main artist
+        lyrics (str): cleaned lyrics or one of NEGATIVE_RESULTS
+        """
+        key = normalize_key(song_title, artist_name)
+        self._lyrics[key] = lyrics
+        self._append({'key': key, 'lyrics': lyrics})
+
+
+    def get_sentiment(self, song_title, artist_name):
+        """
+        Returns:
+        list[float]: neg, neu, pos and compound scores from an earlier run, None if not scored
+        """
+        return self._scores.get(normalize_key(song_title, artist_name))
+
+
+    def put_sentiment(self, song_title, artist_name, scores):
+        """
+        Record a song's sentiment scores
+
+        song_title (str): title of song
+        artist_name (str): name of the song's main artist
+        scores (list[float]): neg, neu, pos and compound scores
+        """
+        key = normalize_key(song_title, artist_name)
+        self._scores[key] = list(scores)
+        self._append({'key': key, 'scores': list(scores)})
+
+
+    def close(self):
+        with self._lock:
+            self._journal.close()
@@ -0,0 +1,269 @@
+'''
+File: compact_store.py
+Description: Compact, memory mapped columnar storage of track features and sentiment
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import json
+import os
+import numpy as np
+import pandas as pd
+
+
+# Numeric columns produced by clean_track_data and append_sentiment, stored as float32
+FEATURE_COLUMNS = [
+    'danceability', 'energy', 'key', 'loudness', 'mode', 'speechiness', 'acousticness',
+    'instrumentalness', 'liveness', 'valence', 'tempo', 'duration_min', 'time_signature',
+    'popularity', 'years_since_release', 'neg', 'neu', 'pos', 'compound',
+]
+
+# Label stored for tracks without an is_target value
+UNLABELED = -1
+
+
+
+class StringTable:
+    """
+    Strings packed end to end in one UTF-8 buffer with an offset per string
+
+    Fixed width numpy strings pad every entry to the longest at 4 bytes per character,
+    here each string costs its UTF-8 length plus an 8 byte offset.
+    """
+
+    def __init__(self, offsets, blob):
+        """
+        offsets (np.ndarray): int64 offsets, string i is blob[offsets[i]:offsets[i + 1]]
+        blob (np.ndarray): uint8 UTF-8 bytes of every string
+        """
+        self.offsets = offsets
+        self.blob = blob
+
+
+    @classmethod
+    def from_strings(cls, values):
+        """
+        values (iterable[str]): strings to pack
+
+        Returns:
+        StringTable: table holding values in order
+        """
+        encoded = [str(value).encode() for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+    def lookup(self, indices):
+        """
+        indices (array-like): positions of the strings wanted
+
+        Returns:
+        list[str]: decoded strings in the order of indices
+        """
+        starts = self.offsets[:-1][indices].tolist()
+        stops = self.offsets[1:][indices].tolist()
+        return [self.blob[start:stop].tobytes().decode() for start, stop in zip(starts, stops)]
+
+
+    def nbytes(self):
+        return self.offsets.nbytes + self.blob.nbytes
+
+
+
+class TrackFeatureSet:
+    """
+    Track features as one contiguous float32 matrix with interned titles and artists
+
+    Row i is the integer ID of track_ids[i], kept as UTF-8 bytes. Titles and artists are stored
+    as int32 codes into StringTable vocabularies so repeated strings are kept once.
+    """
+
+    def __init__(self, features, columns, track_ids, title_codes, titles,
+                 artist_codes, artists, labels):
+        self.features = features
+        self.columns = list(columns)
+        self.track_ids = track_ids
+        self.title_codes = title_codes
+        self.titles = titles
+        self.artist_codes = artist_codes
+        self.artists = artists
+        self.labels = labels
+        self._row_of = None
+
+
+    @classmethod
+    def from_frame(cls, df, columns=FEATURE_COLUMNS):
+        """
+        Build a compact feature set from a track dataframe
+
+        df (pd.DataFrame): tracks with the feature columns, title and main_artist, optionally id and is_target
+        columns (list[str]): numeric columns to store
+
+        Returns:
+        TrackFeatureSet: compact copy of the frame
+        """
+        columns = [column for column in columns if column in df.columns]
+        features = np.ascontiguousarray(df[columns].to_numpy(dtype=np.float32))
+
+        title_codes, titles = pd.factorize(df['title'])
+        artist_codes, artists = pd.factorize(df['main_artist'])
+
+        ids = df['id'] if 'id' in df.columns else range(len(df))
+        track_ids = np.array([str(track_id).encode() for track_id in ids], dtype=np.bytes_)
+        if 'is_target' in df.columns:
+            labels = df['is_target'].fillna(UNLABELED).to_numpy(dtype=np.int8)
+        else:
+            labels = np.full(len(df), UNLABELED, dtype=np.int8)
+
+        return cls(features, columns, track_ids, title_codes.astype(np.int32), StringTable.from_strings(titles),
+                   artist_codes.astype(np.int32), StringTable.from_strings(artists), labels)
+
+
+    def __len__(self):
+        return self.features.shape[0]
+
+
+    def row_of(self, track_id):
+        """
+        Get the integer row ID of a Spotify track ID
+
+        track_id (str): Spotify track ID
+
+        Returns:
+        int: row index into features, None if not stored
+        """
+        if self._row_of is None:
+            self._row_of = {track_id.decode(): row for row, track_id in enumerate(self.track_ids.tolist())}
+        return self._row_of.get(track_id)
+
+
+    def save(self, path):
+        """
+        Write the feature set to a directory of .npy files that can be memory mapped
+
+        path (str): directory to write, created if missing
+        """
+        os.makedirs(path, exist_ok=True)
+        arrays = {
+            'features': self.features,
+            'track_ids': self.track_ids,
+            'title_codes': self.title_codes,
+            'title_offsets': self.titles.offsets,
+            'title_blob': self.titles.blob,
+            'artist_codes': self.artist_codes,
+            'artist_offsets': self.artists.offsets,
+            'artist_blob': self.artists.blob,
+            'labels': self.labels,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(path, f'{name}.npy'), array)
+
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'columns': self.columns, 'rows': len(self)}, f)
+
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load a feature set written by save
+
+        path (str): directory written by save
+        mmap (bool): memory map the arrays instead of reading them into memory
+
+        Returns:
+        TrackFeatureSet: feature set backed by the files on disk
+        """
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+
+        mmap_mode = 'r' if mmap else None
+        def load_array(name):
+            return np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+
+        return cls(load_array('features'), meta['columns'], load_array('track_ids'),
+                   load_array('title_codes'), StringTable(load_array('title_offsets'), load_array('title_blob')),
+                   load_array('artist_codes'), StringTable(load_array('artist_offsets'), load_array('artist_blob')),
+                   load_array('labels'))
+
+
+    def to_frame(self, start=0, stop=None):
+        """
+        View rows as a dataframe for the training and scoring paths
+
+        start (int): first row
+        stop (int): row to stop before, defaults to the end
+
+        Returns:
+        pd.DataFrame: float32 feature columns plus id, title, main_artist and is_target if labeled
+        """
+        return self._frame(slice(start, stop))
+
+
+    def take(self, rows):
+        """
+        Copy selected rows into a dataframe, keeping the features float32
+
+        rows (array-like): integer row IDs in the order wanted
+
+        Returns:
+        pd.DataFrame: float32 feature columns plus id, title, main_artist and is_target if labeled
+        """
+        return self._frame(np.asarray(rows, dtype=np.int64))
+
+
+    def _frame(self, rows):
+        df = pd.DataFrame(self.features[rows], columns=self.columns, copy=False)
+        df['id'] = np.char.decode(self.track_ids[rows], 'utf-8')
+        df['title'] = _categorical(self.title_codes[rows], self.titles)
+        df['main_artist'] = _categorical(self.artist_codes[rows], self.artists)
+
+        labels = self.labels[rows]
+        if (labels != UNLABELED).all():
+            df['is_target'] = labels
+        return df
+
+
+    def iter_frames(self, chunk_size):
+        """
+        View the feature set as consecutive dataframes
+
+        chunk_size (int): rows per frame
+
+        Yields:
+        pd.DataFrame: next chunk of rows from to_frame
+        """
+        for start in range(0, len(self), chunk_size):
+            yield self.to_frame(start, start + chunk_size)
+
+
+    def nbytes(self):
+        """
+        Returns:
+        int: bytes used by the stored arrays
+        """
+        arrays = sum(array.nbytes for array in (self.features, self.track_ids, self.title_codes,
+                                                self.artist_codes, self.labels))
+        return arrays + self.titles.nbytes() + self.artists.nbytes()
+
+
+
+def _categorical(codes, table):
+    """
+    Decode only the vocabulary entries used by some rows
+
+    codes (np.ndarray): int32 codes into table
+    table (StringTable): vocabulary
+
+    Returns:
+    pd.Categorical: strings of the rows, categories limited to the ones used, NaN where the code is -1
+    """
+    present = codes >= 0
+    used, inverse = np.unique(codes[present], return_inverse=True)
+    local_codes = np.full(len(codes), -1, dtype=np.int32)
+    local_codes[present] = inverse.reshape(-1)
+    return pd.Categorical.from_codes(local_codes, table.lookup(used))
@@ -5,72 +5,257 @@ Author: Devin Lepur
 Date: 06/30/2024
 '''
 
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from spotify_client import  get_audio_features, get_title_artist
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from spotify_client import get_client
+from dedup_index import normalize_key
+from instrumentation import timed
 
 
-def get_track_data(track_ids, access_token):
+# Features deemed unfit for training
+DROPPED_FEATURES = ['mode', 'time_signature', 'loudness', 'neu', 'compound']
+
+# Features with skew near 0, spread with a cube root
+CBRT_FEATURES = ['instrumentalness', 'acousticness', 'liveness', 'pos', 'neg', 'speechiness']
+
+# Features with skew near |1|, spread by cubing
+CUBE_FEATURES = ['danceability', 'energy']
+
+# Declarative spec of clean_features, shared by training and inference
+FEATURE_TRANSFORMS = {
+    **{column: 'drop' for column in DROPPED_FEATURES},
+    **{column: 'cbrt' for column in CBRT_FEATURES},
+    **{column: 'cube' for column in CUBE_FEATURES},
+}
+
+# Ufunc applying each transform in the spec to a column's values
+TRANSFORM_UFUNCS = {
+    'cbrt': np.cbrt,
+    'cube': lambda values: np.power(values, 3),
+}
+
+# Spotify audio feature fields with no use for the model
+UNUSED_TRACK_COLUMNS = ['type', 'id', 'uri', 'track_href', 'analysis_url']
+
+
+@timed('get_track_data')
+def get_track_data(track_ids, access_token, store=None, verbose=True):
     """
     Get all data to be used in a dataframe from track ids
 
     track_ids (list[str]): list of track IDs
     access_token (str): Access token for Spotify authorization
+    store (TrackStore): local store of previously fetched tracks, optional
+    verbose (bool): print progress messages
 
     Returns:
     pd.DataFrame: df containing audio features plus track title and artist
     """
     # Output to display where program is at
-    print("Getting tracks' Spotify data...")
+    if verbose:
+        print("Getting tracks' Spotify data...")
+
+    # Only request tracks the store does not already have
+    fetch_ids = track_ids if store is None else store.missing_track_ids(track_ids)
+
+    combined_df = fetch_track_data(fetch_ids, access_token)
 
-    audio_features = get_audio_features(track_ids, access_token)
-    title_artist = get_title_artist(track_ids, access_token)
+    if store is not None:
+        store.put_tracks(combined_df.to_dict('records'))
 
-    combined_df = pd.merge(audio_features, title_artist, on='id')
+        # Tracks without audio features would otherwise be requested again on every run
+        fetched = set(combined_df['id']) if not combined_df.empty else set()
+        store.put_unavailable([track_id for track_id in fetch_ids if track_id not in fetched])
+        if verbose:
+            print(f"{len(track_ids) - len(fetch_ids)} tracks loaded from store, {len(fetch_ids)} fetched.")
 
-    print("Tracks' Spotify data collected.")
+        # Rebuild the frame for every requested track in the original order
+        stored = store.get_tracks(track_ids)
+        combined_df = pd.DataFrame([stored[track_id] for track_id in track_ids if track_id in stored])
+
+    if verbose:
+        print("Tracks' Spotify data collected.")
     return combined_df
 
 
 
-def clean_track_data(df):
+def fetch_track_data(track_ids, access_token):
+    """
+    Request audio features, title and artist for track ids from Spotify
+
+    track_ids (list[str]): list of track IDs
+    access_token (str): Access token for Spotify authorization
+
+    Returns:
+    pd.DataFrame: df containing audio features plus track title and artist
+    """
+    # Audio features and track metadata are independent so request them together
+    client = get_client(access_token)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        features_future = executor.submit(client.get_audio_features, track_ids)
+        title_artist_future = executor.submit(client.get_title_artist, track_ids)
+        audio_features = features_future.result()
+        title_artist = title_artist_future.result()
+
+    if audio_features.empty:
+        return pd.DataFrame()
+
+    return pd.merge(audio_features, title_artist, on='id')
+
+
+
+def parse_release_dates(values):
+    """
+    Parse Spotify release dates given to year, month or day precision in one vectorized pass
+
+    values (array-like): release date strings such as '1999', '1999-04' or '1999-04-20'
+
+    Returns:
+    np.ndarray: datetime64[D] dates, partial dates falling on the first day of their period
+    """
+    try:
+        return np.asarray(values, dtype='datetime64[D]')
+    except ValueError:
+        # Fall back to pandas for any format numpy does not understand
+        return pd.to_datetime(pd.Series(values), format='mixed').to_numpy(dtype='datetime64[D]')
+
+
+
+@timed('clean_track_data')
+def clean_track_data(df, verbose=True, index=None):
     """
     Clean a provided dataframe of missing values and repeats
     
     df (pd.DataFrame): dataframe of audio features and song info
+    verbose (bool): print progress messages
+    index (DedupIndex): persistent index of known tracks, optional
     
     Returns:
     pd.DataFrame: cleaned df ready for exploration or models
     """
     # Output to display where program is at
-    print("Cleaning track data...")
-
-    #Drop duplicate songs based off id and then also title and artist together
-    df.dropna(inplace=True)
-    df.drop_duplicates(subset=['id'], inplace=True)
-    df.drop_duplicates(subset=['title', 'main_artist'], inplace=True)
-    df.dropna(inplace=True)
+    if verbose:
+        print("Cleaning track data...")
 
-
-    # Drop unnecessary audio features
-    df.drop(columns=['type', 'id', 'uri', 'track_href', 'analysis_url'], inplace=True)
-
-    # Convert duration_ms to minutes
-    df['duration_ms'] = df['duration_ms'] / 60000
-    df.rename(columns={'duration_ms':'duration_min'}, inplace=True)
+    #Drop duplicate songs based off id and then also normalized title and artist together
+    df = df.dropna()
+    df = df.drop_duplicates(subset=['id'])
+    if index is not None:
+        songs = index.canonical_ids(df['id'], df['title'], df['main_artist'])
+    else:
+        songs = [normalize_key(title, artist) for title, artist in zip(df['title'], df['main_artist'])]
+    df = df[~pd.Series(songs, index=df.index).duplicated().to_numpy()]
 
     # Convert release_date to years since release
     DAYS_IN_YEAR = 365.25
-    today = datetime.now()
+    today = np.datetime64(datetime.now(), 'D')
+    release_dates = parse_release_dates(df['release_date'].to_numpy())
+    years_since_release = (today - release_dates).astype(np.int64) / DAYS_IN_YEAR
 
-    df['release_date'] = pd.to_datetime(df['release_date'], format='mixed')
-    df['years_since_release'] = (today - df['release_date']).dt.days / DAYS_IN_YEAR
-    df.drop(columns=['release_date'], inplace=True)
+    # Drop unnecessary audio features and convert duration_ms to minutes while building the result once
+    columns = {}
+    for column in df.columns:
+        if column in UNUSED_TRACK_COLUMNS or column == 'release_date':
+            continue
+        if column == 'duration_ms':
+            columns['duration_min'] = df[column].to_numpy() / 60000
+        else:
+            columns[column] = df[column]
+    columns['years_since_release'] = years_since_release
+    df = pd.DataFrame(columns, index=df.index)
 
-    print("Track data cleaned")
+    if verbose:
+        print("Track data cleaned")
     return df
 
 
+
+class FeatureTransform:
+    """
+    FEATURE_TRANSFORMS compiled for one set of columns
+
+    Incomplete rows are found with one cheap check per column rather than a full dropna, and the
+    transformed features replace their columns before the kept columns are selected once.
+    """
+
+    def __init__(self, columns):
+        """
+        columns (tuple[str]): columns of the frames this transform will be applied to
+        """
+        self.kept = [column for column in columns if FEATURE_TRANSFORMS.get(column) != 'drop']
+        self.transformed = [(column, TRANSFORM_UFUNCS[FEATURE_TRANSFORMS[column]])
+                            for column in self.kept if column in FEATURE_TRANSFORMS]
+
+
+    def __call__(self, df):
+        """
+        Drop incomplete rows and unused features, then transform the rest
+
+        df (pd.DataFrame): frame with the columns given at compile time
+
+        Returns:
+        pd.DataFrame: new frame with the kept columns in their original order
+        """
+        # Remove rows with missing values (Likely redundant)
+        complete = complete_rows(df)
+
+        transformed = {column: ufunc(df[column].to_numpy()) for column, ufunc in self.transformed}
+        df = df.assign(**transformed)[self.kept]
+
+        # Rows are filtered last so only the kept columns are copied
+        return df if complete is None else df[complete]
+
+
+
+def complete_rows(df):
+    """
+    Find the rows of a frame without missing values
+
+    df (pd.DataFrame): frame to check
+
+    Returns:
+    np.ndarray: boolean mask of complete rows, None when every row is complete
+    """
+    complete = None
+    for column in df.columns:
+        series = df[column]
+        kind = series.dtype.kind
+        if kind in 'iub':
+            # Integer and boolean columns cannot hold missing values
+            continue
+        if kind == 'f':
+            missing = np.isnan(series.to_numpy())
+        elif isinstance(series.dtype, pd.StringDtype) and series.dtype.storage == 'python':
+            # Missing strings are stored as NaN, the only value not equal to itself
+            values = np.asarray(series.array)
+            missing = values != values
+        else:
+            missing = series.isna().to_numpy()
+
+        if missing.any():
+            complete = ~missing if complete is None else complete & ~missing
+    return complete
+
+
+
+@lru_cache(maxsize=32)
+def compile_transform(columns):
+    """
+    Compile FEATURE_TRANSFORMS for a set of columns
+
+    columns (tuple[str]): columns of the frames the transform will be applied to
+
+    Returns:
+    FeatureTransform: reusable transform for frames with those columns
+    """
+    return FeatureTransform(columns)
+
+
+
+@timed('clean_features')
 def clean_features(df):
     """
     Performes feature removal, scaling, etc. on data and returns new dataframe
@@ -80,26 +265,19 @@ def clean_features(df):
     Returns:
     pd.DataFrame: DataFrame with adjustments made
     """
+    return compile_transform(tuple(df.columns))(df)
 
-    # Remove rows with missing values (Likely redundant)
-    df.dropna(inplace=True)
-
-    # Remove features deemed unfit for training
-    columns_to_remove = ['mode', 'time_signature', 'loudness', 'neu', 'compound']
-    df.drop(columns=columns_to_remove, inplace=True)
-
-    # Spread data distributions for features with skew near 0
-    df['instrumentalness'] = df['instrumentalness']**(1/3)
-    df['acousticness'] = df['acousticness']**(1/3)
-    df['liveness'] = df['liveness']**(1/3)
-    df['pos'] = df['pos']**(1/3)
-    df['neg'] = df['neg']**(1/3)
-    df['speechiness'] = df['speechiness']**(1/3)
-
-    # Spread data distribitions for features with skew near |1|
-    df['danceability'] = df['danceability']**3
-    df['energy'] = df['energy']**3
 
 
+def get_transform_params():
+    """
+    Get the parameters clean_features applies, stored alongside trained models
 
-    return df
\ No newline at end of file
+    Returns:
+    dict: dropped, cube rooted and cubed feature names
+    """
+    return {
+        'dropped': [column for column, name in FEATURE_TRANSFORMS.items() if name == 'drop'],
+        'cbrt': [column for column, name in FEATURE_TRANSFORMS.items() if name == 'cbrt'],
+        'cube': [column for column, name in FEATURE_TRANSFORMS.items() if name == 'cube'],
+    }
@@ -0,0 +1,156 @@
+'''
+File: dedup_index.py
+Description: Normalized title and artist keys and a persistent index of duplicate tracks
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+
+from environment import load_environment
+
+
+# Load enviornment variables
+load_environment()
+
+# Location of the index database, can be overridden in the enviornment
+INDEX_PATH = os.getenv('DEDUP_INDEX_PATH', 'dedup_index.sqlite')
+
+# Featured artists in brackets, e.g. "(feat. Drake)" or "[with Future]"
+FEATURED_PATTERN = re.compile(r'[\(\[]\s*(?:feat\.?|ft\.?|featuring|with)\s[^\)\]]*[\)\]]', flags=re.IGNORECASE)
+
+# Featured artists after a dash or trailing the title, e.g. "- feat. Drake" or "ft. Drake"
+TRAILING_FEATURED_PATTERN = re.compile(r'(?:\s-\s|\s)(?:feat\.?|ft\.?|featuring)\s.*$', flags=re.IGNORECASE)
+
+# Remaster labels, e.g. "- Remastered 2011", "- 2009 Remaster" or "(Remastered Version)"
+REMASTER_PATTERN = re.compile(r'\s-\s[^-]*remaster[^-]*$|[\(\[][^\)\]]*remaster[^\)\]]*[\)\]]', flags=re.IGNORECASE)
+
+PUNCTUATION_PATTERN = re.compile(r'[^\w\s]')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """
+    Casefold text and strip accents and punctuation
+
+    text (str): title or artist name
+
+    Returns:
+    str: normalized text with single spaces
+    """
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+    text = PUNCTUATION_PATTERN.sub('', text)
+    return WHITESPACE_PATTERN.sub(' ', text).strip()
+
+
+
+def normalize_key(song_title, artist_name):
+    """
+    Build a key shared by versions of the same song
+
+    Remaster labels and featured artists are removed from the title before normalizing,
+    so "Song - Remastered 2011" and "Song (feat. Someone)" share the key of "Song".
+
+    song_title (str): title of song
+    artist_name (str): name of the song's main artist
+
+    Returns:
+    str: normalized key for the (title, main_artist) pair
+    """
+    title = str(song_title)
+    title = FEATURED_PATTERN.sub('', title)
+    title = REMASTER_PATTERN.sub('', title)
+    title = TRAILING_FEATURED_PATTERN.sub('', title)
+    return f'{normalize_text(title)}\x1f{normalize_text(artist_name)}'
+
+
+
+class DedupIndex:
+    """
+    Persistent map of track IDs to the first track seen with the same normalized key
+
+    The index is mirrored in memory, so a track already ingested is resolved with one
+    dictionary lookup and new tracks are normalized once and written through to SQLite.
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        """
+        path (str): file path of the database, ':memory:' for a temporary index
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS track_keys (
+                track_id TEXT PRIMARY KEY,
+                key TEXT NOT NULL
+            )''')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS canonical (
+                key TEXT PRIMARY KEY,
+                track_id TEXT NOT NULL
+            )''')
+        self._conn.commit()
+
+        self._keys = dict(self._conn.execute('SELECT track_id, key FROM track_keys'))
+        self._canonical = dict(self._conn.execute('SELECT key, track_id FROM canonical'))
+
+
+    def __len__(self):
+        return len(self._keys)
+
+
+    def canonical_id(self, track_id, song_title, artist_name):
+        """
+        Get the canonical track for a track, adding it to the index if new
+
+        track_id (str): Spotify track ID
+        song_title (str): title of song
+        artist_name (str): name of the song's main artist
+
+        Returns:
+        str: ID of the first track ingested with the same normalized key
+        """
+        with self._lock:
+            key = self._keys.get(track_id)
+            if key is None:
+                key = normalize_key(song_title, artist_name)
+                self._keys[track_id] = key
+                self._conn.execute('INSERT OR REPLACE INTO track_keys VALUES (?, ?)', (track_id, key))
+
+                if key not in self._canonical:
+                    self._canonical[key] = track_id
+                    self._conn.execute('INSERT OR REPLACE INTO canonical VALUES (?, ?)', (key, track_id))
+            return self._canonical[key]
+
+
+    def canonical_ids(self, track_ids, song_titles, artist_names):
+        """
+        Get canonical tracks for many tracks, committing new ones in one transaction
+
+        track_ids (iterable[str]): Spotify track IDs
+        song_titles (iterable[str]): titles in the same order
+        artist_names (iterable[str]): main artists in the same order
+
+        Returns:
+        list[str]: canonical track ID for each track
+        """
+        canonical = [self.canonical_id(*track) for track in zip(track_ids, song_titles, artist_names)]
+        self.commit()
+        return canonical
+
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
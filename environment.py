@@ -0,0 +1,26 @@
+'''
+File: environment.py
+Description: Load the .env file once for every module reading settings from the enviornment
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import threading
+
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_environment():
+    """
+    Load enviornment variables from .env the first time any module asks, later calls return immediately
+    """
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if not _loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _loaded = True
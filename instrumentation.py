@@ -0,0 +1,269 @@
+'''
+File: instrumentation.py
+Description: Stage timers and request, retry and cache counters with JSON lines and Prometheus export
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from urllib.parse import urlparse
+from environment import load_environment
+
+
+# Load enviornment variables
+load_environment()
+
+# Set to a file path to record metrics for a run, .prom files are written in Prometheus text format
+METRICS_PATH = os.getenv('PIPELINE_METRICS')
+
+# Prefix of every exported metric name
+PREFIX = 'curation'
+
+_NULL_TIMER = nullcontext()
+
+
+
+class Metrics:
+    """
+    Thread safe counters and stage timings, doing nothing while disabled
+    """
+
+    def __init__(self, enabled=False):
+        """
+        enabled (bool): record metrics, every call returns immediately when False
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.timings = {}
+
+
+    def count(self, name, value=1, **labels):
+        """
+        Add to a counter
+
+        name (str): counter name
+        value (float): amount to add
+        labels: label values identifying the series
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+
+    def observe(self, stage, seconds):
+        """
+        Record one run of a stage
+
+        stage (str): stage name
+        seconds (float): wall time of the run
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            count, total, longest = self.timings.get(stage, (0, 0.0, 0.0))
+            self.timings[stage] = (count + 1, total + seconds, max(longest, seconds))
+
+
+    @contextmanager
+    def _timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+
+    def timer(self, stage):
+        """
+        Context manager timing the block inside it
+
+        stage (str): stage name
+
+        Returns:
+        context manager: a shared no-op while disabled
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return self._timer(stage)
+
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.timings.clear()
+
+
+    def snapshot(self):
+        """
+        Returns:
+        dict: counters keyed by name and labels, timings with count, total and max seconds
+        """
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            timings = {stage: {'count': count, 'seconds': total, 'max_seconds': longest}
+                       for stage, (count, total, longest) in sorted(self.timings.items())}
+        return {'counters': counters, 'stages': timings, 'cache_hit_ratio': self.cache_hit_ratios(counters)}
+
+
+    @staticmethod
+    def cache_hit_ratios(counters):
+        """
+        Hit ratio of every cache counted with cache_requests_total
+
+        counters (list[dict]): counters from snapshot
+
+        Returns:
+        dict: cache name -> share of requests that were hits
+        """
+        totals = {}
+        for counter in counters:
+            if counter['name'] != 'cache_requests_total':
+                continue
+            hits, total = totals.get(counter['labels']['cache'], (0, 0))
+            if counter['labels']['result'] == 'hit':
+                hits += counter['value']
+            totals[counter['labels']['cache']] = (hits, total + counter['value'])
+        return {cache: hits / total for cache, (hits, total) in totals.items() if total}
+
+
+    def to_json_line(self):
+        """
+        Returns:
+        str: snapshot as one JSON line with a timestamp
+        """
+        return json.dumps({'timestamp': time.time(), **self.snapshot()})
+
+
+    def to_prometheus(self):
+        """
+        Returns:
+        str: counters and stage timings in Prometheus text format
+        """
+        snapshot = self.snapshot()
+        lines = []
+        seen = set()
+        for counter in snapshot['counters']:
+            name = f"{PREFIX}_{counter['name']}"
+            if name not in seen:
+                lines.append(f'# TYPE {name} counter')
+                seen.add(name)
+            lines.append(f"{name}{format_labels(counter['labels'])} {counter['value']}")
+
+        if snapshot['stages']:
+            lines.append(f'# TYPE {PREFIX}_stage_seconds summary')
+        for stage, timing in snapshot['stages'].items():
+            labels = format_labels({'stage': stage})
+            lines.append(f"{PREFIX}_stage_seconds_count{labels} {timing['count']}")
+            lines.append(f"{PREFIX}_stage_seconds_sum{labels} {timing['seconds']:.6f}")
+
+        for cache, ratio in snapshot['cache_hit_ratio'].items():
+            if f'{PREFIX}_cache_hit_ratio' not in seen:
+                lines.append(f'# TYPE {PREFIX}_cache_hit_ratio gauge')
+                seen.add(f'{PREFIX}_cache_hit_ratio')
+            lines.append(f"{PREFIX}_cache_hit_ratio{format_labels({'cache': cache})} {ratio:.6f}")
+        return '\n'.join(lines) + '\n'
+
+
+    def write(self, path):
+        """
+        Export metrics, appending a JSON line or replacing a .prom file
+
+        path (str): destination file
+        """
+        if path.endswith('.prom'):
+            with open(path, 'w') as f:
+                f.write(self.to_prometheus())
+        else:
+            with open(path, 'a') as f:
+                f.write(self.to_json_line() + '\n')
+
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{key}="{str(value)}"' for key, value in labels.items())
+    return '{' + pairs + '}'
+
+
+
+# Shared by every module, enabled when PIPELINE_METRICS is set
+METRICS = Metrics(enabled=bool(METRICS_PATH))
+
+
+def enable():
+    METRICS.enabled = True
+
+
+
+def timed(stage):
+    """
+    Decorator timing every call of a stage function
+
+    stage (str): stage name
+
+    Returns:
+    callable: decorator, adding one attribute check per call while disabled
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return func(*args, **kwargs)
+            with METRICS._timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+
+def record_response(url, response, api):
+    """
+    Count a finished HTTP request
+
+    url (str): requested URL
+    response (requests.Response): response received, None if the request failed to connect
+    api (str): name of the API, used with the host as labels
+    """
+    if not METRICS.enabled:
+        return
+    host = urlparse(url).netloc
+    status = str(response.status_code) if response is not None else 'error'
+    METRICS.count('http_requests_total', api=api, host=host, status=status)
+    if response is not None:
+        METRICS.count('http_response_bytes_total', len(response.content), api=api, host=host)
+        if response.status_code == 429:
+            METRICS.count('http_rate_limited_total', api=api, host=host)
+
+
+
+def record_retry(url, api):
+    if not METRICS.enabled:
+        return
+    METRICS.count('http_retries_total', api=api, host=urlparse(url).netloc)
+
+
+
+def record_cache(cache, hits, misses=0):
+    """
+    Count cache lookups
+
+    cache (str): cache name
+    hits (int): lookups answered by the cache
+    misses (int): lookups that were not
+    """
+    if not METRICS.enabled:
+        return
+    if hits:
+        METRICS.count('cache_requests_total', hits, cache=cache, result='hit')
+    if misses:
+        METRICS.count('cache_requests_total', misses, cache=cache, result='miss')
@@ -7,20 +7,171 @@ Date: 06/28/2024
 
 
 import os
+import random
 import requests
 import re
-from dotenv import load_dotenv
-from bs4 import BeautifulSoup
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from requests.adapters import HTTPAdapter
+from instrumentation import timed, record_response, record_retry
+from environment import load_environment
+from singleflight import SingleFlight
+from dedup_index import normalize_key
 import time
 
 
 
 # Load enviornment labels
-load_dotenv()
+load_environment()
 
 #Get credential from enviornment variables
 GENIUS_API_TOKEN = os.getenv('GENIUS_API_TOKEN')
 
+# Base URLs, can be pointed at a local stub server
+GENIUS_API_URL = os.getenv('GENIUS_API_URL', 'https://api.genius.com')
+GENIUS_WEB_URL = os.getenv('GENIUS_WEB_URL', 'https://genius.com')
+
+# Request scheduling limits shared by every lyrics lookup
+MAX_WORKERS = 32
+REQUESTS_PER_SECOND = 10
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+REQUEST_TIMEOUT = 15
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Patterns used to clean lyrics, compiled once
+SONG_LABEL_PATTERN = re.compile(r'\[.*?\]', flags=re.DOTALL)
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket limiting the rate of outgoing requests
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        rate (float): tokens added per second
+        capacity (float): most tokens that can be saved up, defaults to rate
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available and any Retry-After pause has passed
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+
+                if now >= self._resume_at and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = max(self._resume_at - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Stop handing out tokens for a number of seconds, used for Retry-After
+
+        seconds (float): how long every caller should wait
+        """
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+            self._tokens = 0
+
+
+
+# Connection pool and limiter shared across threads
+_session = None
+_session_lock = threading.Lock()
+_limiter = TokenBucket(REQUESTS_PER_SECOND)
+
+
+def get_session():
+    """
+    Get the shared keep-alive session used for Genius requests
+
+    Returns:
+    requests.Session: session with a connection pool sized for MAX_WORKERS
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_WORKERS)
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+        return _session
+
+
+
+def get_retry_after(response):
+    """
+    Read the Retry-After header of a response in seconds
+
+    response (requests.Response): response to read from
+
+    Returns:
+    float: seconds to wait, None if the header is missing or not a number
+    """
+    try:
+        return float(response.headers['Retry-After'])
+    except (KeyError, ValueError):
+        return None
+
+
+
+def request_with_retries(url, params=None, headers=None):
+    """
+    GET a URL through the shared session, retrying rate limits and server errors
+
+    url (str): URL to fetch
+    params (dict): query parameters
+    headers (dict): request headers
+
+    Returns:
+    requests.Response: final response, None if every attempt failed to connect
+    """
+    session = get_session()
+    response = None
+
+    for attempt in range(MAX_RETRIES + 1):
+        _limiter.acquire()
+        try:
+            response = session.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            print(f"Request to {url} failed: {e}")
+            response = None
+        record_response(url, response, 'genius')
+
+        if response is not None and response.status_code not in RETRY_STATUSES:
+            return response
+        if attempt == MAX_RETRIES:
+            break
+        record_retry(url, 'genius')
+
+        # Exponential backoff with full jitter, at least as long as the server asked for
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+        retry_after = get_retry_after(response) if response is not None else None
+        if retry_after is not None:
+            _limiter.pause(retry_after)
+            delay = max(delay, retry_after)
+        time.sleep(delay)
+
+    return response
+
 
 def get_genius_access_token():
     '''
@@ -47,19 +198,88 @@ def remove_song_labels(text):
     str: Song lyrics without any chorus or verse labels
     '''
 
-    # Re expression to remove square brackets
-    pattern = r'\[.*?\]'
-
-    # Replace all occurances of pattern with empty string
-    cleaned_text = re.sub(pattern, '', text, flags=re.DOTALL)
+    # Replace all occurances of square bracket labels with empty string
+    cleaned_text = SONG_LABEL_PATTERN.sub('', text)
 
     # Remove any extra spaces resulting from the removal
-    cleaned_text = re.sub(r'\s+', ' ', cleaned_text).strip()
+    cleaned_text = WHITESPACE_PATTERN.sub(' ', cleaned_text).strip()
 
     return cleaned_text
 
 
 
+class LyricsContainerParser(HTMLParser):
+    """
+    Streaming parser keeping only the text inside a page's lyrics containers
+
+    Faster than BeautifulSoup even with lxml and a strainer since no tree is built,
+    see benchmarks.bench_lyrics_parse.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.containers = []
+        self._depth = 0
+        self._parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'div':
+            return
+        if self._depth:
+            self._depth += 1
+        elif ('data-lyrics-container', 'true') in attrs:
+            self._depth = 1
+            self._parts = []
+
+    def handle_endtag(self, tag):
+        if tag != 'div' or not self._depth:
+            return
+        self._depth -= 1
+        if not self._depth:
+            self.containers.append('\n'.join(self._parts).strip())
+
+    def handle_data(self, data):
+        if self._depth:
+            self._parts.append(data)
+
+
+
+def get_container_texts(html):
+    """
+    Get the text of every lyrics container on a Genius song page
+
+    html (str): full HTML of the song page
+
+    Returns:
+    list[str]: text of each container, lines separated by newlines
+    """
+    parser = LyricsContainerParser()
+    parser.feed(html)
+    parser.close()
+    return parser.containers
+
+
+
+def extract_lyrics(html):
+    """
+    Extract clean lyrics from a Genius song page
+
+    html (str): full HTML of the song page
+
+    Returns:
+    str: Clean song lyrics with no newlines or labels, None if the page has no lyrics containers
+    """
+    lyrics_texts = get_container_texts(html)
+    if not lyrics_texts:
+        return None
+    return remove_song_labels("\n".join(lyrics_texts).strip())
+
+
+
+# Lookups of the same song from different threads share one set of requests
+_lyrics_flight = SingleFlight('genius')
+
+
 def get_lyrics(song_title, artist_name):
     """
     Get song lyrics from Genius API
@@ -68,24 +288,36 @@ def get_lyrics(song_title, artist_name):
     artist_name (str): name of artist, can be case sensative
 
     Returns:
-    str: Clean song lyrics with no newlines or labels
+    str: Clean song lyrics with no newlines or labels, None if Genius could not be reached
+    """
+    return _lyrics_flight.do(normalize_key(song_title, artist_name), fetch_lyrics, song_title, artist_name)
+
+
+
+def fetch_lyrics(song_title, artist_name):
+    """
+    Search Genius for a song and extract the lyrics from its page
+
+    song_title (str): title of song, can be case sensative
+    artist_name (str): name of artist, can be case sensative
+
+    Returns:
+    str: Clean song lyrics with no newlines or labels, None if Genius could not be reached
     """
     
-    base_url = 'https://api.genius.com'
-    search_url = f'{base_url}/search'
+    search_url = f'{GENIUS_API_URL}/search'
     headers = {'Authorization': f'Bearer {get_genius_access_token()}'}
     
     # Search for the song
     search_params = {'q': f'{song_title} {artist_name}'}
-    response = requests.get(search_url, params=search_params, headers=headers)
+    response = request_with_retries(search_url, params=search_params, headers=headers)
 
 
     # Check the status code
-    if response.status_code != 200:
-        print(f"Error: Received status code {response.status_code}")
-        retry_after = int(response.headers.get("Retry-After", 60))
-        print(f"Rate limit hit. Retry after {retry_after} seconds.")
-        return "No lyrics Found"
+    if response is None or response.status_code != 200:
+        status = response.status_code if response is not None else 'no response'
+        print(f"Error: Lyrics search for {song_title} failed with status {status}")
+        return None
     
     try:
         response_data = response.json()
@@ -97,24 +329,35 @@ def get_lyrics(song_title, artist_name):
     # Check if there were results
     if response_data['response']['hits']:
         song_path = response_data['response']['hits'][0]['result']['path']
-        song_url = f'https://genius.com{song_path}'
-        lyrics_page = requests.get(song_url)
+        song_url = f'{GENIUS_WEB_URL}{song_path}'
+        lyrics_page = request_with_retries(song_url)
+
+        if lyrics_page is None or lyrics_page.status_code != 200:
+            status = lyrics_page.status_code if lyrics_page is not None else 'no response'
+            print(f"Error: Lyrics page {song_url} failed with status {status}")
+            return None
 
         # Extract lyrics from the song's page
-        soup = BeautifulSoup(lyrics_page.text, 'html.parser')
-        
-        # Find all lyrics containers
-        lyrics_containers = soup.find_all('div', {'data-lyrics-container': 'true'})
-        lyrics_texts = []
-        
-        for container in lyrics_containers:
-            if container:
-                lyrics_texts.append(container.get_text(separator='\n').strip())
-        
-        # Join all collected text
-        if lyrics_texts:
-            return remove_song_labels("\n".join(lyrics_texts).strip())
+        lyrics = extract_lyrics(lyrics_page.text)
+        if lyrics is not None:
+            return lyrics
         
         return "Lyrics not found"
     else:
         return "Song not found"
+
+
+
+@timed('get_lyrics_many')
+def get_lyrics_many(pairs, max_workers=MAX_WORKERS):
+    """
+    Get lyrics for many songs at once with bounded concurrency
+
+    pairs (list[tuple[str, str]]): (song title, artist name) pairs
+    max_workers (int): most lookups in flight at one time
+
+    Returns:
+    list[str]: lyrics in the same order as pairs, None where Genius could not be reached
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda pair: get_lyrics(*pair), pairs))
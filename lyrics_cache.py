@@ -0,0 +1,159 @@
+'''
+File: lyrics_cache.py
+Description: Persistent on-disk cache for song lyrics and their sentiment scores
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import os
+import sqlite3
+import threading
+import time
+
+from dedup_index import normalize_key
+from instrumentation import record_cache
+from environment import load_environment
+
+
+# Load enviornment variables
+load_environment()
+
+# Location of the cache database, can be overridden in the enviornment
+CACHE_PATH = os.getenv('LYRICS_CACHE_PATH', 'lyrics_cache.sqlite')
+
+# Entries older than this many seconds are treated as missing
+DEFAULT_TTL = 60 * 60 * 24 * 90
+
+# Results which will never change on refetch and are safe to cache negatively
+NEGATIVE_RESULTS = ('Song not found', 'Lyrics not found')
+
+SENTIMENT_KEYS = ('neg', 'neu', 'pos', 'compound')
+
+# Number of writes between eviction passes
+EVICT_EVERY = 100
+
+
+
+class LyricsCache:
+    """
+    SQLite backed cache of lyrics and VADER scores keyed by normalize_key, so versions of a song share an entry
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=DEFAULT_TTL, max_entries=100000):
+        """
+        path (str): file path of the database, ':memory:' for a temporary cache
+        ttl (float): seconds an entry stays valid, None to never expire
+        max_entries (int): entries kept before the oldest are evicted, None for no limit
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+
+        # One connection shared by the sentiment worker threads
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS lyrics (
+                key TEXT PRIMARY KEY,
+                lyrics TEXT,
+                neg REAL,
+                neu REAL,
+                pos REAL,
+                compound REAL,
+                is_negative INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS lyrics_created ON lyrics (created_at)')
+        self._conn.commit()
+
+
+    def get(self, song_title, artist_name):
+        """
+        Look up a song in the cache
+
+        song_title (str): title of song
+        artist_name (str): name of the song's main artist
+
+        Returns:
+        dict: lyrics and neg/neu/pos/compound scores, None if missing or expired
+        """
+        key = normalize_key(song_title, artist_name)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT lyrics, neg, neu, pos, compound, created_at FROM lyrics WHERE key = ?',
+                (key,)).fetchone()
+
+            if row is None or (self.ttl is not None and time.time() - row[5] > self.ttl):
+                self.misses += 1
+                record_cache('lyrics', 0, 1)
+                return None
+
+            self.hits += 1
+        record_cache('lyrics', 1)
+
+        entry = dict(zip(SENTIMENT_KEYS, row[1:5]))
+        entry['lyrics'] = row[0]
+        return entry
+
+
+    def put(self, song_title, artist_name, lyrics, sentiment):
+        """
+        Store lyrics and sentiment for a song, evicting old entries when full
+
+        song_title (str): title of song
+        artist_name (str): name of the song's main artist
+        lyrics (str): cleaned lyrics or one of NEGATIVE_RESULTS
+        sentiment (dict): VADER scores with neg, neu, pos and compound keys
+        """
+        key = normalize_key(song_title, artist_name)
+        values = (key, lyrics, *(sentiment[k] for k in SENTIMENT_KEYS),
+                  int(lyrics in NEGATIVE_RESULTS), time.time())
+
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO lyrics VALUES (?, ?, ?, ?, ?, ?, ?, ?)', values)
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict()
+            self._conn.commit()
+
+
+    def _evict(self):
+        """
+        Remove expired entries and trim the cache to max_entries, oldest first
+        """
+        if self.ttl is not None:
+            self._conn.execute('DELETE FROM lyrics WHERE created_at < ?', (time.time() - self.ttl,))
+
+        if self.max_entries is not None:
+            self._conn.execute('''
+                DELETE FROM lyrics WHERE key IN (
+                    SELECT key FROM lyrics ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                )''', (self.max_entries,))
+
+
+    def stats(self):
+        """
+        Returns:
+        dict: hit and miss counters plus the number of stored entries
+        """
+        with self._lock:
+            size = self._conn.execute('SELECT COUNT(*) FROM lyrics').fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'entries': size,
+        }
+
+
+    def close(self):
+        with self._lock:
+            self._evict()
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,443 @@
+'''
+File: lyrics_corpus.py
+Description: Compressed, memory mapped store of cleaned lyrics for local rescoring and new text features
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import argparse
+import json
+import mmap
+import os
+import shutil
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from importlib.util import find_spec
+from itertools import islice
+import numpy as np
+
+from dedup_index import normalize_key
+from lyrics_cache import CACHE_PATH, NEGATIVE_RESULTS
+from environment import load_environment
+
+
+# Load enviornment variables
+load_environment()
+
+# Location of the corpus directory, can be overridden in the enviornment
+CORPUS_DIR = os.getenv('LYRICS_CORPUS_DIR', 'lyrics_corpus')
+
+# zstandard with a trained dictionary compresses short lyrics much better when installed, otherwise zlib
+USE_ZSTD = find_spec('zstandard') is not None
+
+# Songs compressed together in one block, larger blocks compress better but cost more per random read
+BLOCK_SONGS = 64
+
+# Decompressed blocks kept for repeated random reads
+BLOCK_CACHE = 16
+
+# Songs sampled and dictionary size used when compaction trains a zstd dictionary
+DICT_SAMPLES = 5000
+DICT_SIZE = 112 * 1024
+DICT_MIN_SONGS = 1000
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 10
+
+# One fixed width record per song, row i of the index belongs to line i of keys.jsonl
+INDEX_DTYPE = np.dtype([('block_offset', '<u8'), ('block_length', '<u4'), ('start', '<u4'), ('length', '<u4')])
+
+BLOCKS_NAME = 'blocks.bin'
+INDEX_NAME = 'index.bin'
+KEYS_NAME = 'keys.jsonl'
+DICT_NAME = 'dictionary.bin'
+META_NAME = 'meta.json'
+
+
+
+class LyricsCorpus:
+    """
+    Append only blocks of compressed lyrics with a memory mapped offset index
+
+    A song is read by finding its row through its key, then slicing its block out of the memory
+    mapped blocks file. Appending a song again supersedes the earlier copy, compact rewrites only
+    the latest copy of each song.
+    """
+
+    def __init__(self, path=CORPUS_DIR):
+        """
+        path (str): corpus directory, created if missing
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._open()
+
+
+    def _open(self):
+        """
+        Open the corpus files, dropping songs whose block, index record or key a crash left partly written
+        """
+        os.makedirs(self.path, exist_ok=True)
+
+        meta_path = os.path.join(self.path, META_NAME)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.meta = json.load(f)
+        else:
+            self.meta = {'codec': 'zstd' if USE_ZSTD else 'zlib', 'dictionary': False}
+            with open(meta_path, 'w') as f:
+                json.dump(self.meta, f)
+
+        if self.meta['codec'] == 'zstd' and not USE_ZSTD:
+            raise Exception(f"Lyrics corpus {self.path} was written with zstd, install zstandard to read it")
+        self._load_codec()
+
+        blocks_path = os.path.join(self.path, BLOCKS_NAME)
+        keys_path = os.path.join(self.path, KEYS_NAME)
+        index_path = os.path.join(self.path, INDEX_NAME)
+        keys, n_lines = [], 0
+        if os.path.exists(keys_path):
+            with open(keys_path) as f:
+                damaged = False
+                for line in f:
+                    n_lines += 1
+                    if damaged:
+                        continue
+                    # Keys after a partly written line cannot be matched to their rows, and a line
+                    # missing its newline would be joined to the next key appended
+                    try:
+                        key = json.loads(line) if line.endswith('\n') else None
+                    except json.JSONDecodeError:
+                        key = None
+                    if key is None:
+                        damaged = True
+                    else:
+                        keys.append(key)
+
+        # Rows past the shorter of the index and keys files belong to an append that did not finish
+        n_index = os.path.getsize(index_path) // INDEX_DTYPE.itemsize if os.path.exists(index_path) else 0
+        n_rows = min(len(keys), n_index)
+
+        # Rows whose block was cut short cannot be decompressed, blocks are written in row order
+        blocks_size = os.path.getsize(blocks_path) if os.path.exists(blocks_path) else 0
+        blocks_end = 0
+        if n_rows:
+            records = np.memmap(index_path, dtype=INDEX_DTYPE, mode='r', shape=(n_rows,))
+            ends = records['block_offset'].astype(np.int64) + records['block_length']
+            n_rows = int(np.searchsorted(ends, blocks_size, side='right'))
+            blocks_end = int(ends[n_rows - 1]) if n_rows else 0
+            del records
+
+        if blocks_size > blocks_end:
+            with open(blocks_path, 'r+b') as f:
+                f.truncate(blocks_end)
+        if os.path.exists(index_path) and os.path.getsize(index_path) != n_rows * INDEX_DTYPE.itemsize:
+            with open(index_path, 'r+b') as f:
+                f.truncate(n_rows * INDEX_DTYPE.itemsize)
+        if n_lines != n_rows:
+            with open(keys_path, 'w') as f:
+                f.writelines(json.dumps(key) + '\n' for key in keys[:n_rows])
+
+        self.keys = keys[:n_rows]
+        self._row_of = {key: row for row, key in enumerate(self.keys)}
+        self._index = np.memmap(index_path, dtype=INDEX_DTYPE, mode='r', shape=(n_rows,)) if n_rows else None
+        self._new_rows = []
+
+        self._blocks_file = open(blocks_path, 'ab')
+        self._index_file = open(index_path, 'ab')
+        self._keys_file = open(keys_path, 'a')
+        self._blocks_map = None
+        self._block_cache = OrderedDict()
+        self._pending = []
+
+
+    def _load_codec(self):
+        if self.meta['codec'] == 'zstd':
+            import zstandard
+            dictionary = None
+            if self.meta['dictionary']:
+                with open(os.path.join(self.path, DICT_NAME), 'rb') as f:
+                    dictionary = zstandard.ZstdCompressionDict(f.read())
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary)
+            self._decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+            self._compress = self._compressor.compress
+            self._decompress = self._decompressor.decompress
+        else:
+            self._compress = lambda data: zlib.compress(data, ZLIB_LEVEL)
+            self._decompress = zlib.decompress
+
+
+    def __len__(self):
+        return len(self._row_of) + sum(1 for key, _ in self._pending if key not in self._row_of)
+
+
+    def __contains__(self, key):
+        return key in self._row_of or any(pending_key == key for pending_key, _ in self._pending)
+
+
+    def append(self, song_title, artist_name, lyrics):
+        """
+        Add a song's cleaned lyrics, replacing any earlier copy
+
+        song_title (str): title of song
+        artist_name (str): name of the song's main artist
+        lyrics (str): output of get_lyrics, negative results and None are skipped
+
+        Returns:
+        bool: True if the lyrics were stored
+        """
+        return self.append_key(normalize_key(song_title, artist_name), lyrics)
+
+
+    def append_key(self, key, lyrics):
+        """
+        Add lyrics under a normalized song key, replacing any earlier copy
+
+        key (str): key from normalize_key
+        lyrics (str): cleaned lyrics, negative results and None are skipped
+
+        Returns:
+        bool: True if the lyrics were stored
+        """
+        if lyrics is None or lyrics in NEGATIVE_RESULTS:
+            return False
+        with self._lock:
+            self._pending.append((key, lyrics))
+            if len(self._pending) >= BLOCK_SONGS:
+                self._flush()
+        return True
+
+
+    def flush(self):
+        """
+        Write songs appended since the last block as a new block
+        """
+        with self._lock:
+            self._flush()
+
+
+    def _flush(self):
+        if not self._pending:
+            return
+
+        texts = [lyrics.encode() for _, lyrics in self._pending]
+        block = self._compress(b''.join(texts))
+        block_offset = self._blocks_file.tell()
+
+        records = np.zeros(len(texts), dtype=INDEX_DTYPE)
+        records['block_offset'] = block_offset
+        records['block_length'] = len(block)
+        records['length'] = [len(text) for text in texts]
+        records['start'] = np.concatenate([[0], np.cumsum(records['length'][:-1])])
+
+        # Block first, then its index records, then keys, so a crash never indexes a missing block
+        self._blocks_file.write(block)
+        self._blocks_file.flush()
+        self._index_file.write(records.tobytes())
+        self._index_file.flush()
+        self._keys_file.writelines(json.dumps(key) + '\n' for key, _ in self._pending)
+        self._keys_file.flush()
+
+        for (key, _), record in zip(self._pending, records):
+            self._row_of[key] = len(self.keys)
+            self.keys.append(key)
+            self._new_rows.append(record)
+        self._pending = []
+
+
+    def _record(self, row):
+        n_mapped = len(self._index) if self._index is not None else 0
+        return self._index[row] if row < n_mapped else self._new_rows[row - n_mapped]
+
+
+    def _block(self, offset, length):
+        """
+        Decompress a block, mapping the blocks file again if it grew since it was mapped
+        """
+        block = self._block_cache.get(offset)
+        if block is not None:
+            self._block_cache.move_to_end(offset)
+            return block
+
+        if self._blocks_map is None or offset + length > len(self._blocks_map):
+            if self._blocks_map is not None:
+                self._blocks_map.close()
+            with open(os.path.join(self.path, BLOCKS_NAME), 'rb') as f:
+                self._blocks_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        block = self._decompress(self._blocks_map[offset:offset + length])
+        self._block_cache[offset] = block
+        if len(self._block_cache) > BLOCK_CACHE:
+            self._block_cache.popitem(last=False)
+        return block
+
+
+    def get(self, song_title, artist_name):
+        """
+        Get a song's stored lyrics
+
+        song_title (str): title of song
+        artist_name (str): name of the song's main artist
+
+        Returns:
+        str: cleaned lyrics, None if the song is not stored
+        """
+        return self.get_key(normalize_key(song_title, artist_name))
+
+
+    def get_key(self, key):
+        """
+        Get stored lyrics by normalized song key
+
+        key (str): key from normalize_key
+
+        Returns:
+        str: cleaned lyrics, None if the song is not stored
+        """
+        with self._lock:
+            for pending_key, lyrics in reversed(self._pending):
+                if pending_key == key:
+                    return lyrics
+
+            row = self._row_of.get(key)
+            if row is None:
+                return None
+            record = self._record(row)
+            block = self._block(int(record['block_offset']), int(record['block_length']))
+
+        start = int(record['start'])
+        return block[start:start + int(record['length'])].decode()
+
+
+    def __iter__(self):
+        """
+        Iterate over the latest copy of every stored song in storage order, one block decompressed at a time
+
+        Yields:
+        tuple[str, str]: normalized song key and cleaned lyrics
+        """
+        self.flush()
+        with self._lock:
+            n_rows = len(self.keys)
+            latest = dict(self._row_of)
+
+        block_offset, block = None, None
+        for row in range(n_rows):
+            key = self.keys[row]
+            if latest.get(key) != row:
+                continue
+
+            record = self._record(row)
+            if record['block_offset'] != block_offset:
+                block_offset = record['block_offset']
+                with self._lock:
+                    block = self._block(int(block_offset), int(record['block_length']))
+
+            start = int(record['start'])
+            yield key, block[start:start + int(record['length'])].decode()
+
+
+    def compact(self):
+        """
+        Rewrite the corpus keeping only the latest copy of each song, training a zstd dictionary when available
+        """
+        print("Compacting lyrics corpus...")
+        new_path = f'{self.path}.compact'
+        old_path = f'{self.path}.old'
+        shutil.rmtree(new_path, ignore_errors=True)
+        os.makedirs(new_path)
+
+        self.flush()
+        with self._lock:
+            n_songs = len(self._row_of)
+        meta = {'codec': self.meta['codec'], 'dictionary': False}
+
+        # Short lyrics share most of their vocabulary, a dictionary trained on them lets small blocks compress well
+        if meta['codec'] == 'zstd' and n_songs >= DICT_MIN_SONGS:
+            import zstandard
+            step = max(1, n_songs // DICT_SAMPLES)
+            samples = [lyrics.encode() for _, lyrics in islice(self, 0, None, step)]
+            dictionary = zstandard.train_dictionary(DICT_SIZE, samples)
+            with open(os.path.join(new_path, DICT_NAME), 'wb') as f:
+                f.write(dictionary.as_bytes())
+            meta['dictionary'] = True
+
+        with open(os.path.join(new_path, META_NAME), 'w') as f:
+            json.dump(meta, f)
+
+        # Songs are streamed one block at a time, the corpus is never held in memory
+        compacted = LyricsCorpus(new_path)
+        for key, lyrics in self:
+            compacted.append_key(key, lyrics)
+        compacted.close()
+
+        # Swap the directories, then reopen on the compacted files
+        self.close()
+        os.replace(self.path, old_path)
+        os.replace(new_path, self.path)
+        shutil.rmtree(old_path)
+        self._open()
+        print(f"Lyrics corpus compacted to {len(self)} songs, {self.nbytes() / 2**20:.1f} MB.")
+
+
+    def nbytes(self):
+        """
+        Returns:
+        int: bytes used by the corpus files on disk
+        """
+        return sum(os.path.getsize(os.path.join(self.path, name)) for name in os.listdir(self.path))
+
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            for f in (self._blocks_file, self._index_file, self._keys_file):
+                f.close()
+            if self._blocks_map is not None:
+                self._blocks_map.close()
+                self._blocks_map = None
+            self._index = None
+
+
+
+def import_lyrics_cache(corpus, cache_path=CACHE_PATH):
+    """
+    Copy every lyric stored in the lyrics cache into the corpus
+
+    corpus (LyricsCorpus): corpus to append to
+    cache_path (str): lyrics cache database
+
+    Returns:
+    int: number of songs added
+    """
+    added = 0
+    conn = sqlite3.connect(cache_path)
+    try:
+        for key, lyrics in conn.execute('SELECT key, lyrics FROM lyrics WHERE is_negative = 0'):
+            if key not in corpus and corpus.append_key(key, lyrics):
+                added += 1
+    finally:
+        conn.close()
+    corpus.flush()
+    return added
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the compressed lyrics corpus")
+    parser.add_argument('--path', default=CORPUS_DIR)
+    parser.add_argument('--import-cache', nargs='?', const=CACHE_PATH,
+                        help="copy lyrics from the lyrics cache database into the corpus")
+    parser.add_argument('--compact', action='store_true', help="drop superseded copies and retrain the dictionary")
+    args = parser.parse_args()
+
+    corpus = LyricsCorpus(args.path)
+    if args.import_cache:
+        print(f"Imported {import_lyrics_cache(corpus, args.import_cache)} songs from {args.import_cache}.")
+    if args.compact:
+        corpus.compact()
+    print(f"{len(corpus)} songs, {corpus.nbytes() / 2**20:.1f} MB, codec {corpus.meta['codec']}"
+          f"{' with dictionary' if corpus.meta['dictionary'] else ''}.")
+    corpus.close()
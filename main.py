@@ -7,42 +7,62 @@ Date: 06/28/2024
 
 
 import os
+import argparse
 import pandas as pd
 import numpy as np
-from dotenv import load_dotenv
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import f1_score
 
-from spotify_client import get_spotify_access_token, get_playlist_track_ids
-from lyrics import get_lyrics
-from data_cleaning import get_track_data, clean_track_data
+from spotify_client import get_spotify_access_token, get_playlist_track_ids, get_client
+from data_cleaning import get_track_data, clean_track_data, clean_features
 from sentiment import append_sentiment
-from model_generation import get_user_model
+from model_generation import get_user_model, split_by_key, RESAMPLERS, DEFAULT_RESAMPLER
+from model_registry import ModelRegistry
+from track_store import TrackStore
+from checkpoint import RunCheckpoint, get_run_dir
+from lyrics_corpus import LyricsCorpus
+from dedup_index import DedupIndex
+from instrumentation import METRICS, METRICS_PATH, enable
+from environment import load_environment
 
 
 # Load enviornment variables
-load_dotenv()
+load_environment()
 
 # Get credentials from enviornment variables
 CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID')
 CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
 
-def main():
-    
-    # Obtain an access token
-    token = get_spotify_access_token(CLIENT_ID, CLIENT_SECRET)
-
-    # Example playlist ID
-    target_playlist_id = '37i9dQZF1DWTl4y3vgJOXW'       # Example target playlist "Locked In" by Spotify
-    unknown_playlist_id = '7x0UDYDd2MWVkBEGGyPZbm'      # Example unkown playlsit "Biggest Songs of All Time Top500" by olaf_aarts
+def collect_phased(target_playlist_id, unknown_playlist_id, token, store, index, checkpoint=None, corpus=None):
+    """
+    Collect and clean both playlists one stage at a time
+
+    target_playlist_id (str): playlist the user wants more songs like
+    unknown_playlist_id (str): playlist to recommend songs from
+    token (str): Access token for Spotify authorization
+    store (TrackStore): local store of previously fetched playlists and tracks
+    index (DedupIndex): persistent index of known tracks used to drop duplicate songs
+    checkpoint (RunCheckpoint): run directory saving each stage's output, lets --resume skip finished stages
+    corpus (LyricsCorpus): compressed corpus storing the full text of fetched lyrics, optional
+
+    Returns:
+    pd.DataFrame: cleaned tracks with is_target and sentiment columns
+    """
+    def run(stage, func, *args, **kwargs):
+        if checkpoint is None:
+            return func(*args, **kwargs)
+        return checkpoint.run(stage, func, *args, **kwargs)
 
     # Get track IDs
-    target_track_ids = get_playlist_track_ids(target_playlist_id, token)
-    unknown_track_ids = get_playlist_track_ids(unknown_playlist_id, token)
+    target_track_ids = run('target_track_ids', get_playlist_track_ids, target_playlist_id, token, store)
+    unknown_track_ids = run('unknown_track_ids', get_playlist_track_ids, unknown_playlist_id, token, store)
 
     # Get audio features and artist, song title, popularity
-    target_track_data = get_track_data(target_track_ids, token)
-    unknown_track_data = get_track_data(unknown_track_ids, token)
+    target_track_data = run('target_track_data', get_track_data, target_track_ids, token, store)
+    unknown_track_data = run('unknown_track_data', get_track_data, unknown_track_ids, token, store)
+
+    # Report time spent on each Spotify endpoint
+    for endpoint, stats in get_client(token).latency_report().items():
+        print(f"{endpoint}: {stats['requests']} requests, {stats['mean_ms']:.0f} ms mean, "
+              f"{stats['p95_ms']:.0f} ms p95")
 
     # Create binary istarget column
     target_track_data['is_target'] = 1
@@ -50,35 +70,107 @@ def main():
 
     # Combine and clean data
     merged_df = pd.concat([target_track_data, unknown_track_data])
-    merged_df = clean_track_data(merged_df)
+    merged_df = run('cleaned_track_data', clean_track_data, merged_df, index=index)
+
+    # Get lyric sentiment, each track is recorded in the run directory as it finishes
+    merged_df = run('sentiment', append_sentiment, merged_df, checkpoint=checkpoint, corpus=corpus)
+
+    return merged_df
 
-    # Get lyric sentiment
-    merged_df = append_sentiment(merged_df)
+
+
+def main(stream=False, catalog=None, tune=False, resampler=DEFAULT_RESAMPLER, resume=False):
+    
+    # Obtain an access token
+    token = get_spotify_access_token(CLIENT_ID, CLIENT_SECRET)
+
+    # Example playlist ID
+    target_playlist_id = '37i9dQZF1DWTl4y3vgJOXW'       # Example target playlist "Locked In" by Spotify
+    unknown_playlist_id = '7x0UDYDd2MWVkBEGGyPZbm'      # Example unkown playlsit "Biggest Songs of All Time Top500" by olaf_aarts
+
+    # Local store of playlists and tracks fetched on previous runs
+    store = TrackStore()
+    index = DedupIndex()
+
+    if stream:
+        from pipeline import collect_tracks
+
+        # Overlap every collection stage, target playlist first so it wins duplicates
+        merged_df = collect_tracks([(target_playlist_id, 1), (unknown_playlist_id, 0)], token, store, index=index)
+    else:
+        # Stage outputs are kept in a run directory so a failed run can continue with --resume
+        checkpoint = RunCheckpoint(get_run_dir(target_playlist_id, unknown_playlist_id), resume)
+        corpus = LyricsCorpus()
+        try:
+            merged_df = collect_phased(target_playlist_id, unknown_playlist_id, token, store, index, checkpoint, corpus)
+        finally:
+            checkpoint.close()
+            corpus.close()
 
 
 
     # Train model
-    train, test = train_test_split(merged_df, test_size=0.20, random_state=42)
-    model, features = get_user_model(train)
+    from sklearn.metrics import f1_score
+
+    # Tracks keep their side of the split between runs so small playlist changes can update the saved model
+    train, test = split_by_key(merged_df)
+
+    # Optionally pick the model parameters with a cross validated search first
+    model_params = {'resampler': resampler} if resampler != DEFAULT_RESAMPLER else {}
+    if tune:
+        from model_selection import search, best_model_params, PARAM_GRID
+        results = search(train, {**PARAM_GRID, 'resampler': [resampler]})
+        print(results.head(10).to_string(index=False))
+        model_params = {**model_params, **best_model_params(results)}
+
+    model, features = get_user_model(train, ModelRegistry(), lineage=f'{target_playlist_id}:{unknown_playlist_id}',
+                                     **model_params)
     print("Features used:", np.array(features))
 
-    # Filter test set by features used in the model
-    filtered_test = test.loc[:, features]
-    X_test = filtered_test.drop(columns=['is_target'])
+    # Apply the feature transforms used in training, then filter test set by features used in the model
+    test = clean_features(test.copy())
+    X_test = test.loc[:, features].drop(columns=['is_target'])
 
     # Predict song classification
     y_pred = model.predict(X_test)
+    print(f"Test F1 score: {f1_score(test['is_target'], y_pred):.3f}")
 
     # Create a new column for predictions on the test set
-    test = test.copy()
     test['pred_label'] = y_pred
 
     # Print test cases where is_target is 0 and pred_label is 1
-    for index, song in test.iterrows():
-        if (song['is_target'] == 0) and (song['pred_label'] == 1):
-            print(f"Try this song: {song['title']}, by: {song['main_artist']}")
+    recommended = test[(test['is_target'] == 0) & (test['pred_label'] == 1)]
+    for title, artist in zip(recommended['title'], recommended['main_artist']):
+        print(f"Try this song: {title}, by: {artist}")
+
+    # Score a full catalog of candidate tracks with the trained model
+    if catalog is not None:
+        from batch_scoring import score_catalog
+        recommendations = score_catalog(catalog, model, features)
+        for title, artist in zip(recommendations['title'], recommendations['main_artist']):
+            print(f"Try this song: {title}, by: {artist}")
     
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Recommend songs from one playlist based on another")
+    parser.add_argument('--stream', action='store_true',
+                        help="overlap fetching, cleaning and sentiment instead of running them in phases")
+    parser.add_argument('--catalog', help="CSV or Parquet file of candidate tracks to score with the model")
+    parser.add_argument('--tune', action='store_true',
+                        help="search model parameters with cross validation before training")
+    parser.add_argument('--resampler', choices=RESAMPLERS, default=DEFAULT_RESAMPLER,
+                        help="balance classes with SMOTE, float32 SMOTE with parallel neighbors, or class weights")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue the last run on these playlists, skipping finished stages and scored tracks")
+    parser.add_argument('--metrics', default=METRICS_PATH,
+                        help="write stage timings and request counters to this .jsonl or .prom file")
+    args = parser.parse_args()
+
+    if args.metrics:
+        enable()
+    try:
+        main(stream=args.stream, catalog=args.catalog, tune=args.tune, resampler=args.resampler, resume=args.resume)
+    finally:
+        if args.metrics:
+            METRICS.write(args.metrics)
@@ -5,35 +5,111 @@ Author: Devin Lepur
 Date: 07/12/2024
 '''
 
+import hashlib
+import json
 import pandas as pd
 import numpy as np
-from xgboost import XGBClassifier
 from data_cleaning import clean_features
-from imblearn.over_sampling import SMOTE
-from datetime import datetime
-from sklearn.model_selection import train_test_split
+from model_registry import fingerprint_training_set, training_params
+from dedup_index import normalize_key
+from instrumentation import timed
 
 
+# XGBoost parameters used unless a run overrides them
+DEFAULT_PARAMS = {'eta': 0.1, 'subsample': 0.5, 'reg_alpha': 0.1, 'reg_lambda': 0.1}
 
-def create_model(df):
+# Threshold for reliable negatives
+NEG_THRESHOLD = 0.1
+
+# Boosting rounds added when a model is updated incrementally
+INCREMENTAL_ROUNDS = 20
+
+# Largest share of the training set that may change before a full retrain is needed
+MAX_INCREMENTAL_CHANGE = 0.1
+
+# Incremental updates in a row, and trees in the booster, before a full retrain keeps scoring fast
+MAX_INCREMENTAL_UPDATES = 10
+MAX_TREES = 400
+
+# Share of tracks held out by split_by_key
+TEST_SIZE = 0.2
+
+# Ways of balancing positives and reliable negatives before the final fit
+# smote: imblearn SMOTE, fast_smote: float32 SMOTE with parallel neighbor search,
+# weight: no resampling, XGBoost scale_pos_weight instead
+RESAMPLERS = ('smote', 'fast_smote', 'weight')
+DEFAULT_RESAMPLER = 'smote'
+
+
+
+def resample(X, y, resampler=DEFAULT_RESAMPLER, smote_params=None):
     """
-    Create a model off the data provided
-    
-    df (pd.DataFrame): Dataframe of song data with all features already cleaned
-    
+    Balance positives and reliable negatives before the final fit
+
+    X (pd.DataFrame or np.ndarray): merged positives and reliable negatives
+    y (np.ndarray): 1 for positives, 0 for reliable negatives
+    resampler (str): one of RESAMPLERS
+    smote_params (dict): extra SMOTE arguments such as k_neighbors and random_state
+
     Returns:
-    XGBoost model trained off the data 
+    X_over: features with synthetic minority rows appended after the originals
+    np.ndarray: labels of X_over
+    dict: XGBoost parameters the final fit needs, scale_pos_weight for weight
     """
+    if resampler not in RESAMPLERS:
+        raise Exception(f"Unknown resampler {resampler}, expected one of {', '.join(RESAMPLERS)}")
 
-    # Threshold for reliable negatives
-    NEG_THRESHOLD = 0.1
+    n_positive = int((y == 1).sum())
+    n_negative = len(y) - n_positive
 
-    # Separate features and target
-    X = df.drop(columns=['is_target'])
-    y = df['is_target']
+    # Weight positives instead of copying rows
+    if resampler == 'weight':
+        return X, y, {'scale_pos_weight': n_negative / max(n_positive, 1)}
+
+    if resampler == 'smote':
+        from imblearn.over_sampling import SMOTE
+        smote = SMOTE(sampling_strategy='minority', **(smote_params or {}))
+        X_over, y_over = smote.fit_resample(X, y)
+        return X_over, y_over, {}
+
+    # Same sampling as SMOTE on float32 values, with the neighbor search spread over every core
+    smote_params = smote_params or {}
+    minority = 1 if n_positive < n_negative else 0
+    values = X.to_numpy(dtype=np.float32) if isinstance(X, pd.DataFrame) else np.asarray(X, dtype=np.float32)
+    minority_rows = values[y == minority]
+    synthetic = synthesize_neighbors(minority_rows, minority_rows, abs(n_negative - n_positive),
+                                     smote_params.get('k_neighbors', 5), smote_params.get('random_state'), n_jobs=-1)
+
+    X_over = np.concatenate([values, synthetic])
+    y_over = np.concatenate([y, np.full(len(synthetic), minority, dtype=y.dtype)])
+    if isinstance(X, pd.DataFrame):
+        X_over = pd.DataFrame(X_over, columns=X.columns)
+    return X_over, y_over, {}
+
+
+
+def fit_pu_model(X, y, params=None, neg_threshold=NEG_THRESHOLD, smote_params=None, return_state=False,
+                 resampler=DEFAULT_RESAMPLER):
+    """
+    Fit the positive-unlabeled model on a feature matrix
+
+    X (pd.DataFrame or np.ndarray): features, already cleaned
+    y (array-like): 1 for target tracks, 0 for unlabeled tracks
+    params (dict): XGBoost parameters overriding DEFAULT_PARAMS
+    neg_threshold (float): highest positive probability for a reliable negative
+    smote_params (dict): extra SMOTE arguments such as k_neighbors
+    return_state (bool): also return the resampled training set for incremental updates
+    resampler (str): how positives and reliable negatives are balanced, one of RESAMPLERS
+
+    Returns:
+    XGBoost model trained off the data
+    dict: X_over, y_over and source row of each resampled row (-1 for synthetic), only if return_state
+    """
+    from xgboost import XGBClassifier
+    y = np.asarray(y)
 
     # Init classifier
-    clf = XGBClassifier(eta=0.1, subsample=0.5, reg_alpha=0.1, reg_lambda=0.1)
+    clf = XGBClassifier(**{**DEFAULT_PARAMS, **(params or {})})
 
     # Fit classifier, assume 0s initially are negatives
     clf.fit(X, y)
@@ -41,44 +117,278 @@ def create_model(df):
     # Get probability of sample being positive
     y_pred_proba = clf.predict_proba(X)
 
-    # Get reliable negatives with a probability of being positive <= NEG_THRESHOLD
-    reliable_negatives = X[y_pred_proba[:, 1] <= NEG_THRESHOLD]
-    reliable_negative_labels = np.zeros(reliable_negatives.shape[0])
-
-    # Get data where is_target == 1
-    positive_samples = df[df['is_target'] == 1].drop(columns=['is_target'])
-    positive_labels = np.ones(positive_samples.shape[0])
+    # Get reliable negatives with a probability of being positive <= neg_threshold
+    negative_mask = y_pred_proba[:, 1] <= neg_threshold
+    positive_mask = y == 1
 
     # Merge positives and negatives
-    X_merged = pd.concat([positive_samples, reliable_negatives], ignore_index=True)
-    y_merged = np.concatenate([positive_labels, reliable_negative_labels])
+    if isinstance(X, pd.DataFrame):
+        X_merged = pd.concat([X[positive_mask], X[negative_mask]], ignore_index=True)
+    else:
+        X_merged = np.concatenate([X[positive_mask], X[negative_mask]])
+    y_merged = np.concatenate([np.ones(positive_mask.sum()), np.zeros(negative_mask.sum())])
 
-    # Oversample minority class using SMOTE
-    smote = SMOTE(sampling_strategy='minority')
-    X_over, y_over = smote.fit_resample(X_merged, y_merged)
+    # Oversample minority class, or weight it for the weight resampler
+    X_over, y_over, fit_params = resample(X_merged, y_merged, resampler, smote_params)
 
     # Retrain classifier
+    if fit_params:
+        clf.set_params(**fit_params)
     clf.fit(X_over, y_over)
 
-    return clf
+    if not return_state:
+        return clf
+
+    # Resamplers append their synthetic rows after the originals
+    sources = np.concatenate([np.flatnonzero(positive_mask), np.flatnonzero(negative_mask)])
+    sources = np.concatenate([sources, np.full(len(y_over) - len(sources), -1)])
+    state = {
+        'X_over': np.asarray(X_over, dtype=np.float32),
+        'y_over': np.asarray(y_over, dtype=np.int8),
+        'sources': sources,
+    }
+    return clf, state
+
+
+
+def synthesize_neighbors(base, pool, n_samples, k_neighbors=5, seed=None, n_jobs=None):
+    """
+    Create SMOTE style samples between base rows and their nearest neighbors in pool
+
+    base (np.ndarray): rows to oversample around
+    pool (np.ndarray): rows of the same class to draw neighbors from, including base
+    n_samples (int): number of samples to create
+    k_neighbors (int): neighbors considered for each base row
+    seed (int): random seed
+    n_jobs (int): processes for the neighbor search, -1 for every core
+
+    Returns:
+    np.ndarray: float32 synthetic rows
+    """
+    if n_samples <= 0 or len(base) == 0 or len(pool) < 2:
+        return np.empty((0, base.shape[1]), dtype=np.float32)
+
+    from sklearn.neighbors import NearestNeighbors
+    rng = np.random.default_rng(seed)
+    neighbors = NearestNeighbors(n_neighbors=min(k_neighbors + 1, len(pool)), n_jobs=n_jobs).fit(pool)
+    _, indices = neighbors.kneighbors(base)
+
+    # Column 0 is the row itself, pick one of the others at random
+    rows = rng.integers(0, len(base), n_samples)
+    columns = rng.integers(1, indices.shape[1], n_samples)
+    gaps = rng.random((n_samples, 1))
+    return (base[rows] + gaps * (pool[indices[rows, columns]] - base[rows])).astype(np.float32)
+
+
+
+@timed('update_model')
+def update_model(model, state, X, y, keys, params=None, neg_threshold=NEG_THRESHOLD, smote_params=None,
+                 rounds=INCREMENTAL_ROUNDS, resampler=DEFAULT_RESAMPLER):
+    """
+    Continue boosting a saved model after a few tracks were added to or removed from its training set
+
+    Reliable negatives from the previous fit are kept for unchanged tracks and only new unlabeled
+    tracks are scored. Synthetic rows are drawn again around the current positives so none are
+    left over from removed positives.
+
+    model (XGBClassifier): previously trained model
+    state (dict): training state saved with the model by get_user_model
+    X (pd.DataFrame): cleaned features of the current training set
+    y (array-like): 1 for target tracks, 0 for unlabeled tracks
+    keys (list[str]): normalized song key of each row
+    params (dict): XGBoost parameters overriding DEFAULT_PARAMS
+    neg_threshold (float): highest positive probability for a reliable negative
+    smote_params (dict): extra SMOTE arguments such as k_neighbors
+    rounds (int): boosting rounds added to the model
+    resampler (str): resampler the model was trained with, one of RESAMPLERS
+
+    Returns:
+    tuple: updated model and state, None if too much changed or the model grew too large to update
+    """
+    y = np.asarray(y)
+    keys = np.asarray(keys, dtype=str)
+
+    # Tracks whose label changed count as removed and added
+    previous = dict(zip(state['train_keys'].tolist(), state['train_labels'].tolist()))
+    current = dict(zip(keys.tolist(), y.tolist()))
+    added = np.array([i for i, key in enumerate(keys.tolist()) if previous.get(key) != y[i]], dtype=int)
+    removed = {key for key, label in previous.items() if current.get(key) != label}
+
+    if len(added) + len(removed) > MAX_INCREMENTAL_CHANGE * len(keys):
+        return None
+    if len(added) == 0 and not removed:
+        return model, state
+
+    # Each update appends trees, so long lived lineages are periodically retrained from scratch
+    updates = int(state.get('updates', 0))
+    if updates >= MAX_INCREMENTAL_UPDATES or model.get_booster().num_boosted_rounds() + rounds > MAX_TREES:
+        return None
+
+    # Keep previous rows for tracks still present with the same label, synthetic rows have no key
+    kept = np.array([key != '' and key not in removed for key in state['row_keys'].tolist()], dtype=bool)
+    X_parts = [state['X_over'][kept]]
+    y_parts = [state['y_over'][kept]]
+    key_parts = [state['row_keys'][kept]]
+
+    values = X.to_numpy(dtype=np.float32)
+    new_positives = added[y[added] == 1]
+    new_unlabeled = added[y[added] == 0]
+
+    # Only new unlabeled tracks are scored, the rest keep their reliable negative status
+    new_negatives = new_unlabeled[:0]
+    if len(new_unlabeled):
+        proba = model.predict_proba(X.iloc[new_unlabeled])[:, 1]
+        new_negatives = new_unlabeled[proba <= neg_threshold]
+
+    X_parts += [values[new_positives], values[new_negatives]]
+    y_parts += [np.ones(len(new_positives), dtype=np.int8), np.zeros(len(new_negatives), dtype=np.int8)]
+    key_parts += [keys[new_positives], keys[new_negatives]]
+
+    # Oversample around the current positives until the classes balance, or weight them instead
+    y_all = np.concatenate(y_parts)
+    n_positive = int((y_all == 1).sum())
+    n_negative = len(y_all) - n_positive
+    n_synthetic = n_negative - n_positive
+    fit_params = {}
+    if resampler == 'weight':
+        n_synthetic = 0
+        fit_params = {'scale_pos_weight': n_negative / max(n_positive, 1)}
+    smote_params = smote_params or {}
+    positives = values[y == 1]
+    synthetic = synthesize_neighbors(positives, positives, n_synthetic, smote_params.get('k_neighbors', 5),
+                                     smote_params.get('random_state'))
+
+    X_parts.append(synthetic)
+    y_parts.append(np.ones(len(synthetic), dtype=np.int8))
+    key_parts.append(np.full(len(synthetic), '', dtype=keys.dtype))
+
+    X_over = np.concatenate(X_parts)
+    y_over = np.concatenate(y_parts)
+
+    # Continue boosting from the saved booster on the updated rows
+    from xgboost import XGBClassifier
+    clf = XGBClassifier(**{**DEFAULT_PARAMS, **(params or {}), **fit_params, 'n_estimators': rounds})
+    clf.fit(pd.DataFrame(X_over, columns=X.columns), y_over, xgb_model=model.get_booster())
+
+    new_state = {
+        'X_over': X_over,
+        'y_over': y_over,
+        'row_keys': np.concatenate(key_parts),
+        'train_keys': keys,
+        'train_labels': y.astype(np.int8),
+        'model_params': state['model_params'],
+        'updates': np.array(updates + 1),
+    }
+    return clf, new_state
+
+
+
+def create_model(df, params=None, neg_threshold=NEG_THRESHOLD, smote_params=None, return_state=False,
+                 resampler=DEFAULT_RESAMPLER):
+    """
+    Create a model off the data provided
+    
+    df (pd.DataFrame): Dataframe of song data with all features already cleaned
+    params (dict): XGBoost parameters overriding DEFAULT_PARAMS
+    neg_threshold (float): highest positive probability for a reliable negative
+    smote_params (dict): extra SMOTE arguments such as k_neighbors
+    return_state (bool): also return the resampled training set, see fit_pu_model
+    resampler (str): how positives and reliable negatives are balanced, one of RESAMPLERS
+    
+    Returns:
+    XGBoost model trained off the data 
+    """
+
+    # Separate features and target
+    X = df.drop(columns=['is_target'])
+    y = df['is_target']
+
+    return fit_pu_model(X, y, params, neg_threshold, smote_params, return_state, resampler)
+
+
+
+def split_by_key(df, test_size=TEST_SIZE):
+    """
+    Split tracks into train and test sets by a hash of their normalized song key
+
+    Unlike a shuffled split, a track stays on the same side when other tracks are added or
+    removed, so a small playlist change only changes a few training tracks.
+
+    df (pd.DataFrame): frame with title and main_artist columns
+    test_size (float): share of tracks put in the test set
 
-def get_user_model(df):
+    Returns:
+    pd.DataFrame: train rows
+    pd.DataFrame: test rows
+    """
+    buckets = np.array([int.from_bytes(hashlib.sha256(normalize_key(title, artist).encode()).digest()[:8], 'big')
+                        for title, artist in zip(df['title'], df['main_artist'])], dtype=np.uint64)
+    is_test = buckets < np.uint64(test_size * 2**64)
+    return df[~is_test], df[is_test]
+
+
+
+@timed('get_user_model')
+def get_user_model(df, registry=None, lineage=None, **model_params):
     """
     Get the best model for the user's data
+
+    df (pd.DataFrame): training frame with title, main_artist and is_target columns
+    registry (ModelRegistry): saved models to reuse when the training set is unchanged, optional
+    lineage (str): name for this pair of playlists, lets a small change update the previous model
+    model_params: params, neg_threshold, smote_params and resampler passed on to create_model
     
     Returns:
     XGBoost model: trained off the user's data
     columns (list[str]): List of the columns kept for use predicting
     """
 
+    # Reuse a saved model when these exact tracks were trained on before
+    if registry is not None:
+        key = fingerprint_training_set(df, model_params)
+        saved = registry.load(key)
+        if saved is not None:
+            print("Loaded saved model for this training set.")
+            return saved
+
     # Clean, normalize, scale data, and remove useless labels
     df = clean_features(df)
+    keys = np.array([normalize_key(title, artist) for title, artist in zip(df['title'], df['main_artist'])],
+                    dtype=str)
 
     df.drop(columns=['title', 'main_artist'], inplace=True)
 
-    model = create_model(df)
-
     # Rename for loop purposes
     filtered_df = df
 
-    return model, filtered_df.columns
\ No newline at end of file
+    if registry is None:
+        return create_model(df, **model_params), filtered_df.columns
+
+    # Continue the previous model of these playlists when only a few tracks changed and it was
+    # trained with the same parameters
+    updated = None
+    params_signature = json.dumps(training_params(model_params), sort_keys=True, default=str)
+    previous_key = registry.latest(lineage) if lineage is not None else None
+    if previous_key is not None:
+        previous = registry.load(previous_key)
+        previous_state = registry.load_state(previous_key)
+        if (previous is not None and previous_state is not None and previous[1] == list(filtered_df.columns)
+                and str(previous_state.get('model_params')) == params_signature):
+            X = df.drop(columns=['is_target'])
+            updated = update_model(previous[0], previous_state, X, df['is_target'], keys, **model_params)
+
+    if updated is not None:
+        print("Updated previous model with changed tracks.")
+        model, state = updated
+    else:
+        model, state = create_model(df, **model_params, return_state=True)
+        sources = state.pop('sources')
+        state['row_keys'] = np.where(sources >= 0, keys[np.maximum(sources, 0)], '')
+        state['train_keys'] = keys
+        state['train_labels'] = df['is_target'].to_numpy(dtype=np.int8)
+        state['model_params'] = np.array(params_signature)
+        state['updates'] = np.array(0)
+
+    registry.save(key, model, filtered_df.columns, state, lineage)
+
+    return model, filtered_df.columns
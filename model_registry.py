@@ -0,0 +1,277 @@
+'''
+File: model_registry.py
+Description: Save and reuse trained models keyed by a fingerprint of their training tracks
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import hashlib
+import json
+import os
+import threading
+import time
+import numpy as np
+
+from data_cleaning import get_transform_params
+from instrumentation import record_cache
+from environment import load_environment
+
+
+# Load enviornment variables
+load_environment()
+
+# Directory holding saved models, can be overridden in the enviornment
+REGISTRY_DIR = os.getenv('MODEL_REGISTRY_DIR', 'models')
+
+# Most models kept on disk before the least recently used are removed
+MAX_MODELS = 20
+
+# XGBoost parameters that only change how training runs, not the model it produces
+EXECUTION_PARAMS = ('n_jobs', 'nthread')
+
+# Seconds after which an eviction lock left by a killed process is taken over
+EVICT_LOCK_TIMEOUT = 60
+
+
+def training_params(model_params):
+    """
+    Drop execution only settings such as n_jobs, which depend on the machine rather than the model
+
+    model_params (dict): training parameters given to create_model
+
+    Returns:
+    dict: parameters that change the trained model
+    """
+    model_params = dict(model_params or {})
+    params = {key: value for key, value in (model_params.pop('params', None) or {}).items()
+              if key not in EXECUTION_PARAMS}
+    if params:
+        model_params['params'] = params
+    return model_params
+
+
+
+def fingerprint_training_set(df, model_params=None):
+    """
+    Hash the set of tracks and labels a model is trained on
+
+    Only titles, artists, labels and column names are hashed since values such as
+    years_since_release drift every day without the playlists changing, and execution only
+    parameters such as n_jobs are left out since they vary with the machine and worker count.
+
+    df (pd.DataFrame): training frame with title, main_artist and is_target columns
+    model_params (dict): training parameters given to create_model, optional
+
+    Returns:
+    str: hex digest identifying the training set, feature transforms and parameters
+    """
+    tracks = sorted(zip(df['title'].astype(str), df['main_artist'].astype(str), df['is_target'].astype(int)))
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps(sorted(df.columns)).encode())
+    digest.update(json.dumps(get_transform_params(), sort_keys=True).encode())
+    model_params = training_params(model_params)
+    if model_params:
+        digest.update(json.dumps(model_params, sort_keys=True, default=str).encode())
+    for title, artist, is_target in tracks:
+        digest.update(f'{title}\x1f{artist}\x1f{is_target}\x1e'.encode())
+    return digest.hexdigest()
+
+
+
+class ModelRegistry:
+    """
+    Directory of XGBoost models in native format with their features and transform parameters
+    """
+
+    def __init__(self, path=REGISTRY_DIR, max_models=MAX_MODELS):
+        """
+        path (str): directory to keep models in, created if missing
+        max_models (int): models kept before the least recently used are removed
+        """
+        self.path = path
+        self.max_models = max_models
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+
+    def _model_path(self, key):
+        return os.path.join(self.path, f'{key}.ubj')
+
+
+    def _meta_path(self, key):
+        return os.path.join(self.path, f'{key}.json')
+
+
+    def _state_path(self, key):
+        return os.path.join(self.path, f'{key}.state.npz')
+
+
+    def _write_meta(self, key, meta):
+        # Replace in one step so other processes never read a partly written file
+        temp_path = f'{self._meta_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temp_path, self._meta_path(key))
+
+
+    def _lineage_path(self, lineage):
+        name = hashlib.sha256(lineage.encode()).hexdigest()[:32]
+        return os.path.join(self.path, f'lineage-{name}.txt')
+
+
+    def load(self, key):
+        """
+        Load a saved model
+
+        key (str): fingerprint from fingerprint_training_set
+
+        Returns:
+        tuple: XGBoost model and list of feature columns, None if missing or built with other transforms
+        """
+        with self._lock:
+            try:
+                with open(self._meta_path(key)) as f:
+                    meta = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                record_cache('models', 0, 1)
+                return None
+
+            if meta['transform_params'] != get_transform_params():
+                record_cache('models', 0, 1)
+                return None
+
+            from xgboost import XGBClassifier
+            from xgboost.core import XGBoostError
+            model = XGBClassifier()
+            try:
+                model.load_model(self._model_path(key))
+            except (FileNotFoundError, XGBoostError):
+                # Another process evicted the model after its metadata was read
+                record_cache('models', 0, 1)
+                return None
+
+            # Record the use so eviction removes models that have not been needed in longest
+            meta['last_used'] = time.time()
+            try:
+                self._write_meta(key, meta)
+            except FileNotFoundError:
+                pass
+
+        record_cache('models', 1)
+        return model, meta['features']
+
+
+    def save(self, key, model, features, state=None, lineage=None):
+        """
+        Save a trained model and evict the least recently used models past max_models
+
+        key (str): fingerprint from fingerprint_training_set
+        model (XGBClassifier): trained model
+        features (list[str]): columns the model was trained on, including is_target
+        state (dict): training state of arrays from fit_pu_model for later incremental updates, optional
+        lineage (str): name shared by successive models of the same playlists, optional
+        """
+        meta = {
+            'features': list(features),
+            'transform_params': get_transform_params(),
+            'created': time.time(),
+            'last_used': time.time(),
+        }
+        with self._lock:
+            model.save_model(self._model_path(key))
+            if state is not None:
+                np.savez(self._state_path(key), **state)
+
+            # Metadata last, a model only counts as saved once its metadata exists
+            self._write_meta(key, meta)
+            if lineage is not None:
+                with open(self._lineage_path(lineage), 'w') as f:
+                    f.write(key)
+            self._evict()
+
+
+    def latest(self, lineage):
+        """
+        Get the key of the most recent model saved under a lineage
+
+        lineage (str): name given to save
+
+        Returns:
+        str: fingerprint of the latest model, None if there is none
+        """
+        try:
+            with open(self._lineage_path(lineage)) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+
+    def load_state(self, key):
+        """
+        Load the training state saved with a model
+
+        key (str): fingerprint from fingerprint_training_set
+
+        Returns:
+        dict: arrays saved by save, None if the model was saved without state
+        """
+        try:
+            with np.load(self._state_path(key)) as data:
+                return {name: data[name] for name in data.files}
+        except FileNotFoundError:
+            return None
+
+
+    def _evict(self):
+        """
+        Remove the least recently used models until at most max_models remain
+
+        Several processes may share the directory, so one evicts at a time behind a lock file and
+        each entry's metadata is renamed away first. A process reading the model afterwards sees a
+        miss instead of a half removed entry.
+        """
+        lock_path = os.path.join(self.path, 'evict.lock')
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            # Another process is evicting already, clear its lock only if it was killed while holding it
+            try:
+                if time.time() - os.path.getmtime(lock_path) > EVICT_LOCK_TIMEOUT:
+                    os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+            return
+        os.close(fd)
+
+        try:
+            entries = []
+            for name in os.listdir(self.path):
+                if not name.endswith('.json'):
+                    continue
+                key = name[:-len('.json')]
+                try:
+                    with open(self._meta_path(key)) as f:
+                        entries.append((json.load(f)['last_used'], key))
+                except FileNotFoundError:
+                    continue
+                except (json.JSONDecodeError, KeyError):
+                    entries.append((0, key))
+
+            entries.sort()
+            for _, key in entries[:max(0, len(entries) - self.max_models)]:
+                evicting_path = f'{self._meta_path(key)}.{os.getpid()}.evicting'
+                try:
+                    os.rename(self._meta_path(key), evicting_path)
+                except FileNotFoundError:
+                    continue
+                for path in (self._model_path(key), self._state_path(key), evicting_path):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+        finally:
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
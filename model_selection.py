@@ -0,0 +1,155 @@
+'''
+File: model_selection.py
+Description: Cross validated search over PU model parameters across all cores
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.metrics import f1_score
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+
+from data_cleaning import clean_features
+from model_generation import fit_pu_model
+
+
+# Parameters searched by default, XGBoost parameters plus neg_threshold and smote_k_neighbors
+PARAM_GRID = {
+    'eta': [0.05, 0.1, 0.3],
+    'max_depth': [3, 6],
+    'subsample': [0.5, 0.8],
+    'neg_threshold': [0.05, 0.1, 0.2],
+    'smote_k_neighbors': [3, 5],
+}
+
+N_SPLITS = 5
+
+
+
+def prepare_folds(df, n_splits=N_SPLITS, seed=42):
+    """
+    Clean features once and split them into cross validation folds
+
+    df (pd.DataFrame): training frame with title, main_artist and is_target columns
+
+    n_splits (int): number of folds
+    seed (int): random seed for the fold split
+
+    Returns:
+    list[tuple]: (X_train, y_train, X_val, y_val) float32 arrays for each fold
+    """
+    df = clean_features(df.copy()).drop(columns=['title', 'main_artist'])
+    X = df.drop(columns=['is_target']).to_numpy(dtype=np.float32)
+    y = df['is_target'].to_numpy(dtype=np.int8)
+
+    splitter = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=seed)
+    return [(X[train], y[train], X[val], y[val]) for train, val in splitter.split(X, y)]
+
+
+
+# Folds held by each search process, sent once when the process starts
+_worker_folds = None
+
+
+def _init_trial_worker(folds):
+    global _worker_folds
+    _worker_folds = folds
+
+
+def split_trial_params(trial):
+    """
+    Separate a trial's parameters into the arguments of fit_pu_model
+
+    trial (dict): one combination from the parameter grid
+
+    Returns:
+    dict: params, neg_threshold and smote_params keyword arguments
+    """
+    trial = dict(trial)
+    neg_threshold = trial.pop('neg_threshold', None)
+    resampler = trial.pop('resampler', None)
+    smote_params = {'k_neighbors': trial.pop('smote_k_neighbors')} if 'smote_k_neighbors' in trial else None
+
+    # Trials already run in parallel, so each model uses one thread
+    model_params = {'params': {**trial, 'n_jobs': 1}, 'smote_params': smote_params}
+    if neg_threshold is not None:
+        model_params['neg_threshold'] = neg_threshold
+    if resampler is not None:
+        model_params['resampler'] = resampler
+    return model_params
+
+
+def run_trial(trial):
+    """
+    Cross validate one parameter combination on the worker's folds
+
+    trial (dict): one combination from the parameter grid
+
+    Returns:
+    dict: trial parameters with mean and standard deviation of F1 and wall time
+    """
+    start = time.perf_counter()
+    model_params = split_trial_params(trial)
+
+    scores = []
+    for X_train, y_train, X_val, y_val in _worker_folds:
+        model = fit_pu_model(X_train, y_train, **model_params)
+        scores.append(f1_score(y_val, model.predict(X_val)))
+
+    return {**trial, 'f1': float(np.mean(scores)), 'f1_std': float(np.std(scores)),
+            'seconds': time.perf_counter() - start}
+
+
+
+def search(df, param_grid=PARAM_GRID, n_splits=N_SPLITS, workers=None):
+    """
+    Search parameter combinations with cross validation across all cores
+
+    df (pd.DataFrame): training frame with title, main_artist and is_target columns
+    param_grid (dict): parameter name -> list of values to try
+    n_splits (int): number of folds
+    workers (int): number of processes, defaults to every core
+
+    Returns:
+    pd.DataFrame: one row per trial with F1 and wall time, best first
+    """
+    print("Searching model parameters...")
+    start = time.perf_counter()
+
+    folds = prepare_folds(df, n_splits)
+    trials = list(ParameterGrid(param_grid))
+    workers = workers or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_trial_worker, initargs=(folds,)) as executor:
+        results = []
+        for result in executor.map(run_trial, trials):
+            results.append(result)
+            print(f"Trial {len(results)}/{len(trials)}: f1 {result['f1']:.3f} in {result['seconds']:.1f}s")
+
+    print(f"Searched {len(trials)} trials in {time.perf_counter() - start:.1f}s")
+    return pd.DataFrame(results).sort_values('f1', ascending=False, ignore_index=True)
+
+
+
+def best_model_params(results):
+    """
+    Turn the best row of a search into arguments for get_user_model
+
+    results (pd.DataFrame): output of search
+
+    Returns:
+    dict: params, neg_threshold and smote_params keyword arguments
+    """
+    best = results.iloc[0].drop(['f1', 'f1_std', 'seconds']).to_dict()
+
+    # Restore integer parameters pandas stored as floats
+    best = {name: int(value) if name in ('max_depth', 'smote_k_neighbors') else value
+            for name, value in best.items()}
+
+    model_params = split_trial_params(best)
+    del model_params['params']['n_jobs']
+    return model_params
@@ -0,0 +1,204 @@
+'''
+File: pipeline.py
+Description: Stream tracks through ID fetch, feature fetch, cleaning, lyrics and sentiment
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import queue
+import threading
+import pandas as pd
+
+from spotify_client import get_client
+from data_cleaning import get_track_data, clean_track_data
+from dedup_index import normalize_key
+from lyrics import get_lyrics
+from lyrics_cache import LyricsCache, SENTIMENT_KEYS
+from sentiment import SentimentAnalyzer
+
+
+# Most items waiting between two stages before the earlier stage blocks
+QUEUE_SIZE = 64
+
+# Spotify's tracks endpoint accepts at most 50 IDs per request
+FEATURE_BATCH = 50
+
+# Threads fetching lyrics and scoring sentiment
+LYRICS_WORKERS = 32
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+
+def _put_ids(id_queue, client, playlists, errors):
+    """
+    Stage 1: page through each playlist and queue batches of track IDs
+    """
+    try:
+        for playlist_id, is_target in playlists:
+            for page_ids in client.iter_playlist_track_ids(playlist_id):
+                for i in range(0, len(page_ids), FEATURE_BATCH):
+                    id_queue.put((page_ids[i:i+FEATURE_BATCH], is_target))
+    except Exception as e:
+        errors.append(e)
+    finally:
+        id_queue.put(_DONE)
+
+
+
+def _put_tracks(id_queue, track_queue, access_token, store, index, lyrics_workers, errors):
+    """
+    Stage 2 and 3: fetch features for each batch, drop repeats across batches and clean
+    """
+    seen_ids = set()
+    seen_songs = set()
+    position = 0
+    try:
+        while (item := id_queue.get()) is not _DONE:
+            batch, is_target = item
+            batch = [track_id for track_id in batch if track_id not in seen_ids]
+            if not batch:
+                continue
+
+            df = get_track_data(batch, access_token, store, verbose=False)
+            if df.empty:
+                continue
+            df['is_target'] = is_target
+
+            # Earlier playlists win duplicates, matching concat followed by drop_duplicates
+            df.dropna(inplace=True)
+            seen_ids.update(df['id'])
+            if index is not None:
+                songs = index.canonical_ids(df['id'], df['title'], df['main_artist'])
+            else:
+                songs = [normalize_key(title, artist) for title, artist in zip(df['title'], df['main_artist'])]
+            keep = [song not in seen_songs for song in songs]
+            df = df[keep].copy()
+            seen_songs.update(songs)
+            if df.empty:
+                continue
+
+            # Batches arrive in playlist order, number tracks so the output can be put back in it
+            for track in clean_track_data(df, verbose=False, index=index).to_dict('records'):
+                track['position'] = position
+                position += 1
+                track_queue.put(track)
+    except Exception as e:
+        errors.append(e)
+
+        # Keep the ID stage from blocking on a full queue
+        while id_queue.get() is not _DONE:
+            pass
+    finally:
+        for _ in range(lyrics_workers):
+            track_queue.put(_DONE)
+
+
+
+def _put_sentiment(track_queue, out_queue, cache, errors):
+    """
+    Stage 4 and 5: fetch lyrics for each track and score their sentiment
+    """
+    analyzer = SentimentAnalyzer()
+    try:
+        while (track := track_queue.get()) is not _DONE:
+            cached = cache.get(track['title'], track['main_artist'])
+            if cached is not None:
+                track.update((key, cached[key]) for key in SENTIMENT_KEYS)
+            else:
+                lyrics = get_lyrics(track['title'], track['main_artist'])
+                if lyrics is None:
+                    track.update(dict.fromkeys(SENTIMENT_KEYS, float('nan')))
+                else:
+                    sentiment_scores = analyzer.analyze(lyrics)
+                    cache.put(track['title'], track['main_artist'], lyrics, sentiment_scores)
+                    track.update((key, sentiment_scores[key]) for key in SENTIMENT_KEYS)
+            out_queue.put(track)
+    except Exception as e:
+        errors.append(e)
+
+        # Keep the feature stage from blocking on a full queue
+        while track_queue.get() is not _DONE:
+            pass
+    finally:
+        out_queue.put(_DONE)
+
+
+
+def stream_tracks(playlists, access_token, store=None, cache=None, index=None,
+                  queue_size=QUEUE_SIZE, lyrics_workers=LYRICS_WORKERS):
+    """
+    Run every collection stage at once, each track moving on as soon as it is ready
+
+    playlists (list[tuple[str, int]]): (playlist ID, is_target label) pairs, earlier playlists win duplicates
+    access_token (str): Access token for Spotify authorization
+    store (TrackStore): local store of previously fetched tracks, optional
+    cache (LyricsCache): cache of previous lyrics lookups, opens the default cache if None
+    index (DedupIndex): persistent index of known tracks, optional
+    queue_size (int): most items waiting between stages, bounds memory held in flight
+    lyrics_workers (int): threads fetching lyrics and scoring sentiment
+
+    Yields:
+    dict: one cleaned track with sentiment columns and its position in the playlists, in completion order
+    """
+    owns_cache = cache is None
+    if owns_cache:
+        cache = LyricsCache()
+
+    id_queue = queue.Queue(maxsize=queue_size)
+    track_queue = queue.Queue(maxsize=queue_size)
+    out_queue = queue.Queue(maxsize=queue_size)
+    errors = []
+
+    threads = [
+        threading.Thread(target=_put_ids, args=(id_queue, get_client(access_token), playlists, errors)),
+        threading.Thread(target=_put_tracks,
+                         args=(id_queue, track_queue, access_token, store, index, lyrics_workers, errors)),
+    ]
+    threads += [threading.Thread(target=_put_sentiment, args=(track_queue, out_queue, cache, errors))
+                for _ in range(lyrics_workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        remaining = lyrics_workers
+        while remaining:
+            track = out_queue.get()
+            if track is _DONE:
+                remaining -= 1
+            elif not errors:
+                yield track
+
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+    finally:
+        if owns_cache:
+            cache.close()
+
+
+
+def collect_tracks(playlists, access_token, store=None, cache=None, index=None):
+    """
+    Stream playlists through the pipeline and assemble the final dataframe
+
+    playlists (list[tuple[str, int]]): (playlist ID, is_target label) pairs
+    access_token (str): Access token for Spotify authorization
+    store (TrackStore): local store of previously fetched tracks, optional
+    cache (LyricsCache): cache of previous lyrics lookups, optional
+    index (DedupIndex): persistent index of known tracks, optional
+
+    Returns:
+    pd.DataFrame: cleaned tracks with is_target and sentiment columns in playlist order, ready for the model
+    """
+    print("Streaming tracks through the pipeline...")
+    df = pd.DataFrame(stream_tracks(playlists, access_token, store, cache, index))
+    print(f"{len(df)} tracks collected.")
+
+    # Tracks finish in a different order every run, restore playlist order so runs build the same frame
+    if df.empty:
+        return df
+    return df.sort_values('position').drop(columns=['position']).reset_index(drop=True)
@@ -5,16 +5,29 @@ Author: Devin Lepur
 Date: 06/29/2024
 '''
 
-import pandas as pd
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from lyrics import get_lyrics
+from lyrics_cache import LyricsCache, SENTIMENT_KEYS
+from instrumentation import timed
+from environment import load_environment
+
+
+# Load enviornment variables
+load_environment()
+
+# Processes used to score lyrics, can be overridden in the enviornment
+SENTIMENT_WORKERS = int(os.getenv('SENTIMENT_WORKERS', os.cpu_count() or 1))
+
+# Lyrics sent to a scoring process at a time
+SCORE_CHUNK_SIZE = 256
 
 
 
 class SentimentAnalyzer:
     def __init__(self):
+        from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
         self.analyzer = SentimentIntensityAnalyzer()
 
     def analyze(self, lyrics):
@@ -23,11 +36,99 @@ class SentimentAnalyzer:
 
 
 
-def append_sentiment(df):
+# Analyzer owned by each scoring process, built once when the process starts
+_worker_analyzer = None
+
+
+def _init_score_worker():
+    global _worker_analyzer
+    _worker_analyzer = SentimentAnalyzer()
+
+
+def _score_chunk(lyrics_chunk):
+    """
+    Score a chunk of lyrics inside a scoring process
+
+    lyrics_chunk (list[str]): lyrics to score, None entries are left as NaN
+
+    Returns:
+    list[list[float]]: neg, neu, pos and compound scores for each lyric
+    """
+    rows = []
+    for lyrics in lyrics_chunk:
+        if lyrics is None:
+            rows.append([np.nan] * len(SENTIMENT_KEYS))
+        else:
+            sentiment_scores = _worker_analyzer.analyze(lyrics)
+            rows.append([sentiment_scores[key] for key in SENTIMENT_KEYS])
+    return rows
+
+
+
+@timed('score_lyrics')
+def score_lyrics(lyrics_list, workers=SENTIMENT_WORKERS, chunk_size=SCORE_CHUNK_SIZE, on_chunk=None):
+    """
+    Score lyrics with VADER across a pool of processes
+
+    lyrics_list (list[str]): already fetched lyrics, None where unavailable
+    workers (int): number of scoring processes, 1 or less scores in this process
+    chunk_size (int): lyrics sent to a process at a time
+    on_chunk (callable): called in this thread with the first index and scores of each chunk as it finishes, optional
+
+    Returns:
+    np.ndarray: float64 array of shape (len(lyrics_list), 4) ordered as SENTIMENT_KEYS
+    """
+    starts = range(0, len(lyrics_list), chunk_size)
+    scores = np.full((len(lyrics_list), len(SENTIMENT_KEYS)), np.nan, dtype=np.float64)
+    if not starts:
+        return scores
+
+    def finish(start, rows):
+        scores[start:start + len(rows)] = rows
+        if on_chunk is not None:
+            on_chunk(start, scores[start:start + len(rows)])
+
+    # Starting processes costs more than scoring a single chunk
+    if workers <= 1 or len(starts) == 1:
+        _init_score_worker()
+        for start in starts:
+            finish(start, _score_chunk(lyrics_list[start:start + chunk_size]))
+        return scores
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_score_worker) as executor:
+        futures = {executor.submit(_score_chunk, lyrics_list[start:start + chunk_size]): start for start in starts}
+        for future in as_completed(futures):
+            finish(futures[future], future.result())
+    return scores
+
+
+
+def assign_sentiment(df, scores):
+    """
+    Write a matrix of sentiment scores into the dataframe in one bulk operation
+
+    df (pd.DataFrame): track dataframe, modified in place
+    scores (np.ndarray): float64 array of shape (len(df), 4) ordered as SENTIMENT_KEYS
+
+    Returns:
+    pd.DataFrame: parameter dataframe with sentiment analysis columns added
+    """
+    for column, key in enumerate(SENTIMENT_KEYS):
+        df[key] = scores[:, column]
+    return df
+
+
+
+@timed('append_sentiment')
+def append_sentiment(df, cache=None, workers=SENTIMENT_WORKERS, checkpoint=None, corpus=None):
     """
     Add sentiment columns to dataframe
 
     df (pd.DataFrame): cleaned track dataframe
+    cache (LyricsCache): cache of previous lyrics lookups, opens the default cache if None
+    workers (int): number of processes used to score fetched lyrics
+    checkpoint (RunCheckpoint): run directory recording each track as it finishes, optional
+    corpus (LyricsCorpus): corpus keeping the full text of newly fetched lyrics, optional
 
     Returns:
     pd.DataFrame: parameter dataframe with sentiment analysis columns added
@@ -35,35 +136,77 @@ def append_sentiment(df):
     # Output to display where program is at
     print("Appending sentiment...")
 
+    # Scores are collected by row position, missing lyrics stay NaN
+    titles = df['title'].to_numpy()
+    artists = df['main_artist'].to_numpy()
+    scores = np.full((len(df), len(SENTIMENT_KEYS)), np.nan, dtype=np.float64)
+
+    # Reuse lyrics and scores from previous runs where possible
+    owns_cache = cache is None
+    if owns_cache:
+        cache = LyricsCache()
+
+    missing = []
+    for i in range(len(df)):
+        cached = cache.get(titles[i], artists[i])
+        if cached is not None:
+            scores[i] = [cached[key] for key in SENTIMENT_KEYS]
+            continue
 
-    # Create columns to fill information with default value None
-    df['neg'] = None
-    df['neu'] = None
-    df['pos'] = None
-    df['compound'] = None
-
-    sentiment_analyzer = SentimentAnalyzer()
-
-    # function to process each row
-    def process_row(idx, track):
-        lyrics = get_lyrics(track['title'], track['main_artist'])
-        sentiment_scores = sentiment_analyzer.analyze(lyrics)
-        return idx, sentiment_scores
-
-    # Use threads to parallelize the processing with default workers
+        # Tracks scored before an interrupted run stopped
+        checkpointed = checkpoint.get_sentiment(titles[i], artists[i]) if checkpoint is not None else None
+        if checkpointed is not None:
+            scores[i] = checkpointed
+        else:
+            missing.append(i)
+
+    # Lyrics fetched before an interrupted run stopped are not requested again
+    fetched = [None] * len(missing)
+    to_fetch = []
+    for n, i in enumerate(missing):
+        if checkpoint is not None:
+            fetched[n] = checkpoint.get_lyrics(titles[i], artists[i])
+        if fetched[n] is None:
+            to_fetch.append(n)
+
+    # Fetch lyrics for cache misses on I/O threads
+    from tqdm import tqdm
     with ThreadPoolExecutor(max_workers=32) as executor:
-        futures = {executor.submit(process_row, idx, track): idx for idx, track in df.iterrows()}
+        futures = {executor.submit(get_lyrics, titles[missing[n]], artists[missing[n]]): n for n in to_fetch}
         
         # Display progress bar
-        for future in tqdm(as_completed(futures), desc='Append Sentiment Progress', total=df.shape[0]):
-            idx, sentiment_scores = future.result()
-            df.at[idx, 'neg'] = sentiment_scores['neg']
-            df.at[idx, 'neu'] = sentiment_scores['neu']
-            df.at[idx, 'pos'] = sentiment_scores['pos']
-            df.at[idx, 'compound'] = sentiment_scores['compound']
-            continue
+        for future in tqdm(as_completed(futures), desc='Append Sentiment Progress', total=len(to_fetch)):
+            n = futures[future]
+            fetched[n] = future.result()
+            if checkpoint is not None and fetched[n] is not None:
+                checkpoint.put_lyrics(titles[missing[n]], artists[missing[n]], fetched[n])
+
+    # Record each track as soon as its chunk is scored, so an interrupted run keeps finished scores
+    def record_chunk(start, chunk_scores):
+        for n, track_scores in enumerate(chunk_scores, start):
+            i = missing[n]
+            scores[i] = track_scores
+
+            # Genius could not be reached for None lyrics, leave them out of the cache to retry later
+            if fetched[n] is None:
+                continue
+            cache.put(titles[i], artists[i], fetched[n], dict(zip(SENTIMENT_KEYS, track_scores)))
+            if checkpoint is not None:
+                checkpoint.put_sentiment(titles[i], artists[i], track_scores.tolist())
+            if corpus is not None:
+                corpus.append(titles[i], artists[i], fetched[n])
+
+    # Score fetched lyrics on separate processes, away from the GIL held by the I/O threads
+    score_lyrics(fetched, workers=workers, on_chunk=record_chunk)
+
+    assign_sentiment(df, scores)
+    if corpus is not None:
+        corpus.flush()
+
+    stats = cache.stats()
+    print(f"Lyrics cache: {stats['hits']} hits, {stats['misses']} misses")
+    if owns_cache:
+        cache.close()
 
-    df['neg'] = df['neg'].astype(float)
-    df['pos'] = df['pos'].astype(float)
     print("Sentiment appended.")
     return df
\ No newline at end of file
@@ -0,0 +1,350 @@
+'''
+File: server.py
+Description: Long running recommendation service keeping tokens, tracks and models warm
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from spotify_client import get_spotify_access_token, get_client
+from data_cleaning import get_track_data, clean_track_data, clean_features
+from sentiment import append_sentiment
+from model_generation import get_user_model
+from model_registry import ModelRegistry
+from track_store import TrackStore
+from lyrics_cache import LyricsCache
+from instrumentation import METRICS, enable
+from environment import load_environment
+
+
+# Load enviornment variables
+load_environment()
+
+# Get credentials from enviornment variables
+CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID')
+CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
+
+# Seconds a playlist's track IDs are reused before its snapshot is checked again
+PLAYLIST_TTL = 300
+
+# Most trained models kept in memory
+MAX_MODELS = 32
+
+# Latest request latencies kept per endpoint for the percentiles in metrics
+LATENCY_WINDOW = 1000
+
+
+
+class CurationService:
+    """
+    In memory state shared by every request: Spotify token, stores, playlists and trained models
+    """
+
+    def __init__(self, store=None, cache=None, registry=None, max_models=MAX_MODELS):
+        """
+        store (TrackStore): local store of playlists and tracks, opens the default store if None
+        cache (LyricsCache): cache of lyrics and sentiment, opens the default cache if None
+        registry (ModelRegistry): saved models reused across restarts, opens the default registry if None
+        max_models (int): most trained models kept in memory
+        """
+        self.store = store if store is not None else TrackStore()
+        self.cache = cache if cache is not None else LyricsCache()
+        self.registry = registry if registry is not None else ModelRegistry()
+        self.max_models = max_models
+
+        self._playlists = {}
+        self._models = {}
+        self._lock = threading.Lock()
+        self._train_locks = defaultdict(threading.Lock)
+
+        self.counters = defaultdict(int)
+        self.latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        self.requests = defaultdict(int)
+
+
+    def get_token(self):
+        """
+        Returns:
+        str: Spotify access token, refreshed shortly before it expires
+        """
+        return get_spotify_access_token(CLIENT_ID, CLIENT_SECRET)
+
+
+    def get_playlist(self, playlist_id):
+        """
+        Get a playlist's snapshot and track IDs, checking Spotify at most every PLAYLIST_TTL seconds
+
+        playlist_id (str): Spotify playlist ID
+
+        Returns:
+        tuple[str, list[str]]: snapshot ID and track IDs
+        """
+        with self._lock:
+            entry = self._playlists.get(playlist_id)
+            hit = entry is not None and time.time() - entry[0] < PLAYLIST_TTL
+            self.counters['playlist_hits' if hit else 'playlist_misses'] += 1
+        if hit:
+            return entry[1], entry[2]
+
+        client = get_client(self.get_token())
+        snapshot_id = client.get_playlist_snapshot_id(playlist_id)
+        stored = self.store.get_playlist(playlist_id)
+        if stored is not None and stored[0] == snapshot_id:
+            track_ids = stored[1]
+        else:
+            track_ids = client.get_playlist_track_ids(playlist_id)
+            self.store.put_playlist(playlist_id, snapshot_id, track_ids)
+
+        with self._lock:
+            self._playlists[playlist_id] = (time.time(), snapshot_id, track_ids)
+        return snapshot_id, track_ids
+
+
+    def build_frame(self, target_ids, candidate_ids):
+        """
+        Build the cleaned, sentiment scored frame for a target and candidate playlist
+
+        target_ids (list[str]): track IDs the user wants more of
+        candidate_ids (list[str]): track IDs to recommend from
+
+        Returns:
+        pd.DataFrame: cleaned tracks with is_target and sentiment columns
+        """
+        token = self.get_token()
+        target = get_track_data(target_ids, token, self.store, verbose=False)
+        candidates = get_track_data(candidate_ids, token, self.store, verbose=False)
+        target['is_target'] = 1
+        candidates['is_target'] = 0
+
+        merged_df = pd.concat([target, candidates], ignore_index=True)
+        merged_df = clean_track_data(merged_df, verbose=False).reset_index(drop=True)
+        return append_sentiment(merged_df, cache=self.cache, workers=1)
+
+
+    def recommend(self, merged_df, model, features):
+        """
+        Predict which candidate tracks belong with the target playlist
+
+        merged_df (pd.DataFrame): frame from build_frame
+        model (XGBClassifier): model trained on merged_df
+        features (list[str]): columns the model was trained on
+
+        Returns:
+        list[dict]: recommended songs with title, artist and probability, best first
+        """
+        # Apply the same transforms the model was trained with to every candidate
+        candidates = clean_features(merged_df[merged_df['is_target'] == 0].copy())
+        X = candidates.loc[:, features].drop(columns=['is_target'])
+        proba = model.predict_proba(X)[:, 1]
+
+        recommended = candidates.assign(probability=proba)[proba >= 0.5]
+        recommended = recommended.sort_values('probability', ascending=False)
+        return [{'title': title, 'main_artist': artist, 'probability': float(probability)}
+                for title, artist, probability in zip(recommended['title'], recommended['main_artist'],
+                                                      recommended['probability'])]
+
+
+    def score(self, target_playlist_id, candidate_playlist_id):
+        """
+        Score a candidate playlist against a target playlist
+
+        target_playlist_id (str): playlist the user wants more songs like
+        candidate_playlist_id (str): playlist to recommend songs from
+
+        Returns:
+        list[dict]: recommended songs with title, artist and probability, best first
+        """
+        target_snapshot, target_ids = self.get_playlist(target_playlist_id)
+        candidate_snapshot, candidate_ids = self.get_playlist(candidate_playlist_id)
+        key = (target_playlist_id, target_snapshot, candidate_playlist_id, candidate_snapshot)
+
+        # Only one request trains a given pair, others wait and reuse its result
+        with self._lock:
+            train_lock = self._train_locks[key]
+        with train_lock:
+            with self._lock:
+                if key in self._models:
+                    self.counters['model_hits'] += 1
+                    # Move to the end so the least recently used model is evicted first
+                    self._models[key] = self._models.pop(key)
+                    return self._models[key][2]
+                self.counters['model_misses'] += 1
+
+            try:
+                merged_df = self.build_frame(target_ids, candidate_ids)
+                model, features = get_user_model(merged_df.copy(), self.registry,
+                                                 lineage=f'{target_playlist_id}:{candidate_playlist_id}')
+                features = list(features)
+                recommendations = self.recommend(merged_df, model, features)
+
+                with self._lock:
+                    self._models[key] = (model, features, recommendations)
+                    while len(self._models) > self.max_models:
+                        evicted = next(iter(self._models))
+                        self._models.pop(evicted)
+                        self._train_locks.pop(evicted, None)
+                return recommendations
+            finally:
+                # Locks of pairs that failed to train would otherwise be kept forever
+                with self._lock:
+                    if key not in self._models:
+                        self._train_locks.pop(key, None)
+
+
+    def record(self, endpoint, seconds, ok):
+        with self._lock:
+            self.counters['requests'] += 1
+            if not ok:
+                self.counters['errors'] += 1
+            self.requests[endpoint] += 1
+            self.latencies[endpoint].append(seconds)
+
+
+    def metrics(self):
+        """
+        Returns:
+        dict: request latency over the last LATENCY_WINDOW requests per endpoint, counters and cache hit ratios
+        """
+        with self._lock:
+            latencies = {endpoint: sorted(times) for endpoint, times in self.latencies.items()}
+            requests = dict(self.requests)
+            counters = dict(self.counters)
+            models = len(self._models)
+
+        report = {'counters': counters, 'models_loaded': models, 'latency_ms': {}}
+        for endpoint, times in latencies.items():
+            report['latency_ms'][endpoint] = {
+                'requests': requests[endpoint],
+                'p50': 1000 * times[len(times) // 2],
+                'p95': 1000 * times[min(len(times) - 1, int(len(times) * 0.95))],
+                'max': 1000 * times[-1],
+            }
+        for name in ('playlist', 'model'):
+            total = counters.get(f'{name}_hits', 0) + counters.get(f'{name}_misses', 0)
+            report[f'{name}_hit_ratio'] = counters.get(f'{name}_hits', 0) / total if total else 0.0
+        report['lyrics_cache'] = self.cache.stats()
+        return report
+
+
+
+def parse_score_request(handler):
+    """
+    Read and validate the JSON body of a /score request
+
+    handler (BaseHTTPRequestHandler): handler of the request
+
+    Returns:
+    tuple[str, str]: target and candidate playlist IDs
+    """
+    length = int(handler.headers.get('Content-Length', 0))
+    request = json.loads(handler.rfile.read(length) or b'{}')
+    if not isinstance(request, dict):
+        raise ValueError("body must be a JSON object")
+
+    playlist_ids = request['target_playlist_id'], request['candidate_playlist_id']
+    for playlist_id in playlist_ids:
+        if not isinstance(playlist_id, str) or not playlist_id:
+            raise ValueError("playlist IDs must be non-empty strings")
+    return playlist_ids
+
+
+
+def make_handler(service):
+    """
+    Build a request handler class bound to a service
+
+    service (CurationService): shared service state
+
+    Returns:
+    type: BaseHTTPRequestHandler subclass
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def send_json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/metrics':
+                self.send_json(200, service.metrics())
+            elif self.path == '/metrics/prometheus':
+                data = METRICS.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            elif self.path == '/health':
+                self.send_json(200, {'status': 'ok'})
+            else:
+                self.send_json(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path != '/score':
+                self.send_json(404, {'error': 'not found'})
+                return
+
+            start = time.perf_counter()
+            ok = False
+            try:
+                # Only a malformed body is the client's fault, errors raised while scoring are the server's
+                try:
+                    target_playlist_id, candidate_playlist_id = parse_score_request(self)
+                except (KeyError, ValueError, TypeError) as e:
+                    self.send_json(400, {'error': f'bad request: {e}'})
+                    return
+
+                recommendations = service.score(target_playlist_id, candidate_playlist_id)
+                ok = True
+                self.send_json(200, {'recommendations': recommendations})
+            except Exception as e:
+                self.send_json(500, {'error': str(e)})
+            finally:
+                service.record('/score', time.perf_counter() - start, ok)
+
+    return Handler
+
+
+
+def serve(host='127.0.0.1', port=8080):
+    """
+    Run the recommendation service until interrupted
+
+    host (str): address to bind
+    port (int): port to listen on
+    """
+    # Stage timings and request counters are always recorded by the service
+    enable()
+    service = CurationService()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f"Serving recommendations on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve playlist recommendations from warm models and caches")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+
+    serve(args.host, args.port)
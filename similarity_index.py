@@ -0,0 +1,328 @@
+'''
+File: similarity_index.py
+Description: Nearest neighbor "more like this" search over cleaned audio features and sentiment
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from data_cleaning import clean_features
+from compact_store import FEATURE_COLUMNS, TrackFeatureSet
+from instrumentation import timed
+from environment import load_environment
+
+
+# Load enviornment variables
+load_environment()
+
+# Location of the saved index, can be overridden in the enviornment
+INDEX_DIR = os.getenv('SIMILARITY_INDEX_DIR', 'similarity_index')
+
+# Neighbors returned by default
+TOP_K = 20
+
+# Most query by track distances computed at once, bounds search memory on large indexes
+SEARCH_BLOCK = 2**24
+
+
+
+def feature_vectors(df, columns=None):
+    """
+    Apply the model's feature transforms and select the columns distances are measured on
+
+    df (pd.DataFrame): tracks with the FEATURE_COLUMNS produced by clean_track_data and append_sentiment
+    columns (list[str]): columns to use, defaults to every transformed feature column present
+
+    Returns:
+    np.ndarray: float32 matrix, one row per track kept
+    list[str]: columns of the matrix
+    pd.Index: labels of the rows of df kept, clean_features drops tracks with missing values
+    """
+    cleaned = clean_features(df)
+    if columns is None:
+        columns = [column for column in FEATURE_COLUMNS if column in cleaned.columns]
+    return np.ascontiguousarray(cleaned[columns].to_numpy(dtype=np.float32)), columns, cleaned.index
+
+
+
+class SimilarityIndex:
+    """
+    Standardized track vectors searched exactly, one matrix product per block of queries
+
+    With a dozen or so features a ball tree prunes little, and benchmarks.bench_similarity shows
+    this search beating one while inserted tracks are found immediately without rebuilds.
+    """
+
+    def __init__(self, columns, mean, scale, vectors, track_ids, titles, artists):
+        self.columns = list(columns)
+        self.mean = mean
+        self.scale = scale
+        self.vectors = vectors
+        self.track_ids = list(track_ids)
+        self.titles = list(titles)
+        self.artists = list(artists)
+        if len(self.track_ids) != len(self.vectors):
+            raise Exception(f"Similarity index has {len(self.track_ids)} tracks but {len(self.vectors)} vectors")
+        self._norms = (self.vectors ** 2).sum(axis=1)
+        self._row_of = {track_id: row for row, track_id in enumerate(self.track_ids)}
+
+
+    @classmethod
+    @timed('build_similarity_index')
+    def build(cls, df):
+        """
+        Index a frame of tracks
+
+        df (pd.DataFrame): tracks with id, title, main_artist and the feature columns
+
+        Returns:
+        SimilarityIndex: index over every row of df
+        """
+        df = df.drop_duplicates(subset=['id']).reset_index(drop=True)
+        vectors, columns, kept = feature_vectors(df)
+        df = df.loc[kept]
+
+        # Standardize so no single feature's units dominate the distance
+        mean = vectors.mean(axis=0)
+        scale = vectors.std(axis=0)
+        scale[scale == 0] = 1
+        vectors = (vectors - mean) / scale
+
+        return cls(columns, mean, scale, vectors, df['id'].astype(str), df['title'].astype(str),
+                   df['main_artist'].astype(str))
+
+
+    @classmethod
+    def from_feature_set(cls, path):
+        """
+        Index every track in a TrackFeatureSet directory
+
+        path (str): directory written by TrackFeatureSet.save
+
+        Returns:
+        SimilarityIndex: index over the stored tracks
+        """
+        return cls.build(TrackFeatureSet.load(path).to_frame())
+
+
+    def __len__(self):
+        return len(self.track_ids)
+
+
+    @timed('insert_similarity_index')
+    def insert(self, df):
+        """
+        Add tracks to the index, skipping tracks already indexed
+
+        df (pd.DataFrame): tracks with id, title, main_artist and the feature columns
+
+        Returns:
+        int: number of tracks added
+        """
+        df = df[~df['id'].astype(str).isin(self._row_of)].drop_duplicates(subset=['id']).reset_index(drop=True)
+        if df.empty:
+            return 0
+
+        vectors, _, kept = feature_vectors(df, self.columns)
+        df = df.loc[kept]
+        if len(df) != len(vectors):
+            raise Exception(f"Got {len(vectors)} feature vectors for {len(df)} tracks")
+
+        vectors = (vectors - self.mean) / self.scale
+        self.vectors = np.concatenate([self.vectors, vectors])
+        self._norms = np.concatenate([self._norms, (vectors ** 2).sum(axis=1)])
+        for track_id, title, artist in zip(df['id'].astype(str), df['title'].astype(str),
+                                           df['main_artist'].astype(str)):
+            self._row_of[track_id] = len(self.track_ids)
+            self.track_ids.append(track_id)
+            self.titles.append(title)
+            self.artists.append(artist)
+        return len(df)
+
+
+    def seed_vectors(self, seeds):
+        """
+        Get standardized vectors for seed tracks
+
+        seeds (list[str] or pd.DataFrame): indexed track IDs, or tracks with the feature columns
+
+        Returns:
+        np.ndarray: one standardized row per seed found
+        set: track IDs of the seeds, excluded from results
+        """
+        if isinstance(seeds, pd.DataFrame):
+            vectors, _, _ = feature_vectors(seeds, self.columns)
+            seed_ids = set(seeds['id'].astype(str)) if 'id' in seeds.columns else set()
+            return (vectors - self.mean) / self.scale, seed_ids
+
+        rows = [self._row_of[track_id] for track_id in seeds if track_id in self._row_of]
+        return self.vectors[rows], set(seeds)
+
+
+    def search(self, vectors, k=TOP_K, exclude=()):
+        """
+        Find the nearest tracks to each query vector
+
+        vectors (np.ndarray): standardized query rows
+        k (int): neighbors per query
+        exclude (set): track IDs left out of the results
+
+        Returns:
+        np.ndarray: (queries, k) row indices, -1 where fewer than k tracks remain
+        np.ndarray: (queries, k) distances, inf where fewer than k tracks remain
+        """
+        excluded_rows = [self._row_of[track_id] for track_id in exclude if track_id in self._row_of]
+        vectors = np.asarray(vectors, dtype=np.float32)
+        rows = np.full((len(vectors), k), -1)
+        distances = np.full((len(vectors), k), np.inf)
+        n_found = min(k, len(self))
+        if n_found == 0:
+            return rows, distances
+
+        # Squared distances less the query's own norm, which does not change the order
+        block = max(1, SEARCH_BLOCK // len(self))
+        for start in range(0, len(vectors), block):
+            queries = vectors[start:start + block]
+            partial = self._norms[None, :] - 2 * (queries @ self.vectors.T)
+            if excluded_rows:
+                partial[:, excluded_rows] = np.inf
+
+            nearest = np.argpartition(partial, n_found - 1, axis=1)[:, :n_found]
+            nearest_partial = np.take_along_axis(partial, nearest, axis=1)
+            order = np.argsort(nearest_partial, axis=1, kind='stable')
+            nearest = np.take_along_axis(nearest, order, axis=1)
+            nearest_partial = np.take_along_axis(nearest_partial, order, axis=1)
+
+            squared = nearest_partial + (queries ** 2).sum(axis=1)[:, None]
+            rows[start:start + block, :n_found] = np.where(np.isfinite(squared), nearest, -1)
+            distances[start:start + block, :n_found] = np.sqrt(np.maximum(squared, 0))
+        return rows, distances
+
+
+    def _results(self, rows, distances):
+        keep = rows >= 0
+        rows, distances = rows[keep], distances[keep]
+        return pd.DataFrame({
+            'id': [self.track_ids[row] for row in rows],
+            'title': [self.titles[row] for row in rows],
+            'main_artist': [self.artists[row] for row in rows],
+            'distance': distances,
+        })
+
+
+    @timed('similar_to_playlist')
+    def similar_to_playlist(self, seeds, k=TOP_K):
+        """
+        Find the tracks closest to the centroid of a playlist
+
+        seeds (list[str] or pd.DataFrame): the playlist's indexed track IDs, or its tracks with features
+
+        Returns:
+        pd.DataFrame: id, title, main_artist and distance of the k nearest tracks outside the playlist
+        """
+        vectors, seed_ids = self.seed_vectors(seeds)
+        if len(vectors) == 0:
+            raise Exception("None of the seed tracks are in the similarity index")
+
+        rows, distances = self.search(vectors.mean(axis=0, keepdims=True), k, seed_ids)
+        return self._results(rows[0], distances[0])
+
+
+    @timed('similar_to_tracks')
+    def similar_to_tracks(self, seeds, k=TOP_K):
+        """
+        Find the tracks closest to any one of several seed tracks
+
+        seeds (list[str] or pd.DataFrame): indexed track IDs, or tracks with features
+
+        Returns:
+        pd.DataFrame: id, title, main_artist and distance to the nearest seed, k tracks closest first
+        """
+        vectors, seed_ids = self.seed_vectors(seeds)
+        if len(vectors) == 0:
+            raise Exception("None of the seed tracks are in the similarity index")
+
+        rows, distances = self.search(vectors, k, seed_ids)
+
+        # Keep each track's distance to its nearest seed
+        results = self._results(rows.ravel(), distances.ravel())
+        results = results.sort_values('distance', kind='stable').drop_duplicates(subset=['id'])
+        return results.head(k).reset_index(drop=True)
+
+
+    def save(self, path=INDEX_DIR):
+        """
+        Write the index to a directory
+
+        path (str): directory to write, created if missing
+        """
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'vectors.npy'), self.vectors)
+        np.save(os.path.join(path, 'track_ids.npy'), np.asarray(self.track_ids, dtype=str))
+        np.save(os.path.join(path, 'titles.npy'), np.asarray(self.titles, dtype=str))
+        np.save(os.path.join(path, 'artists.npy'), np.asarray(self.artists, dtype=str))
+
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({
+                'columns': self.columns,
+                'mean': self.mean.tolist(),
+                'scale': self.scale.tolist(),
+            }, f)
+
+
+    @classmethod
+    def load(cls, path=INDEX_DIR):
+        """
+        Load an index written by save
+
+        path (str): directory written by save
+
+        Returns:
+        SimilarityIndex: index ready for queries and inserts
+        """
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+
+        def load_array(name):
+            return np.load(os.path.join(path, f'{name}.npy'))
+
+        return cls(meta['columns'], np.asarray(meta['mean'], dtype=np.float32),
+                   np.asarray(meta['scale'], dtype=np.float32), load_array('vectors'),
+                   load_array('track_ids').tolist(), load_array('titles').tolist(),
+                   load_array('artists').tolist())
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the track similarity index")
+    parser.add_argument('--build', help="TrackFeatureSet directory to index, replacing the saved index")
+    parser.add_argument('--insert', help="TrackFeatureSet directory of tracks to add to the saved index")
+    parser.add_argument('--index', default=INDEX_DIR, help="directory of the saved index")
+    parser.add_argument('--tracks', nargs='+', help="seed track IDs to find similar tracks for")
+    parser.add_argument('--centroid', action='store_true', help="search around the seeds' centroid")
+    parser.add_argument('--top-k', type=int, default=TOP_K)
+    args = parser.parse_args()
+
+    if args.build:
+        index = SimilarityIndex.from_feature_set(args.build)
+        index.save(args.index)
+        print(f"Indexed {len(index)} tracks.")
+    else:
+        index = SimilarityIndex.load(args.index)
+
+    if args.insert:
+        added = index.insert(TrackFeatureSet.load(args.insert).to_frame())
+        index.save(args.index)
+        print(f"Added {added} tracks, {len(index)} indexed.")
+
+    if args.tracks:
+        if args.centroid:
+            results = index.similar_to_playlist(args.tracks, args.top_k)
+        else:
+            results = index.similar_to_tracks(args.tracks, args.top_k)
+        print(results.to_string(index=False))
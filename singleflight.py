@@ -0,0 +1,104 @@
+'''
+File: singleflight.py
+Description: Coalesce identical requests in flight at the same time into one call
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import threading
+from concurrent.futures import Future
+
+from instrumentation import METRICS
+
+
+
+class SingleFlight:
+    """
+    Share the result of a call with every caller asking for the same key while it runs
+
+    Results are not kept once a call finishes, caching is left to the stores and caches.
+    """
+
+    def __init__(self, name):
+        """
+        name (str): label used for the coalesced request counter
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Run func unless a call for key is already running, then wait for that call instead
+
+        key (hashable): identity of the request
+        func (callable): makes the request
+
+        Returns:
+        result of func, or of the call already in flight, exceptions are shared the same way
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            METRICS.count('singleflight_coalesced_total', flight=self.name)
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+    def do_many(self, keys, func):
+        """
+        Fetch many keys at once, only requesting keys no other call is already fetching
+
+        keys (list): keys wanted, duplicates allowed
+        func (callable): takes a list of keys and returns a dict of key -> result for them
+
+        Returns:
+        dict: key -> result for every key, None where func returned nothing for it
+        """
+        owned = {}
+        waiting = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                future = self._calls.get(key)
+                if future is None:
+                    owned[key] = self._calls[key] = Future()
+                else:
+                    waiting[key] = future
+
+        if waiting:
+            METRICS.count('singleflight_coalesced_total', len(waiting), flight=self.name)
+
+        try:
+            results = func(list(owned)) if owned else {}
+            for key, future in owned.items():
+                future.set_result(results.get(key))
+        except BaseException as e:
+            for future in owned.values():
+                if not future.done():
+                    future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                for key in owned:
+                    del self._calls[key]
+
+        # Return keys in the order they were asked for
+        found = {key: results.get(key) for key in owned}
+        found.update((key, future.result()) for key, future in waiting.items())
+        return {key: found[key] for key in dict.fromkeys(keys)}
@@ -6,32 +6,59 @@ Date: 05/20/2024
 '''
 
 import os
+import re
+import threading
+import time
 import requests
 import pandas as pd
-from dotenv import load_dotenv
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from instrumentation import timed, record_response, record_retry, record_cache
+from environment import load_environment
+from singleflight import SingleFlight
+from token_manager import TokenManager
 
 
 
 # Load enviornemnt variables
-load_dotenv()
+load_environment()
 
 # Get credentials from enviornment variables
 CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID')
 CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
 
 # Spotify Accounts service API URL
-TOKEN_URL = 'https://accounts.spotify.com/api/token'
+TOKEN_URL = os.getenv('SPOTIFY_TOKEN_URL', 'https://accounts.spotify.com/api/token')
 
+# Spotify Web API URL, can be pointed at a local mock server
+API_URL = os.getenv('SPOTIFY_API_URL', 'https://api.spotify.com/v1')
 
-def get_spotify_access_token(client_id, client_secret):
-    """ 
-    Get Access token using client credentials flow
+# Most batch requests in flight at once per client
+MAX_WORKERS = 8
+
+# Times a rate limited request is retried before giving up
+MAX_RETRIES = 5
+
+REQUEST_TIMEOUT = 15
+
+# Latest request latencies kept per endpoint for latency_report
+LATENCY_WINDOW = 1000
+
+# Clients kept for the most recently used access tokens, older tokens have been refreshed away
+MAX_CLIENTS = 4
+
+
+def request_spotify_token(client_id, client_secret):
+    """
+    Request a new access token using client credentials flow
 
     client_id (str): Client ID as provided by Spotify for application
     client_secret (str): Client Secret as provided by Spotify for application
 
     Returns:
-    str: Token for authorization
+    dict: token response with access_token and expires_in
     """
 
     auth_response = requests.post(TOKEN_URL, {
@@ -43,8 +70,327 @@ def get_spotify_access_token(client_id, client_secret):
     if auth_response.status_code != 200:
         raise Exception("Could not authenticate with Spotify API")
     
-    auth_response_data = auth_response.json()
-    return auth_response_data['access_token']
+    return auth_response.json()
+
+
+
+# One token manager per set of credentials
+_token_managers = {}
+_token_managers_lock = threading.Lock()
+
+
+def get_spotify_access_token(client_id, client_secret):
+    """ 
+    Get Access token using client credentials flow, reusing a cached token until shortly before it expires
+
+    client_id (str): Client ID as provided by Spotify for application
+    client_secret (str): Client Secret as provided by Spotify for application
+
+    Returns:
+    str: Token for authorization
+    """
+    with _token_managers_lock:
+        if client_id not in _token_managers:
+            _token_managers[client_id] = TokenManager(
+                'spotify', client_id, lambda: request_spotify_token(client_id, client_secret))
+        manager = _token_managers[client_id]
+    return manager.get()
+
+
+
+def get_endpoint_name(endpoint):
+    """
+    Reduce a request URL to the endpoint it hits for latency reporting
+
+    endpoint (str): full request URL
+
+    Returns:
+    str: URL path with playlist IDs replaced, e.g. /playlists/{id}/tracks
+    """
+    path = urlparse(endpoint).path
+    path = re.sub(r'^/v1', '', path)
+    return re.sub(r'/playlists/[^/]+', '/playlists/{id}', path)
+
+
+
+class SpotifyClient:
+    """
+    Spotify Web API client holding a keep-alive session and per-endpoint latency stats
+    """
+
+    def __init__(self, access_token, max_workers=MAX_WORKERS, max_retries=MAX_RETRIES, session=None):
+        """
+        access_token (str): Access token for Spotify authorization
+        max_workers (int): most batch requests in flight at once
+        max_retries (int): times a 429 response is retried before raising
+        session (requests.Session): session to send requests through, a new keep-alive pool if None
+        """
+        self.access_token = access_token
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max_workers * 2)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+        self.session.headers['Authorization'] = f'Bearer {access_token}'
+
+        self.latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        self.requests = defaultdict(int)
+        self._lock = threading.Lock()
+
+        # Identical requests and track IDs already being fetched by another thread are waited on
+        self._requests = SingleFlight('spotify')
+        self._audio_features = SingleFlight('spotify_audio_features')
+        self._tracks = SingleFlight('spotify_tracks')
+
+
+    def get(self, endpoint):
+        """
+        Make a request to the Spotify API, sharing the response of an identical request in flight
+
+        endpoint (str): URL containing the endpoint for data
+
+        Returns
+        JSON: Data fetched from the endpoint
+        """
+        return self._requests.do(endpoint, self._get, endpoint)
+
+
+    def _get(self, endpoint):
+        """
+        Make a request to the Spotify API, waiting out rate limits
+
+        endpoint (str): URL containing the endpoint for data
+
+        Returns
+        JSON: Data fetched from the endpoint
+        """
+        name = get_endpoint_name(endpoint)
+
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            response = self.session.get(endpoint, params={'market': 'US'}, timeout=REQUEST_TIMEOUT)
+            with self._lock:
+                self.requests[name] += 1
+                self.latencies[name].append(time.perf_counter() - start)
+            record_response(endpoint, response, 'spotify')
+
+            # Rate limited, wait as long as Spotify asks before trying again
+            if response.status_code == 429 and attempt < self.max_retries:
+                retry_after = response.headers.get('Retry-After')
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else 2**attempt
+                print(f"Rate limited on {name}, retrying in {delay} seconds")
+                record_retry(endpoint, 'spotify')
+                time.sleep(delay)
+                continue
+            break
+
+        # If unsucessful print status code, content, and raise exception
+        if response.status_code != 200:
+            print(f"Request to {endpoint} failed with status code {response.status_code}")
+            print(f"Response content: {response.text}")
+            raise Exception("Could not fetch data from Spotify API")
+
+        return response.json()
+
+
+    def map(self, func, items):
+        """
+        Run func over items concurrently, bounded by max_workers
+
+        func (callable): function to apply to each item
+        items (list): items such as batches of track IDs
+
+        Returns:
+        list: results in the same order as items
+        """
+        if len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(func, items))
+
+
+    def get_playlist_snapshot_id(self, playlist_id):
+        """
+        Get the current snapshot ID of a playlist, which changes whenever its tracks do
+
+        playlist_id (str): ID for a given playlist from URL or Spotify request
+
+        Returns:
+        str: Spotify snapshot ID
+        """
+        return self.get(f'{API_URL}/playlists/{playlist_id}?fields=snapshot_id')['snapshot_id']
+
+
+    def get_playlist_track_ids(self, playlist_id):
+        """
+        Get tracks from a Spotify playlist ID, fetching pages after the first concurrently
+
+        playlist_id (str): ID for a given playlist from URL or Spotify request
+
+        Returns:
+        list[str]: List of Spotify track IDs
+        """
+        endpoint = f'{API_URL}/playlists/{playlist_id}/tracks'
+        results = self.get(endpoint)
+
+        # The first page tells us how many pages are left so they can be requested together
+        limit = results.get('limit') or len(results['items']) or 100
+        offsets = list(range(limit, results.get('total', 0), limit))
+        pages = self.map(lambda offset: self.get(f'{endpoint}?offset={offset}&limit={limit}'), offsets)
+
+        # Copy the first page, its response may be shared with a coalesced caller
+        tracks = list(results['items'])
+        for page in pages:
+            tracks.extend(page['items'])
+
+        return [track['track']['id'] for track in tracks if track['track'] and track['track']['id']]
+
+
+    def iter_playlist_track_ids(self, playlist_id):
+        """
+        Yield a playlist's track IDs one page at a time as each page arrives
+
+        playlist_id (str): ID for a given playlist from URL or Spotify request
+
+        Yields:
+        list[str]: Spotify track IDs on each page
+        """
+        results = self.get(f'{API_URL}/playlists/{playlist_id}/tracks')
+        while True:
+            yield [track['track']['id'] for track in results['items'] if track['track'] and track['track']['id']]
+            if not results['next']:
+                break
+            results = self.get(results['next'])
+
+
+    def get_audio_features(self, track_ids):
+        """
+        Get audio features for a list of track IDs
+
+        track_ids (list[str]): List of Spotify track ids
+
+        Returns:
+        pd.DataFrame: Dataframe of track's audio features as each row
+        """
+
+        # Spotify limits requests to a size of 100
+        MAX_BATCH = 100
+
+        def fetch(batch):
+            response = self.get(f'{API_URL}/audio-features?ids={",".join(batch)}')
+            return response.get('audio_features') or []
+
+        def fetch_many(ids):
+            batches = [ids[i:i+MAX_BATCH] for i in range(0, len(ids), MAX_BATCH)]
+            return {obj['id']: obj for batch in self.map(fetch, batches) for obj in batch if obj is not None}
+
+        # Each ID is requested once, even when another thread is already fetching it
+        features = self._audio_features.do_many(track_ids, fetch_many)
+
+        # Remove any songs without audio features available
+        audio_features = [obj for obj in features.values() if obj is not None]
+
+        return pd.DataFrame(audio_features)
+
+
+    def get_title_artist(self, track_ids):
+        """
+        Get song title and artist for a given track ID
+
+        track_ids (list[str]): list of track IDs
+
+        Returns:
+        pd.DataFrame: A dataframe of track id, title, and artist
+        """
+
+        # Spotify limits requests to a size of 50
+        MAX_BATCH = 50
+
+        def fetch(batch):
+            response = self.get(f'{API_URL}/tracks?ids={",".join(batch)}')
+            tracks = response.get('tracks') or [None] * len(batch)
+
+            track_info = []
+            for track_id, track in zip(batch, tracks):
+                if track is not None:
+                    # Fetch features for each track
+                    track_info.append({
+                        'id': track.get('id'),
+                        'title': track.get('name'),
+                        'main_artist': track['artists'][0]['name'] if track['artists'] else None,
+                        'popularity': track.get('popularity'),
+                        'release_date': track.get('album', {}).get('release_date')
+                        })
+                else:
+                    # Handle the case where track is None
+                    track_info.append({'id': track_id, 'title': None, 'main_artist': None,
+                                       'popularity': None, 'release_date': None})
+            return track_info
+
+        def fetch_many(ids):
+            batches = [ids[i:i+MAX_BATCH] for i in range(0, len(ids), MAX_BATCH)]
+            pages = self.map(fetch, batches)
+            return {track_id: info for batch, page in zip(batches, pages) for track_id, info in zip(batch, page)}
+
+        # Each ID is requested once, even when another thread is already fetching it
+        track_info = list(self._tracks.do_many(track_ids, fetch_many).values())
+
+        # Convert list of dicts to DataFrame with column names
+        return pd.DataFrame(track_info, columns=['id', 'title', 'main_artist', 'popularity', 'release_date'])
+
+
+    def latency_report(self):
+        """
+        Summarize request latency for each endpoint hit so far
+
+        Returns:
+        dict: endpoint -> request count and mean/p50/p95/max latency in milliseconds over the last
+            LATENCY_WINDOW requests
+        """
+        report = {}
+        with self._lock:
+            items = [(name, self.requests[name], sorted(times)) for name, times in self.latencies.items()]
+
+        for name, count, times in items:
+            report[name] = {
+                'requests': count,
+                'mean_ms': 1000 * sum(times) / len(times),
+                'p50_ms': 1000 * times[len(times) // 2],
+                'p95_ms': 1000 * times[min(len(times) - 1, int(len(times) * 0.95))],
+                'max_ms': 1000 * times[-1],
+            }
+        return report
+
+
+
+# One client per recent access token so every call reuses the same connections
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+
+
+def get_client(access_token):
+    """
+    Get the shared client for an access token
+
+    access_token (str): Access token for Spotify authorization
+
+    Returns:
+    SpotifyClient: client reused across calls with the same token
+    """
+    with _clients_lock:
+        if access_token in _clients:
+            _clients.move_to_end(access_token)
+        else:
+            _clients[access_token] = SpotifyClient(access_token)
+
+            # Drop clients of refreshed tokens, threads still using one keep it until they finish
+            while len(_clients) > MAX_CLIENTS:
+                _clients.popitem(last=False)
+        return _clients[access_token]
 
 
 
@@ -58,31 +404,18 @@ def get_spotify_data(endpoint, access_token):
     Returns
     JSON: Data fetched from the endpoint
     """
-
-    headers = {
-        'Authorization': f'Bearer {access_token}'
-    }
-    params = {
-        'market': 'US'
-    }
-    response = requests.get(endpoint, headers=headers, params=params)
-
-    # If unsucessful print status code, content, and raise exception
-    if response.status_code != 200:
-        print(f"Request to {endpoint} failed with status code {response.status_code}")
-        print(f"Response content: {response.text}")
-        raise Exception("Could not fetch data from Spotify API")
-    
-    return response.json()
+    return get_client(access_token).get(endpoint)
 
 
 
-def get_playlist_track_ids(playlist_id, access_token):
+@timed('get_playlist_track_ids')
+def get_playlist_track_ids(playlist_id, access_token, store=None):
     """
     Get tracks from a Spotify playlist ID
 
     playlist_id (str): ID for a given playlist from URL or Spotify request
     access_token (str): Access token for Spotify authorization
+    store (TrackStore): local store to reuse unchanged playlists from, optional
 
     Returns:
     list[str]: List of Spotify track IDs
@@ -91,17 +424,22 @@ def get_playlist_track_ids(playlist_id, access_token):
     # Output to display where program is at
     print("Getting playlist track IDs...")
 
-    endpoint = f'https://api.spotify.com/v1/playlists/{playlist_id}/tracks'
+    client = get_client(access_token)
 
-    results = get_spotify_data(endpoint, access_token)
+    # Only page through the playlist when it changed since it was last stored
+    if store is not None:
+        snapshot_id = client.get_playlist_snapshot_id(playlist_id)
+        stored = store.get_playlist(playlist_id)
+        unchanged = stored is not None and stored[0] == snapshot_id
+        record_cache('playlists', int(unchanged), int(not unchanged))
+        if unchanged:
+            print("Playlist unchanged, using stored track IDs.")
+            return stored[1]
 
-    # Iterate through data for each 100 songs until there is no more next song
-    tracks = results['items']
-    while results['next']:
-        results = get_spotify_data(results['next'], access_token)
-        tracks.extend(results['items'])
-    # Extract ids
-    track_ids = [track['track']['id'] for track in tracks if track['track'] and track['track']['id']]
+    track_ids = client.get_playlist_track_ids(playlist_id)
+
+    if store is not None:
+        store.put_playlist(playlist_id, snapshot_id, track_ids)
 
     # Confirm completion
     print("Playlist track IDs fetched.")
@@ -119,26 +457,7 @@ def get_audio_features(track_ids, access_token):
     Returns:
     pd.DataFrame: Dataframe of track's audio features as each row
     """
-
-    # Spotify limits requests to a size of 100
-    MAX_BATCH = 100
-
-    # Iterate through batches of 100 and make seperate requests
-    audio_features = []
-    for i in range(0, len(track_ids), MAX_BATCH):
-        batch = track_ids[i:i+MAX_BATCH]
-        ids = ','.join(batch)
-        endpoint = f'https://api.spotify.com/v1/audio-features?ids={ids}'
-        response = get_spotify_data(endpoint, access_token)
-        audio_features.extend(response.get('audio_features', []))
-
-    # Remove any songs without audio features available
-    filtered_audio_features = []
-    for obj in audio_features:
-        if obj != None:
-            filtered_audio_features.append(obj)
-
-    return pd.DataFrame(filtered_audio_features)
+    return get_client(access_token).get_audio_features(track_ids)
 
     
 
@@ -152,52 +471,4 @@ def get_title_artist(track_ids, access_token):
     Returns:
     pd.DataFrame: A dataframe of track id, title, and artist
     """
-
-    # Spotify limits requests to a size of 50
-    MAX_BATCH = 50
-
-    # List to store track info
-    track_info = []
-
-    # Iterate through batches of 50 and make seperate requests
-    for i in range(0, len(track_ids), MAX_BATCH):
-        batch = track_ids[i:i+MAX_BATCH]
-        ids = ','.join(batch)
-        endpoint = f'https://api.spotify.com/v1/tracks?ids={ids}'
-        response = get_spotify_data(endpoint, access_token)
-        tracks = response.get('tracks', [])
-
-        if tracks is None:
-            # Handle the case where 'tracks' is None
-            for track_id in batch:
-                track_info.append({'id': track_id, 'title': None, 'main_artist': None, 
-                                       'popularity': None, 'release_date': None})
-        else:
-            for track in tracks:
-                if track is not None: 
-                    # Fetch features for each track
-                    title = track.get('name')
-                    main_artist = track['artists'][0]['name'] if track['artists'] else None
-                    track_id = track.get('id')
-                    popularity = track.get('popularity')
-                    release_date = track.get('album',{}).get('release_date')
-
-                    # Create dict for each track and store in list
-                    track_info.append({
-                        'id': track_id, 
-                        'title': title, 
-                        'main_artist': main_artist, 
-                        'popularity': popularity,
-                        'release_date': release_date
-                        })
-                else:
-                    # Handle the case where track is None
-                    track_info.append({'id': track_id, 'title': None, 'main_artist': None, 
-                                       'popularity': None, 'release_date': None})
-
-    # Convert list of dicts to DataFrame with column names
-    df = pd.DataFrame(track_info, columns=['id', 'title', 'main_artist', 'popularity', 'release_date'])
-    return df
-
-
-
+    return get_client(access_token).get_title_artist(track_ids)
@@ -0,0 +1,211 @@
+'''
+File: conftest.py
+Description: Local stub HTTP server answering with scripted responses for client tests
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+import requests
+
+
+# Modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lyrics
+import spotify_client
+
+
+
+class StubServer:
+    """
+    HTTP server answering each path with scripted responses and recording every request
+
+    A response is a (status, body) or (status, body, headers) tuple, or a callable taking the
+    parsed query and returning one. Dict bodies are sent as JSON and strings as HTML.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self._routes = {}
+        self._delays = defaultdict(float)
+        self._lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+
+    def route(self, path, *responses, delay=0.0):
+        """
+        Answer requests for a path with responses in order, repeating the last one
+
+        path (str): URL path, e.g. /v1/tracks
+        responses (tuple): responses to send
+        delay (float): seconds to wait before each response
+        """
+        self._routes[path] = deque(responses)
+        self._delays[path] = delay
+
+
+    def hits(self, path):
+        """
+        path (str): URL path
+
+        Returns:
+        list[dict]: requests made to path, oldest first
+        """
+        with self._lock:
+            return [request for request in self.requests if request['path'] == path]
+
+
+    def _next_response(self, path, query):
+        with self._lock:
+            responses = self._routes.get(path)
+            if not responses:
+                return 404, {'error': 'not found'}, {}
+            response = responses.popleft() if len(responses) > 1 else responses[0]
+
+        if callable(response):
+            response = response(query)
+        status, body, headers = (*response, {}) if len(response) == 2 else response
+        return status, body, headers
+
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                with stub._lock:
+                    stub.requests.append({'path': url.path, 'query': query,
+                                          'headers': dict(self.headers), 'time': time.monotonic()})
+
+                time.sleep(stub._delays[url.path])
+                status, body, headers = stub._next_response(url.path, query)
+
+                content_type = 'application/json'
+                if isinstance(body, str):
+                    body, content_type = body.encode(), 'text/html; charset=utf-8'
+                elif not isinstance(body, bytes):
+                    body = json.dumps(body).encode()
+
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+
+@pytest.fixture
+def stub_server():
+    with StubServer() as server:
+        yield server
+
+
+
+def playlist_page(url, playlist_id, track_ids, query):
+    """
+    Build one page of a playlist's tracks the way Spotify pages them
+
+    url (str): base URL of the stub server
+    playlist_id (str): Spotify playlist ID
+    track_ids (list[str]): every track ID in the playlist
+    query (dict): parsed query of the request
+
+    Returns:
+    tuple: status and response body
+    """
+    offset = int(query.get('offset', ['0'])[0])
+    limit = int(query.get('limit', ['100'])[0])
+    next_url = None
+    if offset + limit < len(track_ids):
+        next_url = f'{url}/v1/playlists/{playlist_id}/tracks?offset={offset + limit}&limit={limit}'
+
+    return 200, {
+        'items': [{'track': {'id': track_id}} for track_id in track_ids[offset:offset + limit]],
+        'limit': limit,
+        'offset': offset,
+        'total': len(track_ids),
+        'next': next_url,
+    }
+
+
+@pytest.fixture
+def spotify_stub(stub_server, monkeypatch):
+    """
+    Point the Spotify client at the stub server
+
+    Returns:
+    callable: takes a SyntheticCatalog and playlist ID -> track indices, routes them and returns the server
+    """
+    monkeypatch.setattr(spotify_client, 'API_URL', f'{stub_server.url}/v1')
+
+    def serve(catalog, playlists, snapshot_id='snapshot'):
+        def ids(query):
+            return query['ids'][0].split(',')
+
+        for playlist_id, indices in playlists.items():
+            track_ids = [catalog.track_id(i) for i in indices]
+            stub_server.route(f'/v1/playlists/{playlist_id}', (200, {'snapshot_id': snapshot_id}))
+            stub_server.route(f'/v1/playlists/{playlist_id}/tracks',
+                              lambda query, playlist_id=playlist_id, track_ids=track_ids:
+                              playlist_page(stub_server.url, playlist_id, track_ids, query))
+
+        stub_server.route('/v1/audio-features', lambda query: (200, {
+            'audio_features': [catalog.audio_features(catalog.track_index(i)) for i in ids(query)]}))
+        stub_server.route('/v1/tracks', lambda query: (200, {
+            'tracks': [catalog.track(catalog.track_index(i)) for i in ids(query)]}))
+        return stub_server
+
+    return serve
+
+
+@pytest.fixture
+def genius(stub_server, monkeypatch):
+    """
+    Point the Genius client at the stub server through a fresh session and a fast limiter
+
+    Returns:
+    StubServer: server to route /genius/search and song pages on
+    """
+    monkeypatch.setattr(lyrics, 'GENIUS_API_URL', f'{stub_server.url}/genius')
+    monkeypatch.setattr(lyrics, 'GENIUS_WEB_URL', stub_server.url)
+    monkeypatch.setattr(lyrics, 'GENIUS_API_TOKEN', 'token')
+    monkeypatch.setattr(lyrics, '_session', requests.Session())
+    monkeypatch.setattr(lyrics, '_limiter', lyrics.TokenBucket(1000))
+    monkeypatch.setattr(lyrics, 'BACKOFF_BASE', 0.01)
+    return stub_server
@@ -0,0 +1,83 @@
+'''
+File: test_checkpoint.py
+Description: Resuming interrupted runs from a RunCheckpoint directory
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import os
+
+import pandas as pd
+
+from checkpoint import RunCheckpoint, JOURNAL_NAME
+from dedup_index import normalize_key
+from lyrics_cache import LyricsCache
+from sentiment import append_sentiment
+
+
+SCORED = [0.1, 0.6, 0.3, 0.5]
+
+SONG_PAGE = '<html><body><div data-lyrics-container="true">Sunny day</div></body></html>'
+
+
+def search(query):
+    title = query['q'][0].split()[0]
+    return 200, {'response': {'hits': [{'result': {'path': f'/songs/{title}'}}]}}
+
+
+def fail(*args):
+    raise AssertionError("a finished stage ran again")
+
+
+def interrupted_run(path):
+    """
+    Leave a run directory as a run killed while scoring would
+
+    Alpha was scored, Beta's lyrics were fetched but not scored and the line for Gamma was cut short.
+    """
+    checkpoint = RunCheckpoint(path)
+    checkpoint.save('target_ids', ['a', 'b'])
+    checkpoint.save('tracks', pd.DataFrame({'id': ['a', 'b'], 'energy': [0.5, 0.7]}))
+    checkpoint.put_sentiment('Alpha', 'Artist', SCORED)
+    checkpoint.put_lyrics('Beta', 'Artist', 'Cloudy day')
+    checkpoint.close()
+
+    with open(os.path.join(path, JOURNAL_NAME), 'a') as f:
+        f.write('{"key": "%s", "lyr' % normalize_key('Gamma', 'Artist'))
+
+
+
+def test_resume_skips_finished_stages(tmp_path):
+    path = str(tmp_path / 'run')
+    interrupted_run(path)
+
+    checkpoint = RunCheckpoint(path, resume=True)
+
+    assert checkpoint.run('target_ids', fail) == ['a', 'b']
+    assert checkpoint.run('tracks', fail)['energy'].tolist() == [0.5, 0.7]
+    assert not checkpoint.done('sentiment')
+    assert checkpoint.run('sentiment', lambda: ['scored']) == ['scored']
+    checkpoint.close()
+
+
+def test_resume_only_fetches_missing_tracks(tmp_path, genius):
+    genius.route('/genius/search', search)
+    for title in ('Alpha', 'Beta', 'Gamma', 'Delta'):
+        genius.route(f'/songs/{title}', (200, SONG_PAGE))
+    path = str(tmp_path / 'run')
+    interrupted_run(path)
+
+    checkpoint = RunCheckpoint(path, resume=True)
+    songs = pd.DataFrame({'title': ['Alpha', 'Beta', 'Gamma', 'Delta'], 'main_artist': ['Artist'] * 4})
+    scored = append_sentiment(songs, cache=LyricsCache(':memory:'), workers=1, checkpoint=checkpoint)
+    checkpoint.close()
+
+    searched = sorted(request['query']['q'][0] for request in genius.hits('/genius/search'))
+    assert searched == ['Delta Artist', 'Gamma Artist']
+    assert scored.loc[0, ['neg', 'neu', 'pos', 'compound']].tolist() == SCORED
+    assert not scored[['neg', 'neu', 'pos', 'compound']].isna().any().any()
+
+    # Entries written after the cut off line are read back by the next resume
+    resumed = RunCheckpoint(path, resume=True)
+    assert all(resumed.get_sentiment(title, 'Artist') is not None for title in songs['title'])
+    resumed.close()
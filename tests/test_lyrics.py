@@ -0,0 +1,86 @@
+'''
+File: test_lyrics.py
+Description: Genius lyrics client and TokenBucket tests against a local stub Genius server
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import threading
+import time
+
+import lyrics
+from lyrics import TokenBucket
+
+
+SONG_PAGE = '<html><body><div data-lyrics-container="true">[Verse 1]<br/>Hello<br/>world</div></body></html>'
+
+
+def search_hits(query):
+    title = query['q'][0].split()[0]
+    hits = [] if title == 'Unknown' else [{'result': {'path': f'/songs/{title}'}}]
+    return 200, {'response': {'hits': hits}}
+
+
+
+def test_token_bucket_spaces_requests_to_the_rate(genius, monkeypatch):
+    monkeypatch.setattr(lyrics, '_limiter', TokenBucket(20, capacity=1))
+    genius.route('/ping', (200, {}))
+
+    threads = [threading.Thread(target=lyrics.request_with_retries, args=(f'{genius.url}/ping',))
+               for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    times = sorted(request['time'] for request in genius.hits('/ping'))
+    assert len(times) == 10
+    assert times[-1] - times[0] >= 9 / 20 - 0.05
+
+
+def test_retry_after_pauses_every_caller(genius):
+    genius.route('/limited', (429, {}, {'Retry-After': '0.5'}), (200, {}))
+    genius.route('/other', (200, {}))
+
+    first = threading.Thread(target=lyrics.request_with_retries, args=(f'{genius.url}/limited',))
+    first.start()
+    time.sleep(0.1)
+    response = lyrics.request_with_retries(f'{genius.url}/other')
+    first.join()
+
+    limited, retried = genius.hits('/limited')
+    other, = genius.hits('/other')
+    assert response.status_code == 200
+    assert retried['time'] - limited['time'] >= 0.5
+    assert other['time'] - limited['time'] >= 0.5
+
+
+def test_server_errors_are_retried_then_not_scored(genius, monkeypatch):
+    monkeypatch.setattr(lyrics, 'MAX_RETRIES', 2)
+    genius.route('/genius/search', (503, {}))
+
+    assert lyrics.fetch_lyrics('Song', 'Artist') is None
+    assert len(genius.hits('/genius/search')) == 3
+
+
+def test_get_lyrics_many_keeps_order(genius):
+    genius.route('/genius/search', search_hits)
+    genius.route('/songs/First', (200, SONG_PAGE))
+    genius.route('/songs/Second', (200, '<html><body>No lyrics here</body></html>'))
+
+    results = lyrics.get_lyrics_many([('First', 'A'), ('Unknown', 'B'), ('Second', 'C')], max_workers=3)
+
+    assert results == ['Hello world', 'Song not found', 'Lyrics not found']
+    assert genius.hits('/genius/search')[0]['headers']['Authorization'] == 'Bearer token'
+
+
+def test_versions_of_a_song_share_one_lookup(genius):
+    genius.route('/genius/search', search_hits, delay=0.3)
+    genius.route('/songs/Song', (200, SONG_PAGE))
+    pairs = [('Song', 'Artist'), ('Song - Remastered 2011', 'Artist'), ('Song (feat. Someone)', 'ARTIST')] * 3
+
+    results = lyrics.get_lyrics_many(pairs, max_workers=len(pairs))
+
+    assert results == ['Hello world'] * len(pairs)
+    assert len(genius.hits('/genius/search')) == 1
+    assert len(genius.hits('/songs/Song')) == 1
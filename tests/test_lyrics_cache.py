@@ -0,0 +1,94 @@
+'''
+File: test_lyrics_cache.py
+Description: LyricsCache expiry, eviction and negative caching tests with a fake clock
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import types
+
+import pandas as pd
+import pytest
+
+import lyrics
+import lyrics_cache
+from lyrics_cache import LyricsCache
+from sentiment import append_sentiment
+
+
+SCORES = {'neg': 0.1, 'neu': 0.7, 'pos': 0.2, 'compound': 0.3}
+
+SONG_PAGE = '<html><body><div data-lyrics-container="true">Happy happy day</div></body></html>'
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = types.SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(lyrics_cache, 'time', types.SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def search(query):
+    title = query['q'][0].split()[0]
+    if title == 'Down':
+        return 503, {}
+    hits = [] if title == 'Unknown' else [{'result': {'path': f'/songs/{title}'}}]
+    return 200, {'response': {'hits': hits}}
+
+
+def songs(*titles):
+    return pd.DataFrame({'title': list(titles), 'main_artist': ['Artist'] * len(titles)})
+
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = LyricsCache(':memory:', ttl=100)
+    cache.put('Song', 'Artist', 'la la', SCORES)
+
+    clock.value += 100
+    assert cache.get('Song', 'Artist')['lyrics'] == 'la la'
+    clock.value += 1
+    assert cache.get('Song', 'Artist') is None
+    assert cache.stats()['misses'] == 1
+
+
+def test_expired_entries_are_refetched(clock, genius):
+    genius.route('/genius/search', search)
+    genius.route('/songs/Happy', (200, SONG_PAGE))
+    cache = LyricsCache(':memory:', ttl=100)
+
+    first = append_sentiment(songs('Happy'), cache=cache, workers=1)
+    clock.value += 50
+    append_sentiment(songs('Happy'), cache=cache, workers=1)
+    assert len(genius.hits('/genius/search')) == 1
+
+    clock.value += 100
+    refetched = append_sentiment(songs('Happy'), cache=cache, workers=1)
+    assert len(genius.hits('/genius/search')) == 2
+    assert refetched['pos'].tolist() == first['pos'].tolist()
+
+
+def test_oldest_entries_are_evicted_past_max_entries(clock, monkeypatch):
+    monkeypatch.setattr(lyrics_cache, 'EVICT_EVERY', 1)
+    cache = LyricsCache(':memory:', ttl=None, max_entries=3)
+
+    for i in range(5):
+        clock.value += 1
+        cache.put(f'Song {i}', 'Artist', f'lyrics {i}', SCORES)
+
+    assert cache.stats()['entries'] == 3
+    assert [cache.get(f'Song {i}', 'Artist') is None for i in range(5)] == [True, True, False, False, False]
+
+
+def test_not_found_is_cached_but_failures_are_not(clock, genius, monkeypatch):
+    monkeypatch.setattr(lyrics, 'MAX_RETRIES', 0)
+    genius.route('/genius/search', search)
+    cache = LyricsCache(':memory:')
+
+    for _ in range(2):
+        append_sentiment(songs('Unknown', 'Down'), cache=cache, workers=1)
+
+    searched = [request['query']['q'][0] for request in genius.hits('/genius/search')]
+    assert sorted(searched) == ['Down Artist', 'Down Artist', 'Unknown Artist']
+    assert cache.get('Unknown', 'Artist')['lyrics'] == 'Song not found'
+    assert cache.get('Down', 'Artist') is None
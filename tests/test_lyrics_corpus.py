@@ -0,0 +1,90 @@
+'''
+File: test_lyrics_corpus.py
+Description: LyricsCorpus compaction and recovery from files a crash left partly written
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import os
+
+import pytest
+
+from lyrics_corpus import LyricsCorpus, BLOCK_SONGS, BLOCKS_NAME, INDEX_NAME, KEYS_NAME
+
+
+N_BLOCKS = 3
+
+
+def lyrics_of(i):
+    return f'verse {i} ' + 'love night fire ' * (i % 7 + 1)
+
+
+@pytest.fixture
+def corpus_path(tmp_path):
+    """
+    Corpus holding N_BLOCKS full blocks of songs, closed
+
+    Returns:
+    str: corpus directory
+    """
+    path = str(tmp_path / 'corpus')
+    corpus = LyricsCorpus(path)
+    for i in range(N_BLOCKS * BLOCK_SONGS):
+        corpus.append(f'Song {i}', 'Artist', lyrics_of(i))
+    corpus.close()
+    return path
+
+
+def truncate(path, name, n_bytes):
+    file_path = os.path.join(path, name)
+    with open(file_path, 'r+b') as f:
+        f.truncate(os.path.getsize(file_path) - n_bytes)
+
+
+
+def test_compact_keeps_the_latest_copy_of_each_song(corpus_path):
+    corpus = LyricsCorpus(corpus_path)
+    corpus.append('Song 3', 'Artist', 'rewritten')
+    corpus.flush()
+    before = corpus.nbytes()
+
+    corpus.compact()
+
+    assert len(corpus) == N_BLOCKS * BLOCK_SONGS
+    assert corpus.get('Song 3', 'Artist') == 'rewritten'
+    assert corpus.get('Song 4', 'Artist') == lyrics_of(4)
+    assert corpus.nbytes() < before
+
+    # The reopened files still take appends
+    corpus.append('Song new', 'Artist', 'fresh')
+    corpus.close()
+    reopened = LyricsCorpus(corpus_path)
+    assert reopened.get('Song new', 'Artist') == 'fresh'
+    assert sorted(key for key, _ in reopened) == sorted(reopened.keys)
+    reopened.close()
+
+
+@pytest.mark.parametrize('name, n_bytes, n_complete', [
+    (BLOCKS_NAME, 5, (N_BLOCKS - 1) * BLOCK_SONGS),
+    (INDEX_NAME, 3, N_BLOCKS * BLOCK_SONGS - 1),
+    (KEYS_NAME, 1, N_BLOCKS * BLOCK_SONGS - 1),
+    (KEYS_NAME, 4, N_BLOCKS * BLOCK_SONGS - 1),
+])
+def test_reopening_keeps_every_complete_song(corpus_path, name, n_bytes, n_complete):
+    truncate(corpus_path, name, n_bytes)
+
+    corpus = LyricsCorpus(corpus_path)
+
+    assert len(corpus) == n_complete
+    assert all(corpus.get(f'Song {i}', 'Artist') == lyrics_of(i) for i in range(n_complete))
+    assert corpus.get(f'Song {n_complete}', 'Artist') is None
+    assert len(list(corpus)) == n_complete
+
+    # Songs appended after recovery are readable after the next reopen
+    corpus.append('Song new', 'Artist', 'fresh')
+    corpus.close()
+    reopened = LyricsCorpus(corpus_path)
+    assert len(reopened) == n_complete + 1
+    assert reopened.get('Song new', 'Artist') == 'fresh'
+    assert reopened.get(f'Song {n_complete - 1}', 'Artist') == lyrics_of(n_complete - 1)
+    reopened.close()
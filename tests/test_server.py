@@ -0,0 +1,99 @@
+'''
+File: test_server.py
+Description: Recommendation service tests against stub Spotify and Genius servers
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+
+import server
+from server import CurationService, make_handler
+from benchmarks.synthetic import SyntheticCatalog
+from lyrics_cache import LyricsCache
+from model_registry import ModelRegistry
+from track_store import TrackStore
+
+
+SCORE_REQUEST = {'target_playlist_id': 'target', 'candidate_playlist_id': 'candidates'}
+
+
+@pytest.fixture
+def service(spotify_stub, genius, tmp_path, monkeypatch):
+    catalog = SyntheticCatalog(400, seed=0)
+    spotify_stub(catalog, {'target': catalog.playlist(1), 'candidates': catalog.playlist(0)})
+    genius.route('/genius/search', (200, {'response': {'hits': []}}))
+    monkeypatch.setattr(server, 'get_spotify_access_token', lambda client_id, client_secret: 'token')
+
+    return CurationService(TrackStore(':memory:'), LyricsCache(':memory:'),
+                           ModelRegistry(str(tmp_path / 'models')))
+
+
+@pytest.fixture
+def service_url(service):
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(service))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+
+def test_health(service_url):
+    response = requests.get(f'{service_url}/health')
+
+    assert response.status_code == 200
+    assert response.json() == {'status': 'ok'}
+
+
+def test_second_score_reuses_the_trained_model(service_url, stub_server):
+    first = requests.post(f'{service_url}/score', json=SCORE_REQUEST)
+    fetched = len(stub_server.requests)
+    second = requests.post(f'{service_url}/score', json=SCORE_REQUEST)
+
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert len(stub_server.requests) == fetched
+
+    metrics = requests.get(f'{service_url}/metrics').json()
+    assert metrics['counters']['model_misses'] == 1
+    assert metrics['counters']['model_hits'] == 1
+    assert metrics['model_hit_ratio'] == 0.5
+    assert metrics['latency_ms']['/score']['requests'] == 2
+    assert metrics['models_loaded'] == 1
+
+
+@pytest.mark.parametrize('body', [
+    b'not json',
+    b'[]',
+    b'{"target_playlist_id": "target"}',
+    b'{"target_playlist_id": "target", "candidate_playlist_id": 7}',
+    b'{"target_playlist_id": "", "candidate_playlist_id": "candidates"}',
+])
+def test_malformed_body_is_a_bad_request(service_url, service, body):
+    response = requests.post(f'{service_url}/score', data=body)
+
+    assert response.status_code == 400
+    assert service.counters['model_misses'] == 0
+
+
+def test_scoring_failure_is_a_server_error(service_url, service, monkeypatch):
+    def fail(target_ids, candidate_ids):
+        raise RuntimeError("Spotify unavailable")
+    monkeypatch.setattr(service, 'build_frame', fail)
+
+    response = requests.post(f'{service_url}/score', json=SCORE_REQUEST)
+
+    assert response.status_code == 500
+    assert response.json() == {'error': 'Spotify unavailable'}
+    assert not service._train_locks
+
+
+def test_unknown_path_is_not_found(service_url):
+    assert requests.get(f'{service_url}/missing').status_code == 404
+    assert requests.post(f'{service_url}/missing', json={}).status_code == 404
@@ -0,0 +1,91 @@
+'''
+File: test_singleflight.py
+Description: SingleFlight coalescing tests
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import threading
+import time
+
+from singleflight import SingleFlight
+
+
+def run_threads(target, n):
+    threads = [threading.Thread(target=target) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+
+def test_callers_share_the_call_in_flight():
+    flight = SingleFlight('test')
+    calls = []
+    results = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'result'
+
+    run_threads(lambda: results.append(flight.do('key', fetch)), 8)
+
+    assert calls == [1]
+    assert results == ['result'] * 8
+
+
+def test_results_are_not_kept_after_the_call():
+    flight = SingleFlight('test')
+    calls = []
+
+    flight.do('key', calls.append, 1)
+    flight.do('key', calls.append, 2)
+
+    assert calls == [1, 2]
+
+
+def test_exceptions_are_shared_with_waiting_callers():
+    flight = SingleFlight('test')
+    errors = []
+
+    def fetch():
+        time.sleep(0.2)
+        raise ValueError('failed')
+
+    def call():
+        try:
+            flight.do('key', fetch)
+        except ValueError as e:
+            errors.append(e)
+
+    run_threads(call, 4)
+
+    assert len(errors) == 4
+    assert len({id(e) for e in errors}) == 1
+    assert flight.do('key', lambda: 'retried') == 'retried'
+
+
+def test_do_many_only_fetches_keys_not_in_flight():
+    flight = SingleFlight('test')
+    fetched = []
+    started = threading.Event()
+
+    def fetch(keys):
+        fetched.append(keys)
+        started.set()
+        time.sleep(0.2)
+        return {key: key.upper() for key in keys if key != 'missing'}
+
+    results = {}
+    first = threading.Thread(target=lambda: results.update(first=flight.do_many(['a', 'b'], fetch)))
+    first.start()
+    started.wait()
+    results['second'] = flight.do_many(['c', 'b', 'missing', 'c'], fetch)
+    first.join()
+
+    assert fetched == [['a', 'b'], ['c', 'missing']]
+    assert results['first'] == {'a': 'A', 'b': 'B'}
+    assert results['second'] == {'c': 'C', 'b': 'B', 'missing': None}
+    assert list(results['second']) == ['c', 'b', 'missing']
@@ -0,0 +1,124 @@
+'''
+File: test_spotify_client.py
+Description: SpotifyClient tests against a local stub Spotify server
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import threading
+import time
+
+import pytest
+import requests
+
+import spotify_client
+from spotify_client import SpotifyClient
+
+
+@pytest.fixture
+def spotify(stub_server, monkeypatch):
+    monkeypatch.setattr(spotify_client, 'API_URL', f'{stub_server.url}/v1')
+    return stub_server
+
+
+def audio_features(query):
+    return 200, {'audio_features': [{'id': track_id, 'energy': 0.5} for track_id in query['ids'][0].split(',')]}
+
+
+
+def test_requests_go_through_injected_session(spotify):
+    session = requests.Session()
+    session.headers['X-Stub'] = 'injected'
+    spotify.route('/v1/playlists/abc', (200, {'snapshot_id': 'snap'}))
+
+    client = SpotifyClient('token', session=session)
+
+    assert client.session is session
+    assert client.get_playlist_snapshot_id('abc') == 'snap'
+    request, = spotify.hits('/v1/playlists/abc')
+    assert request['headers']['Authorization'] == 'Bearer token'
+    assert request['headers']['X-Stub'] == 'injected'
+    assert request['query']['market'] == ['US']
+
+
+def test_rate_limit_waits_for_retry_after(spotify):
+    spotify.route('/v1/audio-features', (429, {}, {'Retry-After': '1'}), audio_features)
+    client = SpotifyClient('token', session=requests.Session())
+
+    features = client.get_audio_features(['a', 'b'])
+
+    assert features['id'].tolist() == ['a', 'b']
+    first, second = spotify.hits('/v1/audio-features')
+    assert second['time'] - first['time'] >= 1.0
+    assert client.latency_report()['/audio-features']['requests'] == 2
+
+
+def test_rate_limit_raises_once_retries_run_out(spotify):
+    spotify.route('/v1/tracks', (429, {}, {'Retry-After': '0'}))
+    client = SpotifyClient('token', max_retries=2, session=requests.Session())
+
+    with pytest.raises(Exception):
+        client.get_title_artist(['a'])
+    assert len(spotify.hits('/v1/tracks')) == 3
+
+
+def test_batches_are_fetched_concurrently(spotify):
+    spotify.route('/v1/audio-features', audio_features, delay=0.3)
+    client = SpotifyClient('token', max_workers=4, session=requests.Session())
+    track_ids = [f'track{i}' for i in range(350)]
+
+    start = time.monotonic()
+    features = client.get_audio_features(track_ids)
+    elapsed = time.monotonic() - start
+
+    assert features['id'].tolist() == track_ids
+    assert len(spotify.hits('/v1/audio-features')) == 4
+    assert elapsed < 4 * 0.3
+
+
+def test_missing_tracks_keep_their_ids(spotify):
+    spotify.route('/v1/tracks', (200, {'tracks': [
+        {'id': 'a', 'name': 'Song', 'artists': [{'name': 'Artist'}], 'popularity': 50,
+         'album': {'release_date': '2020-01-01'}},
+        None,
+    ]}))
+    client = SpotifyClient('token', session=requests.Session())
+
+    tracks = client.get_title_artist(['a', 'b'])
+
+    assert tracks['id'].tolist() == ['a', 'b']
+    assert tracks['title'].tolist()[0] == 'Song'
+    assert tracks['title'].isna().tolist() == [False, True]
+
+
+def test_identical_requests_in_flight_are_coalesced(spotify):
+    spotify.route('/v1/playlists/abc', (200, {'snapshot_id': 'snap'}), delay=0.3)
+    client = SpotifyClient('token', session=requests.Session())
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.get_playlist_snapshot_id('abc')))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ['snap'] * 8
+    assert len(spotify.hits('/v1/playlists/abc')) == 1
+
+
+def test_overlapping_batches_request_each_id_once(spotify):
+    spotify.route('/v1/audio-features', audio_features, delay=0.3)
+    client = SpotifyClient('token', session=requests.Session())
+
+    results = {}
+    first = threading.Thread(target=lambda: results.update(first=client.get_audio_features(['a', 'b'])))
+    first.start()
+    time.sleep(0.1)
+    results['second'] = client.get_audio_features(['b', 'c'])
+    first.join()
+
+    requested = [request['query']['ids'][0] for request in spotify.hits('/v1/audio-features')]
+    assert sorted(requested) == ['a,b', 'c']
+    assert results['first']['id'].tolist() == ['a', 'b']
+    assert results['second']['id'].tolist() == ['b', 'c']
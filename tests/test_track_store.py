@@ -0,0 +1,88 @@
+'''
+File: test_track_store.py
+Description: Incremental playlist and track syncing through the TrackStore against a stub Spotify server
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import pytest
+
+import track_store
+from benchmarks.synthetic import SyntheticCatalog
+from data_cleaning import get_track_data
+from spotify_client import get_playlist_track_ids
+from track_store import TrackStore
+
+
+N_TRACKS = 250
+
+# Tracks added to the playlist by a later snapshot
+N_ADDED = 5
+
+
+@pytest.fixture
+def catalog():
+    return SyntheticCatalog(N_TRACKS + N_ADDED, seed=0)
+
+
+@pytest.fixture
+def spotify(spotify_stub, catalog):
+    server = spotify_stub(catalog, {'mix': range(N_TRACKS)})
+
+    # Every tenth track has no audio features on Spotify
+    def audio_features(query):
+        ids = query['ids'][0].split(',')
+        return 200, {'audio_features': [None if catalog.track_index(i) % 10 == 0
+                                        else catalog.audio_features(catalog.track_index(i)) for i in ids]}
+    server.route('/v1/audio-features', audio_features)
+    return server
+
+
+def sync(store):
+    track_ids = get_playlist_track_ids('mix', 'token', store)
+    return track_ids, get_track_data(track_ids, 'token', store, verbose=False)
+
+
+
+def test_unchanged_snapshot_makes_no_track_requests(spotify):
+    store = TrackStore(':memory:')
+    track_ids, first = sync(store)
+    n_requests = len(spotify.requests)
+
+    second_ids = get_playlist_track_ids('mix', 'token', store)
+    assert [request['path'] for request in spotify.requests[n_requests:]] == ['/v1/playlists/mix']
+
+    n_requests = len(spotify.requests)
+    second = get_track_data(second_ids, 'token', store, verbose=False)
+    assert len(spotify.requests) == n_requests
+
+    assert second_ids == track_ids
+    assert len(first) == N_TRACKS - N_TRACKS // 10
+    assert second['id'].tolist() == first['id'].tolist()
+
+
+def test_tracks_without_audio_features_are_retried_once_their_marker_expires(spotify, monkeypatch):
+    store = TrackStore(':memory:')
+    track_ids, _ = sync(store)
+    n_requests = len(spotify.requests)
+
+    monkeypatch.setattr(track_store, 'UNAVAILABLE_TTL', -1)
+    get_track_data(track_ids, 'token', store, verbose=False)
+
+    requested = [request['query']['ids'][0].split(',') for request in spotify.requests[n_requests:]
+                 if request['path'] == '/v1/audio-features']
+    assert requested == [[track_id for track_id in track_ids if int(track_id) % 10 == 0]]
+
+
+def test_changed_snapshot_only_fetches_new_tracks(spotify_stub, spotify, catalog):
+    store = TrackStore(':memory:')
+    sync(store)
+    n_requests = len(spotify.requests)
+
+    spotify_stub(catalog, {'mix': range(N_TRACKS + N_ADDED)}, snapshot_id='changed')
+    track_ids, _ = sync(store)
+
+    assert len(track_ids) == N_TRACKS + N_ADDED
+    requested = [request['query']['ids'][0] for request in spotify.requests[n_requests:]
+                 if request['path'] == '/v1/audio-features']
+    assert requested == [','.join(catalog.track_id(i) for i in range(N_TRACKS, N_TRACKS + N_ADDED))]
@@ -0,0 +1,112 @@
+'''
+File: token_manager.py
+Description: Disk cached access tokens refreshed shortly before they expire
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from environment import load_environment
+
+
+# Load enviornment variables
+load_environment()
+
+# File holding cached tokens, can be overridden in the enviornment
+TOKEN_CACHE_PATH = os.getenv('TOKEN_CACHE_PATH', '.token_cache.json')
+
+# Seconds before expiry a token is replaced
+REFRESH_MARGIN = 300
+
+# Lifetime assumed when a token response has no expires_in
+DEFAULT_EXPIRES_IN = 3600
+
+
+
+class TokenManager:
+    """
+    Hands out one cached token per account, shared across runs through a file on disk
+    """
+
+    def __init__(self, name, account, fetch, path=TOKEN_CACHE_PATH, refresh_margin=REFRESH_MARGIN):
+        """
+        name (str): service the tokens are for, e.g. spotify
+        account (str): identifies the credentials, only a hash of it is written to disk
+        fetch (callable): requests a new token, returning the token response dict with access_token and expires_in
+        path (str): token cache file, None to keep tokens in memory only
+        refresh_margin (float): seconds before expiry a token is refreshed
+        """
+        self.key = f"{name}:{hashlib.sha256(account.encode()).hexdigest()[:16]}"
+        self.fetch = fetch
+        self.path = path
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0
+
+
+    def _read_cache(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+
+    def _write_cache(self):
+        cache = self._read_cache()
+        cache[self.key] = {'access_token': self._token, 'expires_at': self._expires_at}
+
+        # Tokens are credentials, keep the file private to the user and replace it in one step
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cache, f)
+        os.replace(temp_path, self.path)
+
+
+    def _fresh(self):
+        return self._token is not None and time.time() < self._expires_at - self.refresh_margin
+
+
+    def get(self):
+        """
+        Get a token valid for at least refresh_margin more seconds
+
+        Returns:
+        str: access token
+        """
+        with self._lock:
+            if self._fresh():
+                return self._token
+
+            # Another run may have refreshed the token already
+            if self.path is not None:
+                cached = self._read_cache().get(self.key)
+                if cached is not None:
+                    self._token, self._expires_at = cached['access_token'], cached['expires_at']
+                    if self._fresh():
+                        return self._token
+
+            response = self.fetch()
+            self._token = response['access_token']
+            self._expires_at = time.time() + response.get('expires_in', DEFAULT_EXPIRES_IN)
+            if self.path is not None:
+                self._write_cache()
+            return self._token
+
+
+    def invalidate(self):
+        """
+        Drop the current token, e.g. after the API rejected it, so the next get fetches a new one
+        """
+        with self._lock:
+            self._token = None
+            self._expires_at = 0
+            if self.path is not None and self.key in self._read_cache():
+                self._write_cache()
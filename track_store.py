@@ -0,0 +1,179 @@
+'''
+File: track_store.py
+Description: Local store of playlist snapshots and per-track Spotify data
+Author: Devin Lepur
+Date: 10/17/2026
+'''
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from instrumentation import record_cache
+from environment import load_environment
+
+
+# Load enviornment variables
+load_environment()
+
+# Location of the store database, can be overridden in the enviornment
+STORE_PATH = os.getenv('TRACK_STORE_PATH', 'track_store.sqlite')
+
+# Seconds a track Spotify had no audio features for is skipped before it is requested again
+UNAVAILABLE_TTL = 60 * 60 * 24 * 30
+
+
+
+class TrackStore:
+    """
+    SQLite backed store of playlist track lists by snapshot and of track audio features/metadata
+
+    Tracks Spotify has no audio features for are stored with null data, so they are not requested
+    on every run.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        """
+        path (str): file path of the database, ':memory:' for a temporary store
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS playlists (
+                playlist_id TEXT PRIMARY KEY,
+                snapshot_id TEXT NOT NULL,
+                track_ids TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )''')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS tracks (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )''')
+        self._conn.commit()
+
+
+    def get_playlist(self, playlist_id):
+        """
+        Get the stored snapshot of a playlist
+
+        playlist_id (str): Spotify playlist ID
+
+        Returns:
+        tuple[str, list[str]]: snapshot ID and track IDs, None if never stored
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT snapshot_id, track_ids FROM playlists WHERE playlist_id = ?',
+                (playlist_id,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+
+    def put_playlist(self, playlist_id, snapshot_id, track_ids):
+        """
+        Store the track IDs of a playlist at a snapshot
+
+        playlist_id (str): Spotify playlist ID
+        snapshot_id (str): Spotify snapshot ID the track IDs were read at
+        track_ids (list[str]): track IDs in playlist order
+        """
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO playlists VALUES (?, ?, ?, ?)',
+                (playlist_id, snapshot_id, json.dumps(track_ids), time.time()))
+            self._conn.commit()
+
+
+    def missing_track_ids(self, track_ids):
+        """
+        Find which track IDs have no stored data and are not recently marked unavailable
+
+        track_ids (list[str]): track IDs to check
+
+        Returns:
+        list[str]: track IDs not in the store, in their original order
+        """
+        stored = set(self._get_rows(track_ids, time.time() - UNAVAILABLE_TTL))
+        missing = [track_id for track_id in dict.fromkeys(track_ids) if track_id not in stored]
+        record_cache('tracks', len(stored), len(missing))
+        return missing
+
+
+    def get_tracks(self, track_ids):
+        """
+        Get stored data for track IDs
+
+        track_ids (list[str]): track IDs to look up
+
+        Returns:
+        dict: track ID -> dict of audio features and metadata for each stored track
+        """
+        return {track_id: data for track_id, data in self._get_rows(track_ids).items() if data is not None}
+
+
+    def _get_rows(self, track_ids, unavailable_since=None):
+        """
+        Read stored rows, None for tracks marked unavailable
+
+        track_ids (list[str]): track IDs to look up
+        unavailable_since (float): leave out unavailable markers written before this time, optional
+
+        Returns:
+        dict: track ID -> stored data or None
+        """
+        tracks = {}
+        unique_ids = list(dict.fromkeys(track_ids))
+
+        # SQLite limits the number of bound parameters per query
+        BATCH = 500
+        with self._lock:
+            for i in range(0, len(unique_ids), BATCH):
+                batch = unique_ids[i:i+BATCH]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f'SELECT id, data, updated_at FROM tracks WHERE id IN ({placeholders})', batch)
+                for track_id, data, updated_at in rows:
+                    data = json.loads(data)
+                    if data is not None or unavailable_since is None or updated_at >= unavailable_since:
+                        tracks[track_id] = data
+        return tracks
+
+
+    def put_tracks(self, records):
+        """
+        Store audio features and metadata for tracks
+
+        records (list[dict]): one dict per track, each with an 'id' key
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO tracks VALUES (?, ?, ?)',
+                [(record['id'], json.dumps(record), now) for record in records])
+            self._conn.commit()
+
+
+    def put_unavailable(self, track_ids):
+        """
+        Mark tracks Spotify returned no audio features for, skipping them for UNAVAILABLE_TTL seconds
+
+        track_ids (list[str]): track IDs without audio features
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO tracks VALUES (?, ?, ?)',
+                [(track_id, 'null', now) for track_id in track_ids])
+            self._conn.commit()
+
+
+    def close(self):
+        with self._lock:
+            self._conn.close()